@@ -111,14 +111,27 @@ const TextAnalysis = () => {
     
     setLoading(true);
     try {
-      await Promise.all([
-        handleSummarize(),
-        handleClassify(),
-        handleSentiment(),
-        handleKeywords()
-      ]);
+      // One request: the server splits and tokenizes the text once for all analyses
+      const response = await axios.post('/api/analyze/', {
+        text: inputText,
+        analyses: ['summary', 'classification', 'sentiment', 'keywords'],
+        options: {
+          summary: { max_sentences: maxSentences },
+          classification: { top_k: 3 },
+          keywords: { top_k: topK }
+        }
+      });
+      const results = response.data;
+      setSummary(results.summary.summary);
+      setClassification(results.classification);
+      setSentiment(results.sentiment);
+      setKeywords(results.keywords.keywords);
     } catch (error) {
       console.error('Error in analysis:', error);
+      const errorMessage = error.response?.data?.error
+        ? `API Error: ${error.response.data.error}`
+        : 'Error occurred while analyzing text.';
+      setSummary(errorMessage);
     } finally {
       setLoading(false);
     }
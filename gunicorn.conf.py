@@ -0,0 +1,42 @@
+"""
+Production gunicorn configuration: `gunicorn` (run from the project root) picks it up.
+
+The application, and with it every NLP resource (see summarizer/serving.py), is
+loaded once in the master and shared copy-on-write with the forked workers.
+Check the result with `python manage.py memory_report <master pid>`.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'summarease_project.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Import the app (punkt, VADER, stopwords, classifier and keyword artifacts) before forking
+preload_app = True
+
+
+def on_starting(server):
+    # The app is loaded by now; keep the master's collector from freeing objects
+    # (and leaving holes the workers would fill, copying pages) from here on
+    gc.disable()
+
+
+def pre_fork(server, worker):
+    from summarizer.serving import freeze
+
+    # Objects created before the fork are never scanned, so their pages stay shared
+    freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    # gunicorn resets signal handlers in workers; `kill -HUP <worker pid>` reloads the classifier
+    # (a HUP to the master restarts the workers from the preloaded master instead)
+    from summarizer.text_classifier_model import install_reload_signal
+
+    install_reload_signal()
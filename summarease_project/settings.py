@@ -43,7 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'summarizer.metrics.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Below CORS so its 400/413/415 responses still carry the CORS headers
+    'summarizer.formats.RequestDecompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +83,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the shared-cache in-memory database, whose table locks
+        # fail at once instead of waiting, so threaded job workers can be tested
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -130,11 +136,144 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
 # REST Framework settings
+# JSON, or MessagePack (application/msgpack) for clients that send or accept it
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
+        'summarizer.formats.MessagePackRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'summarizer.formats.LimitedJSONParser',
+        'summarizer.formats.MessagePackParser',
     ],
 }
+
+# SummarEase settings
+# NLTK data (punkt, stopwords, vader_lexicon), installed with `manage.py fetch_nltk_data`
+NLTK_DATA_DIR = BASE_DIR / 'nltk_data'
+
+# Versioned classifier artifacts written by `manage.py train_classifier`
+CLASSIFIER_ARTIFACT_DIR = BASE_DIR / 'artifacts' / 'classifier'
+# joblib mmap_mode for loading the artifact ('r' shares the arrays via the page cache; None copies them)
+CLASSIFIER_MMAP_MODE = 'r'
+# Signal that makes a server process swap in the classifier version named by the artifact
+# directory's ACTIVE file (else the newest); None disables it
+CLASSIFIER_RELOAD_SIGNAL = 'SIGHUP'
+
+# Keyword vocabulary/IDF artifacts written by `manage.py fit_keyword_model`;
+# without one, keywords are ranked by TF-IDF over the single document
+KEYWORD_ARTIFACT_DIR = BASE_DIR / 'artifacts' / 'keywords'
+
+# Similar-document search index written by `manage.py update_similarity_index`
+SIMILARITY_INDEX_DIR = BASE_DIR / 'artifacts' / 'similarity'
+
+# Largest number of texts accepted by the /api/*/batch/ endpoints
+SUMMAREASE_MAX_BATCH_SIZE = 1000
+
+# Content-addressed cache of analysis results (see summarizer/cache.py).
+# Set DJANGO_CACHE_ALIAS (e.g. 'default' backed by Redis/Memcached) to share results between workers.
+SUMMAREASE_RESULT_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 1024,
+    'TTL': 600,
+    'DJANGO_CACHE_ALIAS': None,
+}
+
+# PDF uploads to /api/pdf/ (see summarizer/pdf.py): files of at least PARALLEL_MIN_PAGES pages have
+# their text extracted on the analysis process pool, PAGES_PER_TASK pages per task
+SUMMAREASE_PDF = {
+    'MAX_UPLOAD_BYTES': 50 * 2 ** 20,
+    'MAX_PAGES': 5000,
+    'PARALLEL_MIN_PAGES': 16,
+    'PAGES_PER_TASK': 4,
+}
+
+# Request bodies sent with Content-Encoding: gzip or zstd are
+# decompressed by summarizer.formats.RequestDecompressionMiddleware; bodies that expand beyond
+# MAX_DECOMPRESSED_BYTES are rejected with 413. JSON and MessagePack bodies are streamed into the
+# parsers in both serving modes, so DATA_UPLOAD_MAX_MEMORY_SIZE does not apply to them; set
+# MAX_BODY_BYTES to reject larger ones with 413 (None: no limit, so large pastes reach the latency budget)
+SUMMAREASE_WIRE = {
+    'MAX_BODY_BYTES': None,
+    'MAX_DECOMPRESSED_BYTES': 32 * 2 ** 20,
+}
+
+# Near-duplicate matching on top of the result cache (see summarizer/near_duplicates.py): a text
+# whose SimHash fingerprint agrees with a recently analyzed text's in at least THRESHOLD of its bits
+# gets that text's cached results, marked with near_duplicate_of. Texts under MIN_TOKENS tokens
+# are only matched exactly.
+SUMMAREASE_NEAR_DUPLICATES = {
+    'ENABLED': False,
+    'THRESHOLD': 0.85,
+    'MAX_ENTRIES': 10_000,
+    'MIN_TOKENS': 20,
+}
+
+# Async serving mode: serve /api/ with the async views in summarizer/async_views.py
+# (run under an ASGI server, e.g. `uvicorn summarease_project.asgi:application`).
+SUMMAREASE_ASYNC_VIEWS = False
+# Analysis process pool size: None = one worker per CPU, 0 = run in a thread instead
+SUMMAREASE_POOL_WORKERS = None
+SUMMAREASE_POOL_START_METHOD = 'spawn'
+# Texts of at least this many characters are tokenized and scored in parallel on the
+# analysis process pool (map-reduce over sentence chunks); None disables the parallel path.
+# Off by default: under gunicorn every sync worker would start its own pool of
+# SUMMAREASE_POOL_WORKERS spawned processes, each reloading the models outside the preloaded,
+# gc.frozen copy-on-write pages, so memory grows by workers x pool size. Turn it on for the
+# async mode (one server process, one pool), with SUMMAREASE_POOL_WORKERS set explicitly.
+SUMMAREASE_PARALLEL_THRESHOLD = None
+
+# Per-stage request timings: Server-Timing headers and the Prometheus histograms
+# served at /api/metrics/ (see summarizer/metrics.py); off costs one check per request
+SUMMAREASE_METRICS = False
+
+# Latency budgets for summaries and keywords (see approximate_text in summarizer/utils.py).
+# Requests may pass budget_ms (capped at MAX_MS); DEFAULT_MS applies otherwise, None = no budget.
+# Texts longer than budget * CHARS_PER_MS (measured exact throughput, one core) are analyzed
+# from a sample: 'sample' = evenly spaced sections of SECTION_CHARS, 'leading' = the beginning.
+SUMMAREASE_BUDGET = {
+    'DEFAULT_MS': 2000,
+    'MAX_MS': 10_000,
+    'CHARS_PER_MS': 400,
+    'STRATEGY': 'sample',
+    'SECTION_CHARS': 8192,
+}
+
+# Summary sentence scoring (see summarizer/summary_engine.py): 'frequency' sums the document counts of
+# each sentence's words; 'textrank' ranks sentences by PageRank over their TF-IDF cosine similarity,
+# for at most MAX_ITERATIONS power-iteration steps. Streamed texts are always scored by frequency.
+SUMMAREASE_SUMMARY = {
+    'METHOD': 'frequency',
+    'DAMPING': 0.85,
+    'MAX_ITERATIONS': 50,
+    'TOLERANCE': 1e-6,
+}
+
+# Tokenizer backend for summaries, keywords and sentence splitting (see summarizer/utils.py):
+# 'nltk' = punkt + Treebank word_tokenize (reference), 'regex' = precompiled regular expressions
+SUMMAREASE_TOKENIZER = 'nltk'
+
+# Background analysis jobs (see summarizer/jobs.py): results are deleted RESULT_TTL seconds after
+# they finish, long polls wait at most MAX_WAIT seconds, jobs running longer than STALE_AFTER are
+# requeued (up to MAX_ATTEMPTS), and job workers analyze exactly unless BUDGET_MS is set
+SUMMAREASE_JOBS = {
+    'RESULT_TTL': 3600,
+    'MAX_WAIT': 30,
+    'POLL_INTERVAL': 0.25,
+    'STALE_AFTER': 900,
+    'MAX_ATTEMPTS': 3,
+    'BUDGET_MS': None,
+}
+
+# Similar-document search (see summarizer/similarity.py): STORE_ANALYZED keeps every text sent to the
+# single-text analyses for the next index update; queries look up their MAX_QUERY_TERMS highest
+# weighted terms and read at most MAX_POSTINGS postings (highest weights first) of each; updates
+# write segments of SEGMENT_SIZE documents and merge neighbouring segments beyond MAX_SEGMENTS
+SUMMAREASE_SIMILARITY = {
+    'STORE_ANALYZED': False,
+    'MAX_QUERY_TERMS': 32,
+    'MAX_POSTINGS': 10_000,
+    'MAX_TOP_K': 100,
+    'SEGMENT_SIZE': 50_000,
+    'MAX_SEGMENTS': 8,
+}
@@ -14,10 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('summarizer.urls'))
+    # Async views (ASGI + process pool) or the default synchronous DRF views
+    path('api/', include('summarizer.async_urls' if settings.SUMMAREASE_ASYNC_VIEWS else 'summarizer.urls'))
 ]
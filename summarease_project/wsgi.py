@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'summarease_project.settings')
 
 application = get_wsgi_application()
+
+# Load the NLP resources and the classifier and keyword artifacts now rather than on the
+# first request (in the gunicorn master, before fork, with gunicorn.conf.py)
+from summarizer.serving import preload  # noqa: E402
+from summarizer.text_classifier_model import install_reload_signal  # noqa: E402
+
+preload()
+# `kill -HUP <pid>` swaps in the classifier version named by the ACTIVE file (or the newest)
+install_reload_signal()
@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AnalysisJob, Document
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'priority', 'size', 'worker', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'priority')
+    search_fields = ('id', 'worker')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+    ordering = ('-created_at',)
+
+
+
+@admin.register(Document)
+class DocumentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'size', 'created_at')
+    search_fields = ('content_hash',)
+    readonly_fields = ('content_hash', 'created_at')
@@ -0,0 +1,25 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# Same routes and names as summarizer/urls.py; the analysis endpoints are
+# swapped for their async versions, everything else is served unchanged.
+ASYNC_VIEWS = {
+    'summarize': async_views.summarize_view,
+    'classify': async_views.classify_view,
+    'sentiment': async_views.sentiment_view,
+    'keywords': async_views.keywords_view,
+    'analyze': async_views.analyze_view,
+    'summarize-batch': async_views.summarize_batch_view,
+    'classify-batch': async_views.classify_batch_view,
+    'sentiment-batch': async_views.sentiment_batch_view,
+    'keywords-batch': async_views.keywords_batch_view,
+    'jobs': async_views.job_submit_view,
+    'job-detail': async_views.job_detail_view,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
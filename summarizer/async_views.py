@@ -0,0 +1,227 @@
+"""
+Async versions of the analysis endpoints for ASGI deployments.
+
+Enabled with ``SUMMAREASE_ASYNC_VIEWS = True`` (see ``summarizer/async_urls.py``).
+Requests are validated on the event loop with the same rules and error
+messages as the DRF views, and the analysis itself runs on the process pool
+from ``summarizer/pool.py``. Result-cache and near-duplicate lookups stay in
+the serving process, so every pool worker shares them and
+``/api/cache/stats/`` reports them; only the misses are sent to the pool.
+"""
+import asyncio
+import functools
+import json
+import time
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .formats import MSGPACK_MEDIA_TYPE, RequestBodyTooLarge, packb, read_body, unpackb
+from .jobs import get_job, job_payload, jobs_config, submit_job
+from .metrics import stage
+from .pool import run_in_pool
+from .similarity import similarity_config
+from .utils import (
+    compute_analyses,
+    compute_batch,
+    lookup_analyses,
+    lookup_batch,
+    lookup_near_duplicates,
+    sentence_sentiments,
+    store_analyses,
+    store_analyzed,
+    store_batch,
+    text_fingerprint,
+)
+from .views import (
+    ndjson_lines,
+    parse_analysis_request,
+    parse_batch_request,
+    parse_job_request,
+    parse_sentiment_mode,
+    parse_single_request,
+    parse_wait,
+)
+
+
+class _BadRequest(Exception):
+    def __init__(self, payload, status=400):
+        super().__init__(payload)
+        self.status = status
+
+
+def _request_data(request):
+    # JSON, or MessagePack when the client sends application/msgpack (as the DRF parsers accept).
+    # Streamed under MAX_BODY_BYTES like the DRF parsers; request.body would stop at DATA_UPLOAD_MAX_MEMORY_SIZE
+    msgpack_body = request.content_type == MSGPACK_MEDIA_TYPE
+    try:
+        with stage('parse'):
+            body = read_body(request)
+            if not body:
+                data = {}
+            elif msgpack_body:
+                data = unpackb(body)
+            else:
+                data = json.loads(body)
+    except RequestBodyTooLarge as exc:
+        raise _BadRequest({'detail': exc.detail}, status=exc.status_code)
+    except ValueError as exc:
+        raise _BadRequest({'detail': f"{'MessagePack' if msgpack_body else 'JSON'} parse error - {exc}"})
+    if not isinstance(data, dict):
+        raise _BadRequest({'error': 'Request body must be a JSON object'})
+    return data
+
+
+def _response(request, data, status=200):
+    # MessagePack for clients that prefer application/msgpack to JSON, as the DRF renderers negotiate
+    if request.get_preferred_type(['application/json', MSGPACK_MEDIA_TYPE]) == MSGPACK_MEDIA_TYPE:
+        return HttpResponse(packb(data), status=status, content_type=MSGPACK_MEDIA_TYPE)
+    return JsonResponse(data, status=status)
+
+
+def _api_view(view, methods=('POST',)):
+    # POST-only (by default), CSRF-exempt like the DRF views; turns validation errors into 400s (413s)
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except _BadRequest as exc:
+            return _response(request, exc.args[0], status=exc.status)
+    return csrf_exempt(require_http_methods(list(methods))(wrapper))
+
+
+def _parse(parser, *args):
+    try:
+        with stage('parse'):
+            return parser(*args)
+    except ValueError as exc:
+        raise _BadRequest({'error': str(exc)})
+
+
+async def _run(function, *args, **kwargs):
+    # Work in the pool is timed as one 'pool' stage
+    with stage('pool'):
+        return await run_in_pool(function, *args, **kwargs)
+
+
+async def _analyses(text, analyses, options):
+    # Cache and near-duplicate lookups stay in this process, so all pool workers share one cache
+    # and one fingerprint index; only the misses are computed in the pool
+    if similarity_config()['STORE_ANALYZED']:
+        await sync_to_async(store_analyzed)(text)
+    results, lookup = await asyncio.to_thread(lookup_analyses, text, analyses, options)
+    if lookup.misses and lookup.near_duplicates is not None:
+        fingerprint = await _run(text_fingerprint, text)
+        results.update(await asyncio.to_thread(lookup_near_duplicates, lookup, fingerprint))
+    if lookup.misses:
+        computed = await _run(compute_analyses, text, lookup.misses, options)
+        await asyncio.to_thread(store_analyses, lookup, computed)
+        results.update(computed)
+    return {name: results[name] for name in analyses}
+
+
+async def _single(request, name):
+    text, options = _parse(parse_single_request, name, _request_data(request), request.GET)
+    return _response(request, (await _analyses(text, (name,), {name: options}))[name])
+
+
+async def _batch(request, name):
+    texts, options = _parse(parse_batch_request, name, _request_data(request), request.GET)
+    results, keys, pending = await asyncio.to_thread(lookup_batch, name, texts, options)
+    if pending:
+        outcomes = await _run(compute_batch, name, [texts[index] for index in pending], options)
+        await asyncio.to_thread(store_batch, results, keys, pending, outcomes)
+    return _response(request, {'results': results, 'count': len(results), **options})
+
+
+@_api_view
+async def summarize_view(request):
+    return await _single(request, 'summary')
+
+
+@_api_view
+async def classify_view(request):
+    return await _single(request, 'classification')
+
+
+async def _in_thread(iterator, batch_size=64):
+    # Advance a blocking iterator off the event loop, a batch of items at a time
+    iterator = iter(iterator)
+    while batch := await asyncio.to_thread(list, islice(iterator, batch_size)):
+        for item in batch:
+            yield item
+
+
+@_api_view
+async def sentiment_view(request):
+    data = _request_data(request)
+    text, options = _parse(parse_single_request, 'sentiment', data, request.GET)
+    if _parse(parse_sentiment_mode, data, request.GET) == 'sentences':
+        lines = _in_thread(ndjson_lines(sentence_sentiments(text)))
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    return _response(request, (await _analyses(text, ('sentiment',), {'sentiment': options}))['sentiment'])
+
+
+@_api_view
+async def keywords_view(request):
+    return await _single(request, 'keywords')
+
+
+@_api_view
+async def analyze_view(request):
+    """Run any of the four analyses on one text in a pool worker."""
+    data = _request_data(request)
+    analyses, options = _parse(parse_analysis_request, data)
+    text = data.get('text', '')
+    if not text:
+        raise _BadRequest({'error': 'Text is required'})
+    return _response(request, await _analyses(text, analyses, options))
+
+
+@_api_view
+async def summarize_batch_view(request):
+    return await _batch(request, 'summary')
+
+
+@_api_view
+async def classify_batch_view(request):
+    return await _batch(request, 'classification')
+
+
+@_api_view
+async def sentiment_batch_view(request):
+    return await _batch(request, 'sentiment')
+
+
+@_api_view
+async def keywords_batch_view(request):
+    return await _batch(request, 'keywords')
+
+
+@_api_view
+async def job_submit_view(request):
+    text, analyses, options, priority = _parse(parse_job_request, _request_data(request))
+    job = await sync_to_async(submit_job)(text, analyses, options, priority)
+    response = _response(request, job_payload(job), status=202)
+    response['Location'] = reverse('job-detail', args=[job.id])
+    return response
+
+
+@functools.partial(_api_view, methods=('GET',))
+async def job_detail_view(request, job_id):
+    """Job status; a long poll (``?wait=``) sleeps on the event loop between checks."""
+    wait = _parse(parse_wait, request.GET)
+    deadline = time.monotonic() + wait
+    interval = jobs_config()['POLL_INTERVAL']
+    while True:
+        job = await sync_to_async(get_job)(job_id)
+        if job is None or job.finished or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+    if job is None:
+        return _response(request, {'error': 'Job not found'}, status=404)
+    return _response(request, job_payload(job))
@@ -0,0 +1,307 @@
+"""
+Microbenchmarks for the analysis functions in ``summarizer/utils.py``.
+
+Each function is timed on synthetic and sample corpora at several sizes, and
+its peak Python memory is measured in a separate run under ``tracemalloc`` (so
+tracing does not distort the timings). Results are plain JSON so they can be
+kept as a baseline and compared against later runs; see
+``manage.py benchmark``. :func:`payload_formats` compares the size and
+encode/parse time of API payloads as JSON and MessagePack, plain and
+compressed.
+"""
+import gzip
+import io
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+import nltk
+import numpy as np
+import sklearn
+import zstandard
+from rest_framework.renderers import JSONRenderer
+
+from . import formats, utils
+
+BASELINE_FORMAT_VERSION = 1
+
+FUNCTIONS = {
+    'summarize_text': utils.summarize_text,
+    'classify_text': utils.classify_text,
+    'classify_with_confidence': utils.classify_with_confidence,
+    'analyze_sentiment': utils.analyze_sentiment,
+    'extract_keywords': utils.extract_keywords,
+}
+
+# Functions that tokenize their text, and so are timed with the chosen tokenizer backend
+TOKENIZING_FUNCTIONS = ('summarize_text', 'extract_keywords')
+
+# Corpus sizes in words
+SIZES = {
+    'paragraph': 120,
+    'pages': 5_000,
+    'book': 100_000,
+}
+
+CORPORA = ('synthetic', 'sample')
+
+# Metrics compared against a baseline; lower is better for all of them
+METRICS = ('mean_ms', 'p95_ms', 'peak_kib')
+
+SAMPLE_PARAGRAPHS = [
+    "Stock markets closed higher on Friday after a volatile week. Investors welcomed better "
+    "than expected earnings from several technology companies, although analysts warned that "
+    "rising interest rates could still weigh on growth in the coming months.",
+    "The hospital opened a new cardiology wing this spring. Doctors say the improved equipment "
+    "lets them treat patients faster, and nurses report that waiting times have dropped sharply "
+    "since the move. Some patients still complain about parking.",
+    "Teachers across the district are experimenting with online platforms. Students can review "
+    "lessons at home, submit homework digitally and get feedback within a day. Not everyone is "
+    "convinced: several parents worry about screen time and uneven internet access.",
+    "Machine learning models are now used to detect fraud in real time. The new system flagged "
+    "thousands of suspicious transactions in its first month, but engineers admit that false "
+    "alarms remain a serious problem for customers who are wrongly blocked.",
+]
+
+_SYNTHETIC_VOCABULARY = (
+    'market stock price investor company growth profit loss economy bank rate trade '
+    'patient doctor hospital care health treatment nurse clinic medicine disease '
+    'student teacher school lesson learning education course exam class university '
+    'software data model computer network system algorithm cloud device technology '
+    'good great excellent terrible bad poor happy sad worried confident strong weak '
+    'the a of and to in for with on at by from very quite really not never'
+).split()
+
+
+def synthetic_text(n_words, seed=0):
+    """Deterministic text of about ``n_words`` words in sentences of 8 to 24 words."""
+    rng = random.Random(seed)
+    sentences = []
+    words = 0
+    while words < n_words:
+        length = rng.randint(8, 24)
+        sentence = ' '.join(rng.choice(_SYNTHETIC_VOCABULARY) for _ in range(length))
+        sentences.append(sentence.capitalize() + rng.choice('..!?'))
+        words += length
+    return ' '.join(sentences)
+
+
+def sample_text(n_words, source=None):
+    """About ``n_words`` words of real prose: ``source`` (a text file) or the built-in paragraphs, repeated."""
+    text = Path(source).read_text(encoding='utf-8') if source else '\n\n'.join(SAMPLE_PARAGRAPHS)
+    words = text.split()
+    if not words:
+        raise ValueError(f'{source} contains no text')
+    repeated = (words * (n_words // len(words) + 1))[:n_words]
+    return ' '.join(repeated)
+
+
+def make_corpora(sizes=tuple(SIZES), corpora=CORPORA, sample_file=None):
+    """``{(corpus, size): text}`` for every requested corpus and size."""
+    texts = {}
+    for corpus in corpora:
+        for size in sizes:
+            n_words = SIZES[size]
+            texts[corpus, size] = synthetic_text(n_words) if corpus == 'synthetic' else sample_text(n_words, sample_file)
+    return texts
+
+
+def _percentile(values, percent):
+    return float(np.percentile(values, percent))
+
+
+def time_call(function, text, repeat=5, warmup=1):
+    """Wall-clock seconds of ``repeat`` calls of ``function(text)``, after ``warmup`` untimed calls."""
+    for _ in range(warmup):
+        function(text)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def peak_memory(function, text):
+    """Peak bytes allocated by Python during one call of ``function(text)``."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        function(text)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def _with_backend(function, backend):
+    # The timed call still includes the tokenization, as when the function is given the text
+    return lambda text: function(utils.AnalyzedDocument(text, backend=backend))
+
+
+def run_benchmarks(functions=tuple(FUNCTIONS), texts=None, repeat=5, warmup=1, progress=None, tokenizer=None):
+    """Benchmark ``functions`` on ``texts`` (from :func:`make_corpora`); returns a baseline dict.
+
+    ``tokenizer`` names the tokenizer backend to time (default: ``SUMMAREASE_TOKENIZER``).
+    """
+    texts = make_corpora() if texts is None else texts
+    backend = utils.get_tokenizer(tokenizer)
+    results = {}
+    for name in functions:
+        function = FUNCTIONS[name]
+        if name in TOKENIZING_FUNCTIONS:
+            function = _with_backend(function, backend)
+        for (corpus, size), text in texts.items():
+            timings = time_call(function, text, repeat=repeat, warmup=warmup)
+            key = f'{name}/{corpus}/{size}'
+            results[key] = {
+                'words': len(text.split()),
+                'repeat': repeat,
+                'mean_ms': statistics.fmean(timings) * 1000,
+                'p95_ms': _percentile(timings, 95) * 1000,
+                'peak_kib': peak_memory(function, text) / 1024,
+            }
+            if progress is not None:
+                progress(key, results[key])
+    return {
+        'format': BASELINE_FORMAT_VERSION,
+        'environment': environment(backend.name),
+        'results': results,
+    }
+
+
+def environment(tokenizer=None):
+    """Versions that benchmark results depend on, and the tokenizer backend benchmarked."""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'django': django.get_version(),
+        'nltk': nltk.__version__,
+        'sklearn': sklearn.__version__,
+        'numpy': np.__version__,
+        'tokenizer': utils.get_tokenizer(tokenizer).name,
+    }
+
+
+def compare(current, baseline, threshold=0.2, metrics=METRICS):
+    """Regressions of ``current`` against ``baseline`` by more than ``threshold`` (a fraction).
+
+    Returns ``(key, metric, baseline_value, current_value, change)`` tuples for
+    every benchmark present in both runs whose metric grew by more than the threshold.
+    """
+    if baseline.get('format') != BASELINE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported baseline format: {baseline.get('format')!r}")
+    regressions = []
+    for key, result in current['results'].items():
+        previous = baseline['results'].get(key)
+        if previous is None:
+            continue
+        for metric in metrics:
+            before, after = previous[metric], result[metric]
+            if before > 0 and (after - before) / before > threshold:
+                regressions.append((key, metric, before, after, (after - before) / before))
+    return regressions
+
+
+def summary_overlap(first, second):
+    """Jaccard overlap of the sentences of two summaries (1.0 when both are empty)."""
+    first, second = set(utils.tokenizer.tokenize(first)), set(utils.tokenizer.tokenize(second))
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def tokenizer_parity(texts, backend=None, reference=None, max_sentences=3):
+    """How far summaries with tokenizer ``backend`` differ from those with ``reference``.
+
+    The backends are tokenizer instances, by default ``RegexTokenizer`` with
+    punkt's abbreviations and ``NLTKTokenizer``. Returns the number of texts,
+    how many summaries are identical, and the mean and lowest sentence overlap
+    (see :func:`summary_overlap`).
+    """
+    backend = backend or utils.RegexTokenizer(utils.punkt_abbreviations())
+    reference = reference or utils.NLTKTokenizer()
+    overlaps = []
+    for text in texts:
+        expected = utils.summarize_text(utils.AnalyzedDocument(text, backend=reference), max_sentences)
+        actual = utils.summarize_text(utils.AnalyzedDocument(text, backend=backend), max_sentences)
+        overlaps.append(1.0 if actual == expected else summary_overlap(expected, actual))
+    return {
+        'texts': len(overlaps),
+        'identical': sum(1 for overlap in overlaps if overlap == 1.0),
+        'mean_overlap': statistics.fmean(overlaps) if overlaps else 1.0,
+        'min_overlap': min(overlaps, default=1.0),
+    }
+
+
+def wire_payloads(texts, batch_size=100):
+    """API payloads to compare wire formats on: a request per text from :func:`make_corpora`, and a batch.
+
+    The batch is ``batch_size`` paragraphs, as a ``/api/sentiment/batch/``
+    request body and as its response.
+    """
+    payloads = {f'request/{corpus}/{size}': {'text': text} for (corpus, size), text in texts.items()}
+    batch = [synthetic_text(SIZES['paragraph'], seed) for seed in range(batch_size)]
+    payloads['batch-request'] = {'texts': batch}
+    results = utils.run_batch('sentiment', batch)
+    payloads['batch-response'] = {'results': results, 'count': len(results)}
+    return payloads
+
+
+def wire_formats():
+    """``{name: (renderer, parser)}`` for the API's formats, and ``{name: (compress, decompress)}``."""
+    serializations = {
+        'json': (JSONRenderer(), formats.LimitedJSONParser()),
+        'msgpack': (formats.MessagePackRenderer(), formats.MessagePackParser()),
+    }
+    compressions = {
+        'gzip': (gzip.compress, gzip.decompress),
+        'zstd': (zstandard.compress, zstandard.decompress),
+    }
+    return serializations, compressions
+
+
+def _unchanged(body):
+    return body
+
+
+def payload_formats(payloads, repeat=5, progress=None):
+    """Encoded size, encode time and parse time of each payload in each wire format.
+
+    Formats are the API's renderers and parsers (JSON, and MessagePack when
+    installed), each also gzip- and zstd-compressed; times include
+    (de)compression. ``relative_size`` is the size over that of plain JSON.
+    """
+    serializations, compressions = wire_formats()
+    codecs = {None: (_unchanged, _unchanged), **compressions}
+    results = {}
+    for payload, data in payloads.items():
+        json_size = None
+        for serialization, (renderer, parser) in serializations.items():
+            for compression, (compress, decompress) in codecs.items():
+                def encode(data):
+                    return compress(renderer.render(data))
+
+                def parse(body):
+                    return parser.parse(io.BytesIO(decompress(body)), renderer.media_type)
+
+                body = encode(data)
+                json_size = json_size or len(body)
+                key = f"{payload}/{serialization}{'+' + compression if compression else ''}"
+                results[key] = {
+                    'bytes': len(body),
+                    'relative_size': len(body) / json_size,
+                    'encode_ms': statistics.median(time_call(encode, data, repeat=repeat)) * 1000,
+                    'parse_ms': statistics.median(time_call(parse, body, repeat=repeat)) * 1000,
+                }
+                if progress is not None:
+                    progress(key, results[key])
+    return {
+        'format': BASELINE_FORMAT_VERSION,
+        'environment': environment(),
+        'results': results,
+    }
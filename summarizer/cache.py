@@ -0,0 +1,159 @@
+"""
+Content-addressed cache for analysis results.
+
+Keys are a SHA-256 over the normalized text, the analysis name, its
+parameters and the model version, so a result is only reused when all of them
+match. Results live in a bounded in-process LRU with a TTL; when
+``DJANGO_CACHE_ALIAS`` is set, they are also written to that Django cache so
+gunicorn workers can share them. Configured by ``settings.SUMMAREASE_RESULT_CACHE``.
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Bump when an analysis changes its output for the same input
+CACHE_FORMAT_VERSION = 1
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 1024,
+    'TTL': 600,
+    'DJANGO_CACHE_ALIAS': None,
+}
+
+
+def normalize_text(text):
+    """Canonical form used for hashing: NFC, Unix line endings, no outer whitespace."""
+    return unicodedata.normalize('NFC', text).replace('\r\n', '\n').strip()
+
+
+def content_hash(text):
+    """SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def make_key(analysis, text_hash, params=None, model_version=None):
+    """Cache key for ``analysis`` of the text with ``content_hash`` ``text_hash``."""
+    payload = json.dumps(
+        [CACHE_FORMAT_VERSION, analysis, text_hash, params or {}, model_version],
+        sort_keys=True,
+        default=str,
+    )
+    return f"summarease:{analysis}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class ResultCache:
+    """Thread-safe LRU with per-entry TTL and an optional shared Django cache tier."""
+
+    def __init__(self, max_entries=1024, ttl=600, django_cache_alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.django_cache_alias = django_cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def _shared(self):
+        return caches[self.django_cache_alias] if self.django_cache_alias else None
+
+    def get(self, key):
+        """Return ``(found, value)``; the value is a copy safe to modify."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(value)
+                del self._entries[key]
+                self.expirations += 1
+
+        shared = self._shared
+        if shared is not None:
+            value = shared.get(key)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, value, now)
+                return True, copy.deepcopy(value)
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value, time.monotonic())
+        shared = self._shared
+        if shared is not None:
+            shared.set(key, value, timeout=self.ttl)
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+_UNSET = object()
+_result_cache = _UNSET
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """The process-wide result cache, or ``None`` when caching is disabled."""
+    global _result_cache
+    if _result_cache is _UNSET:
+        with _result_cache_lock:
+            if _result_cache is _UNSET:
+                config = {**DEFAULTS, **getattr(settings, 'SUMMAREASE_RESULT_CACHE', {})}
+                _result_cache = ResultCache(
+                    max_entries=config['MAX_ENTRIES'],
+                    ttl=config['TTL'],
+                    django_cache_alias=config['DJANGO_CACHE_ALIAS'],
+                ) if config['ENABLED'] else None
+    return _result_cache
+
+
+@receiver(setting_changed)
+def _reset_result_cache(setting, **kwargs):
+    global _result_cache
+    if setting == 'SUMMAREASE_RESULT_CACHE':
+        _result_cache = _UNSET
@@ -0,0 +1,196 @@
+"""
+Compact wire formats for the ``/api/`` endpoints.
+
+:class:`MessagePackParser` and :class:`MessagePackRenderer` let clients send
+and receive ``application/msgpack`` instead of JSON, which skips string
+escaping and is several times faster to encode and parse; most of the size
+saving on long texts comes from compression.
+:class:`RequestDecompressionMiddleware` accepts request bodies compressed
+with ``Content-Encoding: gzip`` or ``zstd``, decompressing them in chunks and
+refusing bodies that expand beyond ``MAX_DECOMPRESSED_BYTES``. JSON and MessagePack bodies
+are read as a stream, by the DRF parsers here and by the async views alike,
+so both serving modes accept the same bodies (Django's
+``DATA_UPLOAD_MAX_MEMORY_SIZE`` check on ``request.body`` would stop the
+async views at 2.5 MB). They have no size limit unless ``MAX_BODY_BYTES`` is
+set, beyond which they are refused with 413. Configured by
+``settings.SUMMAREASE_WIRE``.
+"""
+import gzip
+import io
+import zlib
+
+import msgpack
+import zstandard
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer
+
+from .metrics import stage
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+DEFAULTS = {
+    # Largest JSON or MessagePack request body parsed (None: no limit)
+    'MAX_BODY_BYTES': None,
+    'MAX_DECOMPRESSED_BYTES': 32 * 2 ** 20,
+}
+
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+def wire_config():
+    return {**DEFAULTS, **getattr(settings, 'SUMMAREASE_WIRE', {})}
+
+
+_encoder = DjangoJSONEncoder()
+
+
+def packb(data):
+    """MessagePack encoding of an API payload; dates, UUIDs and decimals become strings as in the JSON."""
+    return msgpack.packb(data, use_bin_type=True, default=_encoder.default)
+
+
+def unpackb(data):
+    """Decode a MessagePack request body; raises ValueError when it is malformed."""
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except Exception as exc:
+        raise ValueError(str(exc) or exc.__class__.__name__)
+
+
+class RequestBodyTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body too large.'
+    default_code = 'request_body_too_large'
+
+
+def read_body(stream):
+    """Read a request body to parse from ``stream``; raises :class:`RequestBodyTooLarge` past ``MAX_BODY_BYTES``."""
+    limit = wire_config()['MAX_BODY_BYTES']
+    try:
+        return read_limited(stream, limit)
+    except BodyTooLarge:
+        raise RequestBodyTooLarge(f'Request body exceeds {limit} bytes')
+
+
+class LimitedJSONParser(JSONParser):
+    """DRF's JSON parser, refusing bodies over ``MAX_BODY_BYTES``."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return super().parse(io.BytesIO(read_body(stream)), media_type, parser_context)
+
+
+class MessagePackParser(BaseParser):
+    """Parses ``application/msgpack`` request bodies."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        body = read_body(stream)
+        try:
+            return unpackb(body)
+        except ValueError as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Renders responses as ``application/msgpack`` for clients that ask for it."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def read_limited(readable, limit):
+    """Read ``readable`` to the end; raises :class:`BodyTooLarge` past ``limit`` bytes (None: no limit)."""
+    chunks = []
+    total = 0
+    while True:
+        chunk = readable.read(DECOMPRESS_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if limit is not None and total > limit:
+            raise BodyTooLarge
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def _gzip_reader(stream):
+    return gzip.GzipFile(fileobj=stream, mode='rb')
+
+
+def _zstd_reader(stream):
+    return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+
+
+DECODERS = {'gzip': _gzip_reader, 'x-gzip': _gzip_reader, 'zstd': _zstd_reader}
+
+_DECODE_ERRORS = (OSError, EOFError, zlib.error, zstandard.ZstdError)
+
+
+class RequestDecompressionMiddleware:
+    """Decompress request bodies sent with a ``Content-Encoding`` of gzip or zstd.
+
+    The body is decompressed a chunk at a time and the request is rejected
+    with 413 as soon as it expands beyond ``MAX_DECOMPRESSED_BYTES``, so a
+    small "zip bomb" cannot exhaust memory. Views then read the plain body.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        error = self._decompress(request)
+        return error or self.get_response(request)
+
+    async def __acall__(self, request):
+        # ASGI requests are already buffered, so reading the body here does not block on the network
+        error = self._decompress(request)
+        return error or await self.get_response(request)
+
+    def _decompress(self, request):
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return None
+        reader = DECODERS.get(encoding)
+        if reader is None:
+            return JsonResponse({'error': f'Unsupported Content-Encoding: {encoding}'}, status=415)
+        limit = wire_config()['MAX_DECOMPRESSED_BYTES']
+        try:
+            with stage('decompress'):
+                body = read_limited(reader(request), limit)
+        except BodyTooLarge:
+            return JsonResponse({'error': f'Decompressed request body exceeds {limit} bytes'}, status=413)
+        except _DECODE_ERRORS:
+            return JsonResponse({'error': f'Invalid {encoding} request body'}, status=400)
+        # The decompressed body replaces the original; MAX_DECOMPRESSED_BYTES is its size limit
+        request._body = body
+        request._stream = io.BytesIO(body)
+        request._read_started = False
+        request.META['CONTENT_LENGTH'] = str(len(body))
+        del request.META['HTTP_CONTENT_ENCODING']
+        return None
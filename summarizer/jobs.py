@@ -0,0 +1,166 @@
+"""
+Background analysis jobs stored in the database.
+
+``POST /api/jobs/`` stores an :class:`~summarizer.models.AnalysisJob` and
+answers at once with its id. ``manage.py run_jobs`` workers claim queued jobs,
+run them with :func:`~summarizer.utils.run_analyses` and store the result,
+which clients poll, or long-poll with ``?wait=<seconds>``, at
+``/api/jobs/<id>/``. A claim is a conditional UPDATE from queued to running,
+so any number of worker processes can share the queue, SQLite included.
+Finished jobs are deleted ``RESULT_TTL`` seconds after they finish; jobs left
+running by a dead worker are requeued after ``STALE_AFTER`` seconds.
+Configured by ``settings.SUMMAREASE_JOBS``.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AnalysisJob
+
+DEFAULTS = {
+    'RESULT_TTL': 3600,
+    'MAX_WAIT': 30,
+    'POLL_INTERVAL': 0.25,
+    'STALE_AFTER': 900,
+    'MAX_ATTEMPTS': 3,
+    # Latency budget of summaries and keywords in jobs (None: always exact)
+    'BUDGET_MS': None,
+}
+
+PRIORITIES = {label: value for value, label in AnalysisJob.Priority.choices}
+
+
+def jobs_config():
+    return {**DEFAULTS, **getattr(settings, 'SUMMAREASE_JOBS', {})}
+
+
+def parse_priority(value):
+    """Priority value for the API name ``value`` (default ``normal``); raises ValueError."""
+    if value is None:
+        return AnalysisJob.Priority.NORMAL
+    if value not in PRIORITIES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+    return PRIORITIES[value]
+
+
+def submit_job(text, analyses, options=None, priority=AnalysisJob.Priority.NORMAL):
+    """Queue an analysis of ``text`` (same ``analyses``/``options`` as :func:`run_analyses`)."""
+    return AnalysisJob.objects.create(
+        text=text, size=len(text), analyses=list(analyses), options=options or {}, priority=priority,
+    )
+
+
+def get_job(job_id):
+    """The job with ``job_id``, or None if there is none or its result has expired."""
+    job = AnalysisJob.objects.filter(id=job_id).first()
+    if job is None or (job.expires_at is not None and job.expires_at <= timezone.now()):
+        return None
+    return job
+
+
+def wait_for_job(job_id, timeout=0):
+    """:func:`get_job`, waiting up to ``timeout`` seconds for the job to finish."""
+    deadline = time.monotonic() + timeout
+    interval = jobs_config()['POLL_INTERVAL']
+    while True:
+        job = get_job(job_id)
+        if job is None or job.finished or time.monotonic() >= deadline:
+            return job
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
+
+
+def job_payload(job):
+    """API representation of ``job``; ``result`` or ``error`` once it has finished."""
+    payload = {
+        'id': str(job.id),
+        'status': job.status,
+        'priority': job.get_priority_display(),
+        'analyses': job.analyses,
+        'created_at': _timestamp(job.created_at),
+        'started_at': _timestamp(job.started_at),
+        'finished_at': _timestamp(job.finished_at),
+        'expires_at': _timestamp(job.expires_at),
+    }
+    if job.status == AnalysisJob.Status.SUCCEEDED:
+        payload['result'] = job.result
+    elif job.status == AnalysisJob.Status.FAILED:
+        payload['error'] = job.error
+    return payload
+
+
+def claim_job(worker, min_priority=None, max_size=None, min_size=None):
+    """Mark the next queued job matching the filters as running by ``worker`` and return it.
+
+    Jobs are taken by priority, then age. Returns None when no job is available.
+    """
+    queued = AnalysisJob.objects.filter(status=AnalysisJob.Status.QUEUED)
+    if min_priority is not None:
+        queued = queued.filter(priority__gte=min_priority)
+    if max_size is not None:
+        queued = queued.filter(size__lte=max_size)
+    if min_size is not None:
+        queued = queued.filter(size__gte=min_size)
+    for job_id in queued.order_by('-priority', 'created_at').values_list('id', flat=True)[:10]:
+        # Only one worker's UPDATE can still see the job queued
+        claimed = AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.Status.QUEUED).update(
+            status=AnalysisJob.Status.RUNNING, worker=worker, started_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return AnalysisJob.objects.get(id=job_id)
+    return None
+
+
+def run_job(job, budget_ms=None):
+    """Run a claimed job and store its result or error; returns the final status.
+
+    Summaries and keywords are computed within ``budget_ms`` (None: exact),
+    without the cap of request budgets. Nothing is stored if the job was
+    meanwhile requeued and claimed by another worker.
+    """
+    from .utils import run_analyses
+
+    try:
+        result = run_analyses(job.text, job.analyses, job.options, budget_ms=budget_ms)
+        status, error = AnalysisJob.Status.SUCCEEDED, ''
+    except Exception as exc:
+        result, status, error = None, AnalysisJob.Status.FAILED, str(exc) or exc.__class__.__name__
+    finished_at = timezone.now()
+    AnalysisJob.objects.filter(id=job.id, status=AnalysisJob.Status.RUNNING, worker=job.worker).update(
+        status=status, result=result, error=error, finished_at=finished_at,
+        expires_at=finished_at + timedelta(seconds=jobs_config()['RESULT_TTL']),
+    )
+    return status
+
+
+def purge_expired():
+    """Delete jobs whose results have expired; returns how many."""
+    deleted, _ = AnalysisJob.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def requeue_stale():
+    """Requeue jobs running for more than ``STALE_AFTER`` seconds (their worker died).
+
+    Jobs that already had ``MAX_ATTEMPTS`` attempts fail instead. Returns
+    ``(requeued, failed)``.
+    """
+    config = jobs_config()
+    now = timezone.now()
+    stale = AnalysisJob.objects.filter(
+        status=AnalysisJob.Status.RUNNING, started_at__lte=now - timedelta(seconds=config['STALE_AFTER']),
+    )
+    failed = stale.filter(attempts__gte=config['MAX_ATTEMPTS']).update(
+        status=AnalysisJob.Status.FAILED, error='The job did not finish', finished_at=now,
+        expires_at=now + timedelta(seconds=config['RESULT_TTL']),
+    )
+    requeued = stale.filter(attempts__lt=config['MAX_ATTEMPTS']).update(
+        status=AnalysisJob.Status.QUEUED, worker='', started_at=None,
+    )
+    return requeued, failed
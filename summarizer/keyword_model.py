@@ -0,0 +1,151 @@
+"""
+Keyword engine with a vocabulary and IDF table fitted offline on a reference corpus.
+
+``manage.py fit_keyword_model`` fits a ``TfidfVectorizer`` over the corpus
+(using the same unigram/bigram terms as :func:`summarizer.utils.extract_keywords`)
+and saves its vocabulary and IDF table as a versioned joblib artifact under
+``settings.KEYWORD_ARTIFACT_DIR``. Requests then only count the document's
+terms and weight them by the stored IDF, so keywords reflect term rarity
+across the corpus instead of frequency in the document alone.
+"""
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import sklearn
+from django.conf import settings
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+ARTIFACT_FILENAME = 'keywords.joblib'
+METADATA_FILENAME = 'metadata.json'
+
+
+class KeywordModel:
+    """Term vocabulary and smoothed IDF weights of a reference corpus."""
+
+    def __init__(self, vocabulary, idf, n_documents):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.n_documents = n_documents
+        # A term never seen in the corpus is as rare as it gets: smooth IDF with df = 0
+        self.unseen_idf = float(np.log(1 + n_documents) + 1)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def transform(self, terms):
+        """TF-IDF weights of a document's ``terms``; returns ``(terms, scores)``.
+
+        Equivalent to ``TfidfVectorizer.transform`` with the fitted IDF, except that
+        terms missing from the vocabulary get :attr:`unseen_idf` instead of being dropped.
+        """
+        counts = Counter(terms)
+        unique = list(counts)
+        indices = np.fromiter((self.vocabulary.get(term, -1) for term in unique), dtype=np.intp, count=len(unique))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(unique))
+        idf = np.where(indices >= 0, self.idf[np.maximum(indices, 0)], self.unseen_idf) if len(unique) else tf
+        return unique, tf * idf
+
+    def top_terms(self, terms, top_k):
+        """The ``top_k`` highest weighted of ``terms``; ties are broken alphabetically."""
+        unique, scores = self.transform(terms)
+        if top_k <= 0 or not unique:
+            return []
+        if top_k < len(unique):
+            # Everything scoring at least the k-th best, then an exact sort of that short list
+            threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(len(unique))
+        ranked = sorted(candidates, key=lambda i: (-scores[i], unique[i]))
+        return [unique[i] for i in ranked[:top_k] if scores[i] > 0]
+
+
+def fit_keyword_model(texts, max_features=50_000, min_df=1):
+    """Fit the vocabulary and IDF table on ``texts``; returns a :class:`KeywordModel`."""
+    from .utils import _keyword_terms, analyze_document
+
+    vectorizer = TfidfVectorizer(analyzer=_keyword_terms, max_features=max_features, min_df=min_df)
+    vectorizer.fit(analyze_document(text) for text in texts)
+    vocabulary = {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+    return KeywordModel(vocabulary, vectorizer.idf_.astype(np.float64), len(texts))
+
+
+def save_keyword_model(model, directory=None, version=None):
+    """Write ``model`` as a new versioned artifact and return its directory."""
+    directory = Path(directory or settings.KEYWORD_ARTIFACT_DIR)
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    target = directory / version
+    if target.exists():
+        raise FileExistsError(f'Keyword artifact version {version} already exists in {directory}')
+    target.mkdir(parents=True)
+    # No compression so the IDF array can be memory-mapped on load
+    joblib.dump(model, target / ARTIFACT_FILENAME)
+    metadata = {
+        'version': version,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'sklearn_version': sklearn.__version__,
+        'n_documents': model.n_documents,
+        'n_terms': len(model),
+    }
+    (target / METADATA_FILENAME).write_text(json.dumps(metadata, indent=2))
+    # Let this process pick up the new artifact; other processes load it on restart
+    _loaded.pop(str(directory), None)
+    return target
+
+
+def available_versions(directory=None):
+    """Versions with a complete artifact in ``directory``, oldest first."""
+    directory = Path(directory or settings.KEYWORD_ARTIFACT_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(
+        path.name for path in directory.iterdir()
+        if (path / ARTIFACT_FILENAME).is_file() and (path / METADATA_FILENAME).is_file()
+    )
+
+
+def load_keyword_model(directory=None, version=None):
+    """Load an artifact (the newest one by default); returns ``(version, model)``.
+
+    Returns ``(None, None)`` when ``directory`` has no artifact, in which case
+    keyword extraction falls back to fitting TF-IDF on the single document.
+    """
+    directory = Path(directory or settings.KEYWORD_ARTIFACT_DIR)
+    versions = available_versions(directory)
+    if version is None:
+        if not versions:
+            return None, None
+        version = versions[-1]
+    elif version not in versions:
+        raise FileNotFoundError(f'Keyword artifact version {version} not found in {directory}')
+    return version, joblib.load(directory / version / ARTIFACT_FILENAME, mmap_mode='r')
+
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def _loaded_keyword_model():
+    key = str(settings.KEYWORD_ARTIFACT_DIR)
+    loaded = _loaded.get(key)
+    if loaded is None:
+        with _load_lock:
+            loaded = _loaded.get(key)
+            if loaded is None:
+                loaded = _loaded[key] = load_keyword_model()
+    return loaded
+
+
+def get_keyword_model():
+    """The keyword model of this process, or ``None`` when no artifact has been fitted."""
+    return _loaded_keyword_model()[1]
+
+
+def get_keyword_model_version():
+    """Version of the artifact returned by :func:`get_keyword_model`, or ``None``."""
+    return _loaded_keyword_model()[0]
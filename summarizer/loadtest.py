@@ -0,0 +1,244 @@
+"""
+Load-testing harness for the ``/api/`` endpoints of a running server.
+
+Requests come either from a JSONL log or from a synthetic mix over the four
+analysis endpoints. They are sent by ``concurrency`` threads over keep-alive
+HTTP connections, optionally paced to a fixed request rate. The report has
+throughput, latency percentiles, the error rate and, when the server's PID is
+given, its resident memory over time (read from ``/proc``, children included
+so gunicorn workers count). Used by ``manage.py loadtest``.
+"""
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from .benchmarks import sample_text, synthetic_text
+from .serving import process_tree
+
+ENDPOINTS = {
+    'summary': '/api/text-summary/',
+    'classification': '/api/classify-text/',
+    'sentiment': '/api/sentiment/',
+    'keywords': '/api/keywords/',
+}
+
+DEFAULT_MIX = {'summary': 1, 'classification': 1, 'sentiment': 1, 'keywords': 1}
+
+
+def parse_mix(value):
+    """Parse ``'summary=3,sentiment=1'`` into endpoint weights; raises ValueError."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f'Weight of {name} must be a number')
+        if mix[name] < 0:
+            raise ValueError(f'Weight of {name} must not be negative')
+    if not any(mix.values()):
+        raise ValueError('The mix needs at least one endpoint with a positive weight')
+    return mix
+
+
+def read_log(path):
+    """Read a JSONL request log into ``(method, path, body)`` tuples or texts.
+
+    Lines with a ``path`` are replayed as recorded (``method`` defaults to POST,
+    ``body`` is the JSON body). Other lines only provide a text (``text``, or a
+    string ``body``) that is sent to an endpoint picked from the mix.
+    """
+    entries = []
+    with Path(path).open(encoding='utf-8') as log:
+        for line_number, line in enumerate(log, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f'{path}:{line_number}: not valid JSON')
+            if not isinstance(record, dict):
+                raise ValueError(f'{path}:{line_number}: expected a JSON object')
+            if 'path' in record:
+                entries.append((record.get('method', 'POST').upper(), record['path'], record.get('body')))
+            elif isinstance(record.get('text'), str):
+                entries.append(record['text'])
+            elif isinstance(record.get('body'), str):
+                entries.append(record['body'])
+            else:
+                raise ValueError(f'{path}:{line_number}: expected "path" or a "text"/"body" string')
+    if not entries:
+        raise ValueError(f'{path} contains no requests')
+    return entries
+
+
+def synthetic_texts(count=100, min_words=50, max_words=500, seed=0):
+    """``count`` distinct texts, half synthetic and half sample prose, of varied length."""
+    rng = random.Random(seed)
+    texts = []
+    for index in range(count):
+        n_words = rng.randint(min_words, max_words)
+        texts.append(synthetic_text(n_words, seed=seed + index) if index % 2 else sample_text(n_words))
+    return texts
+
+
+def request_stream(entries, mix=DEFAULT_MIX, seed=0):
+    """Endless ``(method, path, body)`` requests cycling through ``entries``.
+
+    ``entries`` items are either full requests or texts; texts go to an endpoint
+    drawn from ``mix``.
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    for entry in itertools.cycle(entries):
+        if isinstance(entry, tuple):
+            yield entry
+        else:
+            name = rng.choices(names, weights)[0]
+            yield 'POST', ENDPOINTS[name], {'text': entry}
+
+
+def process_rss(pid):
+    """Resident memory in bytes of ``pid`` and all of its descendants (Linux only)."""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            status = Path(f'/proc/{current}/status').read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1]) * 1024
+                break
+    return total
+
+
+class _RSSSampler(threading.Thread):
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.started_at = time.perf_counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while True:
+            self.samples.append((time.perf_counter() - self.started_at, process_rss(self.pid)))
+            if self._done.wait(self.interval):
+                break
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class _Client(threading.local):
+    # One keep-alive connection per worker thread
+    connection = None
+
+
+def run_load(base_url, requests, total, concurrency=4, rate=None, timeout=30.0, server_pid=None,
+             sample_interval=1.0):
+    """Send ``total`` requests from the ``requests`` iterator and return the report dict.
+
+    ``rate`` (requests per second) paces the start times; without it every
+    thread sends as fast as the server answers.
+    """
+    url = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    prefix = url.path.rstrip('/')
+    client = _Client()
+    lock = threading.Lock()
+    results = []
+
+    def send(index, method, path, body):
+        if rate:
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        began = time.perf_counter()
+        try:
+            if client.connection is None:
+                client.connection = connection_class(url.hostname, url.port, timeout=timeout)
+            client.connection.request(method, prefix + path, body=payload, headers=headers)
+            response = client.connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            if client.connection is not None:
+                client.connection.close()
+            client.connection = None
+            status = None
+        elapsed = time.perf_counter() - began
+        with lock:
+            results.append((path, status, elapsed))
+
+    sampler = _RSSSampler(server_pid, sample_interval) if server_pid else None
+    if sampler is not None:
+        sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, (method, path, body) in enumerate(itertools.islice(requests, total)):
+            executor.submit(send, index, method, path, body)
+    duration = time.perf_counter() - start
+    if sampler is not None:
+        sampler.stop()
+    return summarize_results(results, duration, sampler.samples if sampler is not None else [])
+
+
+def _latency_stats(latencies):
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None, 'max_ms': None}
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(values.mean()),
+        'max_ms': float(values.max()),
+    }
+
+
+def summarize_results(results, duration, rss_samples=()):
+    """Report dict from ``(path, status, seconds)`` results; ``status`` is None on connection errors."""
+    def report(items):
+        errors = sum(1 for _, status, _ in items if status is None or status >= 400)
+        return {
+            'requests': len(items),
+            'errors': errors,
+            'error_rate': errors / len(items) if items else 0.0,
+            **_latency_stats([elapsed for _, _, elapsed in items]),
+        }
+
+    by_path = {}
+    for item in results:
+        by_path.setdefault(item[0], []).append(item)
+    rss = [{'t': round(t, 3), 'rss_mib': value / 2 ** 20} for t, value in rss_samples]
+    return {
+        'duration_s': duration,
+        'throughput_rps': len(results) / duration if duration else 0.0,
+        **report(results),
+        'endpoints': {path: report(items) for path, items in sorted(by_path.items())},
+        'status_codes': {
+            str(status): sum(1 for _, s, _ in results if s == status)
+            for status in sorted({status for _, status, _ in results}, key=str)
+        },
+        'rss': rss,
+        'peak_rss_mib': max((sample['rss_mib'] for sample in rss), default=None),
+    }
@@ -0,0 +1,103 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.benchmarks import (
+    CORPORA, FUNCTIONS, SIZES, compare, make_corpora, payload_formats, run_benchmarks, wire_payloads,
+)
+from summarizer.utils import TOKENIZERS
+
+
+def _choices(value, allowed, name):
+    chosen = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in chosen if item not in allowed]
+    if unknown:
+        raise CommandError(f"Unknown {name}: {', '.join(unknown)} (choose from {', '.join(allowed)})")
+    return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the summarizer analysis functions on synthetic and sample corpora "
+        "(mean/p95 time, tracemalloc peak memory). Write the results as a JSON "
+        "baseline and/or compare them with a previous baseline. With --payloads, compare "
+        "API payload sizes and parse times as JSON and MessagePack, plain and compressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--functions', default=','.join(FUNCTIONS),
+                            help=f"Comma-separated functions (default: all of {', '.join(FUNCTIONS)}).")
+        parser.add_argument('--sizes', default=','.join(SIZES),
+                            help=f"Comma-separated corpus sizes (default: {', '.join(SIZES)}).")
+        parser.add_argument('--corpora', default=','.join(CORPORA),
+                            help=f"Comma-separated corpora (default: {', '.join(CORPORA)}).")
+        parser.add_argument('--sample-file', help='Text file (e.g. a book) for the sample corpus.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed calls per benchmark (default: 5).')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed calls first (default: 1).')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Baseline JSON file to compare the results with.')
+        parser.add_argument('--tokenizer', choices=list(TOKENIZERS),
+                            help='Tokenizer backend to benchmark (default: SUMMAREASE_TOKENIZER).')
+        parser.add_argument('--payloads', action='store_true',
+                            help='Benchmark the wire formats on request/response payloads of the corpora '
+                                 'instead of the analysis functions.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative increase counted as a regression (default: 0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        functions = _choices(options['functions'], FUNCTIONS, 'functions')
+        sizes = _choices(options['sizes'], SIZES, 'sizes')
+        corpora = _choices(options['corpora'], CORPORA, 'corpora')
+        if options['payloads'] and options['compare']:
+            raise CommandError('--compare is not supported with --payloads')
+        baseline = self._read_baseline(Path(options['compare'])) if options['compare'] else None
+
+        try:
+            texts = make_corpora(sizes, corpora, options['sample_file'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot build the sample corpus: {exc}')
+        if options['payloads']:
+            results = payload_formats(wire_payloads(texts), repeat=options['repeat'], progress=self._report_payload)
+        else:
+            results = run_benchmarks(
+                functions, texts, repeat=options['repeat'], warmup=options['warmup'], progress=self._report,
+                tokenizer=options['tokenizer'],
+            )
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(f"Wrote {options['output']}")
+        if baseline is not None:
+            self._compare(results, baseline, options['threshold'])
+
+    def _report(self, key, result):
+        self.stdout.write(
+            f"{key:<50} mean {result['mean_ms']:10.2f} ms   p95 {result['p95_ms']:10.2f} ms   "
+            f"peak {result['peak_kib']:10.1f} KiB"
+        )
+
+    def _report_payload(self, key, result):
+        self.stdout.write(
+            f"{key:<50} {result['bytes']:>12,} B ({result['relative_size']:6.1%})   "
+            f"encode {result['encode_ms']:9.2f} ms   parse {result['parse_ms']:9.2f} ms"
+        )
+
+    def _read_baseline(self, path):
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read baseline: {exc}')
+
+    def _compare(self, results, baseline, threshold):
+        try:
+            regressions = compare(results, baseline, threshold)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for key, metric, before, after, change in regressions:
+            self.stdout.write(self.style.ERROR(f'{key} {metric}: {before:.2f} -> {after:.2f} (+{change:.0%})'))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) above {threshold:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions above {threshold:.0%}'))
@@ -0,0 +1,61 @@
+import shutil
+from pathlib import Path
+
+import nltk
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.nltk_resources import NLTK_RESOURCES, missing_resources
+
+
+class Command(BaseCommand):
+    help = (
+        "Install the NLTK data the summarizer needs into settings.NLTK_DATA_DIR, "
+        "either by downloading it or by copying it from a local nltk_data directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='Copy the resources from this nltk_data directory instead of downloading them.',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report whether the resources are installed; exit non-zero if not.',
+        )
+
+    def handle(self, *args, **options):
+        target = Path(settings.NLTK_DATA_DIR)
+        if options['check']:
+            return self._check()
+
+        target.mkdir(parents=True, exist_ok=True)
+        for name, path in NLTK_RESOURCES.items():
+            if options['source']:
+                self._copy(Path(options['source']), target, path)
+            elif not nltk.download(name, download_dir=str(target), quiet=True, raise_on_error=True):
+                raise CommandError(f'Could not download NLTK package {name!r}')
+            self.stdout.write(f'Installed {name} into {target}')
+        self._check()
+
+    def _copy(self, source, target, path):
+        # Packages may be vendored unpacked or as the .zip nltk.download produces
+        candidates = [path, f'{path}.zip'] if not path.endswith('.zip') else [path]
+        for candidate in candidates:
+            src = source / candidate
+            dst = target / candidate
+            if src.is_dir():
+                shutil.copytree(src, dst, dirs_exist_ok=True)
+                return
+            if src.is_file():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+                return
+        raise CommandError(f'{path} not found under {source}')
+
+    def _check(self):
+        missing = missing_resources()
+        if missing:
+            raise CommandError(f"Missing NLTK data: {', '.join(missing)}")
+        self.stdout.write(self.style.SUCCESS('All NLTK resources are installed.'))
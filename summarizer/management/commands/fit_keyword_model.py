@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.keyword_model import fit_keyword_model, save_keyword_model
+from summarizer.text_classifier_model import training_texts
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit the keyword vocabulary and IDF table on a reference corpus and save it "
+        "as a versioned joblib artifact under settings.KEYWORD_ARTIFACT_DIR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corpus',
+            help='JSONL file with one {"text": ...} object per line (other keys are ignored). '
+                 'Defaults to the built-in example corpus.',
+        )
+        parser.add_argument('--max-features', type=int, default=50_000, help='Vocabulary size limit (default: 50000).')
+        parser.add_argument('--min-df', type=int, default=1, help='Drop terms found in fewer documents (default: 1).')
+        parser.add_argument('--output-dir', help='Artifact directory (default: settings.KEYWORD_ARTIFACT_DIR).')
+        parser.add_argument('--artifact-version', help='Artifact version (default: UTC timestamp).')
+
+    def handle(self, *args, **options):
+        texts = self._read_corpus(Path(options['corpus'])) if options['corpus'] else training_texts
+        try:
+            model = fit_keyword_model(texts, max_features=options['max_features'], min_df=options['min_df'])
+        except ValueError as exc:
+            # e.g. min_df leaves no terms
+            raise CommandError(str(exc))
+        try:
+            target = save_keyword_model(
+                model,
+                directory=options['output_dir'] or settings.KEYWORD_ARTIFACT_DIR,
+                version=options['artifact_version'],
+            )
+        except FileExistsError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Fitted {len(model)} terms on {model.n_documents} documents; saved {target}'
+        ))
+
+    def _read_corpus(self, path):
+        texts = []
+        try:
+            with path.open(encoding='utf-8') as corpus:
+                for line_number, line in enumerate(corpus, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        texts.append(json.loads(line)['text'])
+                    except (ValueError, KeyError, TypeError):
+                        raise CommandError(f'{path}:{line_number}: expected {{"text": ...}}')
+        except OSError as exc:
+            raise CommandError(f'Cannot read corpus: {exc}')
+        if not texts:
+            raise CommandError(f'{path} contains no documents')
+        return texts
@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.loadtest import DEFAULT_MIX, parse_mix, read_log, request_stream, run_load, synthetic_texts
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a JSONL request log, or send a synthetic mix of requests to the four "
+        "analysis endpoints, against a running server and report throughput, latency "
+        "percentiles, error rate and server memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL (default: %(default)s).')
+        parser.add_argument('--log', help='JSONL request log to replay (default: synthetic traffic).')
+        parser.add_argument('--mix', default=','.join(f'{name}=1' for name in DEFAULT_MIX),
+                            help='Endpoint weights for texts without a path (default: %(default)s).')
+        parser.add_argument('--requests', type=int, default=200, help='Number of requests (default: 200).')
+        parser.add_argument('--concurrency', type=int, default=4, help='Parallel clients (default: 4).')
+        parser.add_argument('--rate', type=float, help='Target requests per second (default: unpaced).')
+        parser.add_argument('--texts', type=int, default=100, help='Distinct synthetic texts (default: 100).')
+        parser.add_argument('--min-words', type=int, default=50, help='Shortest synthetic text (default: 50).')
+        parser.add_argument('--max-words', type=int, default=500, help='Longest synthetic text (default: 500).')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds.')
+        parser.add_argument('--server-pid', type=int, help='PID of the server (e.g. the gunicorn master) to sample RSS.')
+        parser.add_argument('--sample-interval', type=float, default=1.0, help='RSS sampling interval in seconds.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for texts and the endpoint mix.')
+        parser.add_argument('--output', help='Also write the full report as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1')
+        if options['rate'] is not None and options['rate'] <= 0:
+            raise CommandError('--rate must be positive')
+        if options['server_pid'] and not Path(f"/proc/{options['server_pid']}").exists():
+            raise CommandError(f"No process {options['server_pid']} in /proc")
+        try:
+            mix = parse_mix(options['mix'])
+            if options['log']:
+                entries = read_log(options['log'])
+            else:
+                entries = synthetic_texts(options['texts'], options['min_words'], options['max_words'], options['seed'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        report = run_load(
+            options['url'],
+            request_stream(entries, mix, options['seed']),
+            options['requests'],
+            concurrency=options['concurrency'],
+            rate=options['rate'],
+            timeout=options['timeout'],
+            server_pid=options['server_pid'],
+            sample_interval=options['sample_interval'],
+        )
+        self._print(report)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def _print(self, report):
+        def latency(stats):
+            if stats['p50_ms'] is None:
+                return 'no responses'
+            return f"p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms"
+
+        self.stdout.write(
+            f"{report['requests']} requests in {report['duration_s']:.2f} s: "
+            f"{report['throughput_rps']:.1f} req/s, error rate {report['error_rate']:.2%}"
+        )
+        self.stdout.write(f"  all{'':<22} {latency(report)}")
+        for path, stats in report['endpoints'].items():
+            self.stdout.write(f"  {path:<25} {latency(stats)}  ({stats['requests']} requests, {stats['errors']} errors)")
+        self.stdout.write(f"  status codes: {report['status_codes']}")
+        if report['rss']:
+            samples = ', '.join(f"{sample['t']:.0f}s {sample['rss_mib']:.0f}" for sample in report['rss'])
+            self.stdout.write(f"  server RSS (MiB): {samples}; peak {report['peak_rss_mib']:.0f}")
@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.serving import memory_report
+
+MIB = 2 ** 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the unique and shared memory of a server process (e.g. the gunicorn "
+        "master) and each of its workers, from /proc/<pid>/smaps_rollup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pid', type=int, help='PID of the server (master) process.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        pid = options['pid']
+        if not Path(f'/proc/{pid}').exists():
+            raise CommandError(f'No process {pid} in /proc')
+        report = memory_report(pid)
+        if not report['processes']:
+            raise CommandError(f'Cannot read the memory maps of process {pid}')
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{'pid':>8} {'role':<7} {'rss':>9} {'pss':>9} {'unique':>9} {'shared':>9} {'swap':>8}  (MiB)")
+        for process in report['processes']:
+            self.stdout.write(
+                f"{process['pid']:>8} {process['role']:<7} {process['rss'] / MIB:>9.1f} {process['pss'] / MIB:>9.1f} "
+                f"{process['unique'] / MIB:>9.1f} {process['shared'] / MIB:>9.1f} {process['swap'] / MIB:>8.1f}"
+            )
+        self.stdout.write(
+            f"Total PSS {report['total_pss'] / MIB:.1f} MiB, unique {report['total_unique'] / MIB:.1f} MiB"
+        )
+        if report['worker_unique_mean'] is not None:
+            self.stdout.write(f"Each additional worker adds about {report['worker_unique_mean'] / MIB:.1f} MiB")
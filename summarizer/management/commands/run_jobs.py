@@ -0,0 +1,118 @@
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from summarizer.jobs import PRIORITIES, claim_job, jobs_config, purge_expired, requeue_stale, run_job
+
+# Seconds between expiry and stale-job sweeps
+MAINTENANCE_INTERVAL = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued analysis jobs from /api/jobs/. Start several workers for more "
+        "throughput; filter by priority and size to keep large documents away from "
+        "interactive traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Jobs this worker runs at once, in threads (default: 1).')
+        parser.add_argument('--min-priority', choices=list(PRIORITIES),
+                            help='Only take jobs of at least this priority.')
+        parser.add_argument('--max-size', type=int, help='Only take texts of at most this many characters.')
+        parser.add_argument('--min-size', type=int, help='Only take texts of at least this many characters.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between queue checks when idle (default: 1).')
+        parser.add_argument('--once', action='store_true', help='Exit when no matching job is left.')
+        parser.add_argument('--name', help='Worker name stored on claimed jobs (default: host:pid).')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        self.name = options['name'] or f'{socket.gethostname()}:{os.getpid()}'
+        self.filters = {
+            'min_priority': PRIORITIES[options['min_priority']] if options['min_priority'] else None,
+            'max_size': options['max_size'],
+            'min_size': options['min_size'],
+        }
+        # Jobs are the place for exact analyses of long texts: their own budget, no request cap
+        self.budget_ms = jobs_config()['BUDGET_MS']
+        self.stopping = threading.Event()
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            # SIGTERM/SIGINT: stop claiming, let running jobs finish
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, lambda *_: self.stopping.set())
+
+        self.stdout.write(f'Worker {self.name} started')
+        try:
+            if options['concurrency'] == 1:
+                self._run_serial(options)
+            else:
+                self._run_threaded(options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'Worker {self.name} stopped')
+
+    def _maintain(self):
+        now = time.monotonic()
+        if now - getattr(self, '_last_maintenance', float('-inf')) < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = now
+        purged = purge_expired()
+        requeued, failed = requeue_stale()
+        if purged or requeued or failed:
+            self.stdout.write(f'Purged {purged} expired, requeued {requeued} and failed {failed} stale jobs')
+
+    def _run(self, job):
+        started = time.monotonic()
+        status = run_job(job, budget_ms=self.budget_ms)
+        self.stdout.write(f'Job {job.id} {status} in {time.monotonic() - started:.2f} s')
+
+    def _run_in_thread(self, job):
+        try:
+            self._run(job)
+        finally:
+            # Each thread has its own database connection
+            connections.close_all()
+
+    def _run_serial(self, options):
+        while not self.stopping.is_set():
+            self._maintain()
+            job = claim_job(self.name, **self.filters)
+            if job is not None:
+                self._run(job)
+            elif options['once']:
+                break
+            else:
+                self.stopping.wait(options['poll_interval'])
+
+    def _run_threaded(self, options):
+        running = set()
+        with ThreadPoolExecutor(max_workers=options['concurrency'], thread_name_prefix='job') as executor:
+            while not self.stopping.is_set():
+                self._maintain()
+                # Fill free slots; claiming only what can start keeps the rest for other workers
+                while len(running) < options['concurrency']:
+                    job = claim_job(self.name, **self.filters)
+                    if job is None:
+                        break
+                    running.add(executor.submit(self._run_in_thread, job))
+                if not running and options['once']:
+                    break
+                if running:
+                    done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                else:
+                    self.stopping.wait(options['poll_interval'])
+            # Running jobs finish before the worker exits
+            wait(running)
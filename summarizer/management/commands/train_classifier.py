@@ -0,0 +1,60 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.text_classifier_model import save_classifier, train_classifier, training_texts
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit the TF-IDF + Multinomial NB classifier and save it as a versioned "
+        "joblib artifact under settings.CLASSIFIER_ARTIFACT_DIR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corpus',
+            help='JSONL file with one {"text": ..., "label": ...} object per line. '
+                 'Defaults to the built-in example corpus.',
+        )
+        parser.add_argument('--output-dir', help='Artifact directory (default: settings.CLASSIFIER_ARTIFACT_DIR).')
+        parser.add_argument('--artifact-version', help='Artifact version (default: UTC timestamp).')
+
+    def handle(self, *args, **options):
+        texts = labels = None
+        if options['corpus']:
+            texts, labels = self._read_corpus(Path(options['corpus']))
+        n_samples = len(texts) if texts is not None else len(training_texts)
+
+        classifier = train_classifier(texts, labels)
+        try:
+            target = save_classifier(
+                classifier,
+                directory=options['output_dir'] or settings.CLASSIFIER_ARTIFACT_DIR,
+                version=options['artifact_version'],
+                n_samples=n_samples,
+            )
+        except FileExistsError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Trained on {n_samples} samples; saved {target}'))
+
+    def _read_corpus(self, path):
+        texts, labels = [], []
+        try:
+            with path.open(encoding='utf-8') as corpus:
+                for line_number, line in enumerate(corpus, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        texts.append(record['text'])
+                        labels.append(record['label'])
+                    except (ValueError, KeyError, TypeError):
+                        raise CommandError(f'{path}:{line_number}: expected {{"text": ..., "label": ...}}')
+        except OSError as exc:
+            raise CommandError(f'Cannot read corpus: {exc}')
+        if not texts:
+            raise CommandError(f'{path} contains no training samples')
+        return texts, labels
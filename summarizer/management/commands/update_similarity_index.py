@@ -0,0 +1,55 @@
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer.similarity import store_documents, update_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Add the documents stored since the last run to the similar-document index under "
+        "settings.SIMILARITY_INDEX_DIR as a new segment, merging small segments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corpus',
+            help='JSONL file with one {"text": ...} object per line to store as documents first '
+                 '(texts already stored are skipped).',
+        )
+        parser.add_argument('--rebuild', action='store_true', help='Index every document from scratch.')
+        parser.add_argument('--merge', action='store_true', help='Merge all segments into one.')
+        parser.add_argument('--index-dir', help='Index directory (default: settings.SIMILARITY_INDEX_DIR).')
+
+    def handle(self, *args, **options):
+        if options['corpus']:
+            stored = store_documents(self._read_corpus(Path(options['corpus'])))
+            self.stdout.write(f'Read {stored} documents from {options["corpus"]}')
+        started = time.perf_counter()
+        manifest = update_index(
+            directory=options['index_dir'] or settings.SIMILARITY_INDEX_DIR,
+            rebuild=options['rebuild'],
+            merge=options['merge'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {manifest['documents']} documents in {len(manifest['segments'])} segment(s) "
+            f"({time.perf_counter() - started:.1f}s)"
+        ))
+
+    def _read_corpus(self, path):
+        try:
+            with path.open(encoding='utf-8') as corpus:
+                for line_number, line in enumerate(corpus, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        text = json.loads(line)['text']
+                    except (ValueError, KeyError, TypeError):
+                        raise CommandError(f'{path}:{line_number}: expected {{"text": ...}}')
+                    if isinstance(text, str) and text:
+                        yield text
+        except OSError as exc:
+            raise CommandError(f'Cannot read corpus: {exc}')
@@ -0,0 +1,285 @@
+"""
+Per-stage request timings, ``Server-Timing`` headers and Prometheus metrics.
+
+Code marks its stages with ``with stage('word_tokenize'):``. While
+``TimingMiddleware`` handles a request and ``settings.SUMMAREASE_METRICS`` is
+on, the time spent in each stage is summed per request. It is sent back as a
+``Server-Timing`` header and recorded in latency histograms per endpoint,
+stage and request-size bucket, which ``/api/metrics/`` serves in the
+Prometheus text format. When metrics are off, ``stage()`` returns a shared
+no-op context manager after a single context-variable lookup.
+
+Histograms live in the process that served the request; with several
+gunicorn workers, each worker reports its own. Stages that run in the
+analysis process pool (async serving mode, long documents) are not broken
+down; their time falls in the enclosing stage.
+"""
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Request body size buckets: (upper bound in bytes, label)
+SIZE_BUCKETS = ((1_000, '1KB'), (10_000, '10KB'), (100_000, '100KB'), (1_000_000, '1MB'))
+LARGEST_SIZE_BUCKET = 'inf'
+
+_current = ContextVar('summarease_timings', default=None)
+_NOOP = nullcontext()
+_END = object()
+
+
+class _Stage:
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+
+
+def stage(name):
+    """Context manager timing the enclosed block as stage ``name`` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        return _NOOP
+    return _Stage(timings, name)
+
+
+def timing_active():
+    """Whether stages of the current request are being timed."""
+    return _current.get() is not None
+
+
+def size_bucket(size):
+    """Label of the request-size bucket for a body of ``size`` bytes."""
+    for limit, label in SIZE_BUCKETS:
+        if size <= limit:
+            return label
+    return LARGEST_SIZE_BUCKET
+
+
+class Histogram:
+    """Cumulative latency histograms keyed by label values, Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def series(self):
+        """``(labels, cumulative bucket counts, sum, count)`` for every label set."""
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        result = []
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = []
+            running = 0
+            for value in counts:
+                running += value
+                cumulative.append(running)
+            result.append((labels, cumulative, total, count))
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+# Labels: (endpoint, stage, size bucket)
+stage_seconds = Histogram()
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+def _model_versions():
+    from .keyword_model import get_keyword_model_version
+    from .text_classifier_model import get_classifier_version
+
+    versions = {}
+    try:
+        versions['classifier'] = get_classifier_version()
+    except ImproperlyConfigured:
+        pass
+    keyword_version = get_keyword_model_version()
+    if keyword_version is not None:
+        versions['keywords'] = keyword_version
+    return versions
+
+
+def render_prometheus():
+    """All metrics of this process in the Prometheus text exposition format."""
+    from .cache import get_result_cache
+    from .near_duplicates import get_near_duplicate_index
+
+    lines = [
+        '# HELP summarease_stage_seconds Time spent in each stage of a request.',
+        '# TYPE summarease_stage_seconds histogram',
+    ]
+    names = ('endpoint', 'stage', 'size')
+    for labels, cumulative, total, count in stage_seconds.series():
+        label_text = _format_labels(names, labels)
+        for bound, value in zip(stage_seconds.buckets, cumulative):
+            lines.append(f'summarease_stage_seconds_bucket{{{label_text},le="{bound}"}} {value}')
+        lines.append(f'summarease_stage_seconds_bucket{{{label_text},le="+Inf"}} {count}')
+        lines.append(f'summarease_stage_seconds_sum{{{label_text}}} {total}')
+        lines.append(f'summarease_stage_seconds_count{{{label_text}}} {count}')
+
+    lines.append('# HELP summarease_model_info Model version served by this process.')
+    lines.append('# TYPE summarease_model_info gauge')
+    for model, version in _model_versions().items():
+        lines.append(f'summarease_model_info{{{_format_labels(("model", "version"), (model, version))}}} 1')
+
+    cache = get_result_cache()
+    if cache is not None:
+        stats = cache.stats()
+        for counter in ('hits', 'shared_hits', 'misses', 'evictions', 'expirations'):
+            lines.append(f'# TYPE summarease_result_cache_{counter}_total counter')
+            lines.append(f'summarease_result_cache_{counter}_total {stats[counter]}')
+        lines.append('# TYPE summarease_result_cache_entries gauge')
+        lines.append(f"summarease_result_cache_entries {stats['entries']}")
+    near_duplicates = get_near_duplicate_index()
+    if near_duplicates is not None:
+        stats = near_duplicates.stats()
+        for counter in ('lookups', 'matches'):
+            lines.append(f'# TYPE summarease_near_duplicate_{counter}_total counter')
+            lines.append(f'summarease_near_duplicate_{counter}_total {stats[counter]}')
+        lines.append('# TYPE summarease_near_duplicate_entries gauge')
+        lines.append(f"summarease_near_duplicate_entries {stats['entries']}")
+    return '\n'.join(lines) + '\n'
+
+
+def _server_timing(timings):
+    return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in timings.items())
+
+
+class TimingMiddleware:
+    """Time each request's stages when ``settings.SUMMAREASE_METRICS`` is on.
+
+    Adds a ``Server-Timing`` header with the per-stage durations (in ms, plus
+    ``total``) and records them in :data:`stage_seconds`, labeled by URL name
+    and request-size bucket. Requests that do not resolve to a named route,
+    and the metrics endpoint itself, are not recorded.
+
+    Streaming responses send their headers before the body is generated, so
+    they carry no ``Server-Timing`` header; their stages and ``total`` are
+    recorded once the last chunk has been sent (or the client went away).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.SUMMAREASE_METRICS:
+            return self.get_response(request)
+        timings = {}
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        if not settings.SUMMAREASE_METRICS:
+            return await self.get_response(request)
+        timings = {}
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, start)
+
+    def _finish(self, request, response, timings, start):
+        match = request.resolver_match
+        endpoint = match.url_name if match is not None else None
+        if endpoint is None or endpoint == 'metrics':
+            return response
+        if response.streaming:
+            timed = self._timed_async_content if response.is_async else self._timed_content
+            response.streaming_content = timed(response.streaming_content, request, endpoint, timings, start)
+            return response
+        timings['total'] = time.perf_counter() - start
+        response['Server-Timing'] = _server_timing(timings)
+        self._record(request, endpoint, timings)
+        return response
+
+    def _timed_content(self, content, request, endpoint, timings, start):
+        # Stages run while the server pulls each chunk, outside __call__
+        iterator = iter(content)
+        try:
+            while True:
+                token = _current.set(timings)
+                try:
+                    chunk = next(iterator, _END)
+                finally:
+                    _current.reset(token)
+                if chunk is _END:
+                    break
+                yield chunk
+        finally:
+            timings['total'] = time.perf_counter() - start
+            self._record(request, endpoint, timings)
+
+    async def _timed_async_content(self, content, request, endpoint, timings, start):
+        iterator = aiter(content)
+        try:
+            while True:
+                token = _current.set(timings)
+                try:
+                    chunk = await anext(iterator, _END)
+                finally:
+                    _current.reset(token)
+                if chunk is _END:
+                    break
+                yield chunk
+        finally:
+            timings['total'] = time.perf_counter() - start
+            self._record(request, endpoint, timings)
+
+    def _record(self, request, endpoint, timings):
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = 0
+        bucket = size_bucket(size)
+        for name, seconds in timings.items():
+            stage_seconds.observe((endpoint, name, bucket), seconds)
@@ -1,3 +1,72 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class AnalysisJob(models.Model):
+    """An analysis of one text, queued by ``/api/jobs/`` and run by ``manage.py run_jobs``.
+
+    Workers claim the highest-priority, oldest queued job; the result is kept
+    until ``expires_at`` and then deleted. See ``summarizer/jobs.py``.
+    """
+
+    class Priority(models.IntegerChoices):
+        LOW = 0, 'low'
+        NORMAL = 5, 'normal'
+        HIGH = 10, 'high'
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued'
+        RUNNING = 'running'
+        SUCCEEDED = 'succeeded'
+        FAILED = 'failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    text = models.TextField()
+    # Characters in text, so workers can leave large documents to dedicated workers
+    size = models.PositiveIntegerField()
+    analyses = models.JSONField()
+    options = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(choices=Priority.choices, default=Priority.NORMAL)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'created_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'created_at'], name='job_claim_order'),
+            models.Index(fields=['expires_at'], name='job_expiry'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} ({self.get_status_display()})'
+
+    @property
+    def finished(self):
+        return self.status in (self.Status.SUCCEEDED, self.Status.FAILED)
+
+
+class Document(models.Model):
+    """A text kept for similar-document search (see ``summarizer/similarity.py``).
+
+    ``manage.py update_similarity_index`` adds documents to the on-disk index
+    in order of ``id``; texts are stored once per ``content_hash``.
+    """
+
+    text = models.TextField()
+    content_hash = models.CharField(max_length=64, unique=True)
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f'Document {self.id} ({self.size} characters)'
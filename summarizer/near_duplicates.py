@@ -0,0 +1,172 @@
+"""
+Near-duplicate detection for the result cache.
+
+Texts that differ only in whitespace, a boilerplate footer or a timestamp get
+different content hashes, so the exact cache misses them. Each analyzed text
+also gets a 64-bit SimHash of its word bigrams, taken from the tokens of its
+:class:`~summarizer.utils.AnalyzedDocument` with digits masked, and the
+fingerprints of recently analyzed texts are kept in a banded LSH index. A text
+whose fingerprint is within ``THRESHOLD`` (the fraction of equal bits) of an
+indexed one reuses that text's cached results, marked with
+``near_duplicate_of``. The fingerprint is split into one more band than the
+bits allowed to differ, so by the pigeonhole principle every match within the
+threshold shares a band with the query. Configured by
+``settings.SUMMAREASE_NEAR_DUPLICATES``; needs the result cache.
+"""
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Fraction of the 64 fingerprint bits that must agree
+    'THRESHOLD': 0.85,
+    # Fingerprints of recently analyzed texts kept in the index
+    'MAX_ENTRIES': 10_000,
+    # Shorter texts are too short for a reliable fingerprint and are only matched exactly
+    'MIN_TOKENS': 20,
+}
+
+FINGERPRINT_BITS = 64
+
+_DIGIT_RE = re.compile(r'\d')
+_BIT_POSITIONS = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def simhash(tokens):
+    """64-bit SimHash of the bigrams of ``tokens`` (of the tokens themselves if there is one)."""
+    # Numbers and timestamps vary between otherwise identical texts
+    tokens = [_DIGIT_RE.sub('0', token) for token in tokens]
+    features = Counter(' '.join(pair) for pair in zip(tokens, tokens[1:])) or Counter(tokens)
+    if not features:
+        return 0
+    hashes = np.fromiter((_feature_hash(feature) for feature in features), dtype=np.uint64, count=len(features))
+    weights = np.fromiter(features.values(), dtype=np.int64, count=len(features))
+    bits = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).astype(np.int64)
+    # Each feature votes +weight for its set bits and -weight for the others
+    votes = weights @ (2 * bits - 1)
+    return sum(1 << int(position) for position in np.flatnonzero(votes > 0))
+
+
+def document_fingerprint(doc):
+    """Fingerprint of an :class:`~summarizer.utils.AnalyzedDocument`, or None if it is too short."""
+    if len(doc.tokens) < near_duplicate_config()['MIN_TOKENS']:
+        return None
+    return simhash(doc.tokens)
+
+
+def max_distance(threshold):
+    """Largest number of differing bits within ``threshold``."""
+    return int((1 - threshold) * FINGERPRINT_BITS + 1e-9)
+
+
+class NearDuplicateIndex:
+    """Thread-safe LRU of fingerprints by content hash, with banded LSH lookup."""
+
+    def __init__(self, threshold=0.85, max_entries=10_000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_distance = max_distance(threshold)
+        bands = min(self.max_distance + 1, FINGERPRINT_BITS)
+        edges = [round(i * FINGERPRINT_BITS / bands) for i in range(bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.matches = 0
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys(self, fingerprint):
+        return [(band, (fingerprint >> start) & mask) for band, (start, mask) in enumerate(self._bands)]
+
+    def add(self, text_hash, fingerprint):
+        """Index ``fingerprint`` of the text with content hash ``text_hash``."""
+        with self._lock:
+            if text_hash in self._entries:
+                self._entries.move_to_end(text_hash)
+                return
+            self._entries[text_hash] = fingerprint
+            for key in self._keys(fingerprint):
+                self._buckets.setdefault(key, set()).add(text_hash)
+            while len(self._entries) > self.max_entries:
+                old_hash, old_fingerprint = self._entries.popitem(last=False)
+                for key in self._keys(old_fingerprint):
+                    bucket = self._buckets[key]
+                    bucket.discard(old_hash)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def nearest(self, fingerprint, exclude=None):
+        """``(text_hash, similarity)`` of the closest indexed text within the threshold, or None.
+
+        ``exclude`` is a content hash to skip (the text itself).
+        """
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for key in self._keys(fingerprint):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(exclude)
+            best = None
+            for text_hash in candidates:
+                distance = (self._entries[text_hash] ^ fingerprint).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (text_hash, distance)
+            if best is None:
+                return None
+            self.matches += 1
+            self._entries.move_to_end(best[0])
+            return best[0], 1 - best[1] / FINGERPRINT_BITS
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'bands': len(self._bands),
+                'lookups': self.lookups,
+                'matches': self.matches,
+            }
+
+
+def near_duplicate_config():
+    return {**DEFAULTS, **getattr(settings, 'SUMMAREASE_NEAR_DUPLICATES', {})}
+
+
+_UNSET = object()
+_index = _UNSET
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """The process-wide fingerprint index, or ``None`` when near-duplicate matching is off."""
+    global _index
+    if _index is _UNSET:
+        with _index_lock:
+            if _index is _UNSET:
+                config = near_duplicate_config()
+                _index = NearDuplicateIndex(
+                    threshold=config['THRESHOLD'], max_entries=config['MAX_ENTRIES'],
+                ) if config['ENABLED'] else None
+    return _index
+
+
+@receiver(setting_changed)
+def _reset_index(setting, **kwargs):
+    global _index
+    if setting in ('SUMMAREASE_NEAR_DUPLICATES', 'SUMMAREASE_RESULT_CACHE'):
+        _index = _UNSET
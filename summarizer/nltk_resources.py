@@ -0,0 +1,51 @@
+"""
+Local NLTK data used by the summarizer.
+
+The punkt sentence tokenizer, the stopword lists and the VADER lexicon are
+read from ``settings.NLTK_DATA_DIR`` (searched before NLTK's default
+locations). Nothing here touches the network: ``ensure_resources`` only checks
+that the files exist and raises ``ImproperlyConfigured`` otherwise. Use
+``python manage.py fetch_nltk_data`` to install them.
+"""
+import nltk
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# nltk.download() package name -> path checked with nltk.data.find()
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+}
+
+
+def configure_data_path():
+    """Put the configured data directory first on NLTK's search path."""
+    data_dir = str(settings.NLTK_DATA_DIR)
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    return data_dir
+
+
+def missing_resources():
+    """Names of the required NLTK packages that cannot be found locally."""
+    configure_data_path()
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except (LookupError, OSError):
+            # OSError: nltk's py3_data shim maps punkt to a PY3/ subdirectory that is absent
+            missing.append(name)
+    return missing
+
+
+def ensure_resources():
+    """Fail fast, without network access, if any required NLTK package is missing."""
+    missing = missing_resources()
+    if missing:
+        raise ImproperlyConfigured(
+            f"Missing NLTK data: {', '.join(missing)}. Run 'python manage.py fetch_nltk_data' "
+            f"to install it into {settings.NLTK_DATA_DIR} (or copy a prepared nltk_data "
+            f"directory there with --source on air-gapped hosts)."
+        )
@@ -0,0 +1,230 @@
+"""
+PDF ingestion for the streaming analyses.
+
+:func:`iter_pdf_pages` extracts the text of an uploaded PDF with PyPDF2 page
+by page, as a generator. Files with at least ``PARALLEL_MIN_PAGES`` pages
+that Django has spooled to disk are extracted on the analysis process pool,
+``PAGES_PER_TASK`` pages per task, with only a few tasks in flight ahead of
+the consumer. Each worker parses the file once per extraction and closes it
+as soon as the extraction has finished, before :func:`analyze_pdf` returns.
+:func:`analyze_pdf` feeds the pages straight into
+:func:`~summarizer.utils.rank_sentences_stream`, which splits sentences across
+page boundaries and counts keyword terms on the way, so the extracted text is
+held about a page at a time and never joined into one string. The PDF itself
+is not: PyPDF2 keeps every page it has parsed, so extraction memory grows with
+the page count (about 12 KiB a page, 1.5 times the file size, on text-only
+test files), in the serving process or spread over the pool workers.
+Configured by ``settings.SUMMAREASE_PDF``.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PdfReadError
+
+from .metrics import stage
+from .utils import rank_keyword_counts, rank_sentences_stream
+
+DEFAULTS = {
+    'MAX_UPLOAD_BYTES': 50 * 2 ** 20,
+    'MAX_PAGES': 5000,
+    # Files with at least this many pages are extracted on the process pool (None: never)
+    'PARALLEL_MIN_PAGES': 16,
+    'PAGES_PER_TASK': 4,
+}
+
+PDF_ANALYSES = ('summary', 'keywords')
+
+
+class InvalidPDF(ValueError):
+    """The upload is not a PDF whose text can be extracted."""
+
+
+def pdf_config():
+    return {**DEFAULTS, **getattr(settings, 'SUMMAREASE_PDF', {})}
+
+
+def open_pdf(file):
+    """A :class:`PdfReader` for ``file``; raises :class:`InvalidPDF` for unreadable or encrypted files."""
+    try:
+        reader = PdfReader(file)
+        if not reader.is_encrypted:
+            len(reader.pages)
+    except Exception:
+        # PyPDF2 raises all sorts of errors on malformed files
+        raise InvalidPDF('Invalid PDF file')
+    if reader.is_encrypted:
+        raise InvalidPDF('Encrypted PDF files are not supported')
+    return reader
+
+
+def _page_text(page):
+    # A newline after each page, so words on either side of a page break stay apart
+    return (page.extract_text() or '') + '\n'
+
+
+# Readers of the PDFs this pool worker is extracting, by extraction: a task
+# reuses its worker's reader instead of parsing the page tree again, and the
+# reader is closed as soon as the extraction that opened it has finished
+_readers = {}
+_readers_lock = threading.Lock()
+
+# Seconds between a worker's checks that an extraction is still running
+RELEASE_POLL_INTERVAL = 0.01
+# Seconds the serving process waits for the workers to close their readers
+RELEASE_TIMEOUT = 5
+_RUNNING = 'running'
+
+
+def _release_when_done(extraction):
+    # Worker thread: close the extraction's reader once the serving process has removed its marker,
+    # then acknowledge with a file named after this process
+    while os.path.exists(os.path.join(extraction, _RUNNING)):
+        time.sleep(RELEASE_POLL_INTERVAL)
+    with _readers_lock:
+        file, _ = _readers.pop(extraction)
+    file.close()
+    try:
+        open(os.path.join(extraction, str(os.getpid())), 'x').close()
+    except OSError:
+        # The serving process gave up waiting and removed the directory
+        pass
+
+
+def _extraction_reader(path, extraction):
+    with _readers_lock:
+        entry = _readers.get(extraction)
+        if entry is None:
+            # An open file rather than the path, which PdfReader would copy into memory whole
+            file = open(path, 'rb')
+            try:
+                entry = _readers[extraction] = (file, PdfReader(file))
+            except Exception:
+                file.close()
+                raise
+            threading.Thread(target=_release_when_done, args=(extraction,), daemon=True).start()
+    return entry[1]
+
+
+def _extract_pages(path, extraction, start, stop):
+    # Pool task: this worker's pid and the text of pages [start, stop) of the PDF at path
+    reader = _extraction_reader(path, extraction)
+    return os.getpid(), [_page_text(reader.pages[index]) for index in range(start, stop)]
+
+
+def _wait_for_release(extraction, holders):
+    # Until every worker that opened a reader for the extraction has closed it
+    deadline = time.monotonic() + RELEASE_TIMEOUT
+    while time.monotonic() < deadline:
+        if all(os.path.exists(os.path.join(extraction, str(pid))) for pid in holders):
+            return
+        time.sleep(RELEASE_POLL_INTERVAL)
+
+
+def _parallel_pages(path, page_count, pages_per_task):
+    from .pool import get_executor
+
+    executor = get_executor()
+    workers = settings.SUMMAREASE_POOL_WORKERS or os.cpu_count() or 1
+    starts = iter(range(0, page_count, pages_per_task))
+    pending = deque()
+    holders = set()
+    # A directory per extraction: workers keep their readers while its marker file exists
+    extraction = tempfile.mkdtemp(prefix='summarease-pdf-')
+    open(os.path.join(extraction, _RUNNING), 'x').close()
+
+    def submit():
+        start = next(starts, None)
+        if start is not None:
+            pending.append(executor.submit(
+                _extract_pages, path, extraction, start, min(start + pages_per_task, page_count)))
+
+    try:
+        # Two tasks per worker in flight: the pool stays busy without running far ahead of the consumer
+        for _ in range(2 * workers):
+            submit()
+        while pending:
+            pid, pages = pending.popleft().result()
+            holders.add(pid)
+            submit()
+            yield from pages
+    finally:
+        for future in pending:
+            future.cancel()
+        # Tasks still running (the consumer stopped early or a task failed) may yet open readers
+        for future in pending:
+            if not future.cancelled():
+                try:
+                    holders.add(future.result()[0])
+                except Exception:
+                    pass
+        os.remove(os.path.join(extraction, _RUNNING))
+        _wait_for_release(extraction, holders)
+        shutil.rmtree(extraction, ignore_errors=True)
+
+
+def iter_pdf_pages(file, reader=None):
+    """Yield the text of each page of the PDF ``file`` (an upload or a path), in order."""
+    from .pool import in_pool_worker
+
+    reader = reader or open_pdf(file)
+    page_count = len(reader.pages)
+    config = pdf_config()
+    path = file.temporary_file_path() if hasattr(file, 'temporary_file_path') else None
+    if isinstance(file, (str, os.PathLike)):
+        path = os.fspath(file)
+    parallel = (
+        path is not None
+        and config['PARALLEL_MIN_PAGES'] is not None
+        and page_count >= config['PARALLEL_MIN_PAGES']
+        and settings.SUMMAREASE_POOL_WORKERS != 0
+        and not in_pool_worker
+    )
+    if parallel:
+        yield from _parallel_pages(path, page_count, config['PAGES_PER_TASK'])
+    else:
+        for page in reader.pages:
+            yield _page_text(page)
+
+
+def analyze_pdf(file, analyses=PDF_ANALYSES, max_sentences=3, top_k=10):
+    """Summary and/or keywords of the PDF ``file``, computed from its pages as they are extracted.
+
+    Returns ``{'pages', 'characters', 'summary', 'keywords'}`` (analyses that
+    were not requested are left out); raises :class:`InvalidPDF`.
+    """
+    reader = open_pdf(file)
+    page_count = len(reader.pages)
+    if page_count > pdf_config()['MAX_PAGES']:
+        raise InvalidPDF(f"PDF files may have at most {pdf_config()['MAX_PAGES']} pages")
+    characters = 0
+
+    def pages():
+        nonlocal characters
+        for text in iter_pdf_pages(file, reader):
+            characters += len(text)
+            yield text
+
+    keyword_counts = Counter() if 'keywords' in analyses else None
+    # Keywords alone need no second pass over the text
+    summary_sentences = max_sentences if 'summary' in analyses else 0
+    with stage('pdf'):
+        try:
+            ranked = rank_sentences_stream(pages(), summary_sentences, keyword_counts)
+        except PdfReadError:
+            raise InvalidPDF('Invalid PDF file')
+    result = {'pages': page_count, 'characters': characters}
+    if 'summary' in analyses:
+        result['summary'] = {
+            'summary': ' '.join(sentence for _, _, sentence in ranked),
+            'max_sentences': max_sentences,
+            'sentences': [{'index': index, 'offset': offset, 'text': sentence} for index, offset, sentence in ranked],
+        }
+    if keyword_counts is not None:
+        result['keywords'] = {'keywords': rank_keyword_counts(keyword_counts, top_k), 'top_k': top_k}
+    return result
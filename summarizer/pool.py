@@ -0,0 +1,89 @@
+"""
+Process pool for CPU-bound analysis work in the async serving mode.
+
+NLTK and scikit-learn hold the GIL, so the async views hand the analysis to a
+``ProcessPoolExecutor`` and await it, keeping the event loop free for I/O.
+Pool workers set up Django themselves and preload the NLTK data and the
+classifier artifact before taking work. ``SUMMAREASE_POOL_WORKERS`` sets the
+pool size (``None``: one per CPU; ``0``: run in a thread instead, for
+development and tests).
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+
+# Settings copied from the parent so workers match it even under override_settings
+WORKER_SETTINGS = (
+    'NLTK_DATA_DIR',
+    'CLASSIFIER_ARTIFACT_DIR',
+    'CLASSIFIER_MMAP_MODE',
+    'KEYWORD_ARTIFACT_DIR',
+    'SUMMAREASE_RESULT_CACHE',
+    'SUMMAREASE_BUDGET',
+    'SUMMAREASE_TOKENIZER',
+    'SUMMAREASE_SUMMARY',
+    'SUMMAREASE_SIMILARITY',
+    'SUMMAREASE_NEAR_DUPLICATES',
+)
+
+# True inside a pool worker; nested pools are never started from one
+in_pool_worker = False
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker(settings_module, overrides):
+    global in_pool_worker
+    in_pool_worker = True
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    # Load everything the analyses need before the first task arrives
+    from .serving import preload
+    preload()
+
+
+def get_executor():
+    """The shared process pool, created on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                overrides = {name: getattr(settings, name) for name in WORKER_SETTINGS if hasattr(settings, name)}
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.SUMMAREASE_POOL_WORKERS,
+                    mp_context=get_context(settings.SUMMAREASE_POOL_START_METHOD),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'summarease_project.settings'), overrides),
+                )
+    return _executor
+
+
+def shutdown_executor(wait=True):
+    """Stop the pool; the next :func:`run_in_pool` call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+async def run_in_pool(function, *args, **kwargs):
+    """Await ``function(*args, **kwargs)`` on the process pool (or a thread when disabled).
+
+    ``function`` and its arguments must be picklable, i.e. module-level functions
+    and plain data.
+    """
+    call = functools.partial(function, *args, **kwargs)
+    if settings.SUMMAREASE_POOL_WORKERS == 0:
+        return await asyncio.to_thread(call)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), call)
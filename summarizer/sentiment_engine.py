@@ -0,0 +1,233 @@
+"""
+Batch VADER sentiment scoring.
+
+:class:`BatchSentimentEngine` reproduces ``SentimentIntensityAnalyzer.polarity_scores``
+from NLTK 3.8 rule for rule (boosters, ALL CAPS emphasis, negation, "never so",
+idioms, "least", "but", punctuation emphasis), but is built for many texts:
+
+* the lexicon and VADER's word lists are compiled once into dicts and sets,
+  including the set of words that can start an idiom check;
+* punctuation stripping is one ``str.strip`` per token instead of building
+  VADER's ``punctuation x words`` lookup dict for every text, and words are
+  lower-cased once instead of at every rule;
+* the context rules only run for lexicon words, once per distinct word and
+  text (VADER scores repeats in the context of the first occurrence anyway),
+  and texts without any lexicon word take a constant fast path;
+* identical texts in a batch are scored once.
+"""
+import math
+import string
+from itertools import compress, count, repeat
+
+_PUNCTUATION = string.punctuation
+_PUNCTUATION_CHARS = frozenset(_PUNCTUATION)
+
+
+class BatchSentimentEngine:
+    """VADER polarity scores for many texts, equal to ``polarity_scores`` for each."""
+
+    def __init__(self, analyzer):
+        constants = analyzer.constants
+        self.lexicon = dict(analyzer.lexicon)
+        self.boosters = dict(constants.BOOSTER_DICT)
+        self.negations = frozenset(constants.NEGATE)
+        self.idioms = dict(constants.SPECIAL_CASE_IDIOMS)
+        # Words that can take part in an idiom or a two-word booster ("sort of")
+        self.idiom_words = frozenset(
+            part for phrase in [*self.idioms, *self.boosters] if ' ' in phrase for part in phrase.split()
+        )
+        self.punctuation = frozenset(constants.PUNC_LIST)
+        self.c_incr = constants.C_INCR
+        self.n_scalar = constants.N_SCALAR
+        self.b_decr = constants.B_DECR
+
+    def words(self, text):
+        """VADER's ``SentiText.words_and_emoticons``: split, drop 1-char tokens, strip edge punctuation."""
+        # map/compress keep the per-token work in C; only tokens with edge punctuation reach Python code
+        tokens = text.split()
+        words = list(compress(tokens, map((1).__lt__, map(len, tokens))))
+        stripped = [word.strip(_PUNCTUATION) for word in words]
+        for index in compress(count(), map(str.__ne__, words, stripped)):
+            word = words[index]
+            core = stripped[index]
+            # VADER maps one PUNC_LIST entry before or after a punctuation-free word (of 2+
+            # characters) to the word; anything else, e.g. "(word)" or "don't!", is kept as is
+            if word.startswith(core):
+                affix = word[len(core):]
+            elif word.endswith(core):
+                affix = word[:len(word) - len(core)]
+            else:
+                continue
+            if affix in self.punctuation and len(core) > 1 and _PUNCTUATION_CHARS.isdisjoint(core):
+                words[index] = core
+        return words
+
+    def polarity_scores(self, text):
+        """Same result as ``SentimentIntensityAnalyzer.polarity_scores(text)``."""
+        words = self.words(text)
+        n_words = len(words)
+        # Rules look at lower-cased words; lower-case each distinct word once
+        lowers = {word: word.lower() for word in set(words)}
+        lexicon = self.lexicon
+        boosters = self.boosters
+        scored = [word for word, lower in lowers.items() if lower in lexicon and lower not in boosters]
+        if not scored:
+            # No (non-booster) lexicon word: every sentiment is 0
+            return {'neg': 0.0, 'neu': 1.0 if n_words else 0.0, 'pos': 0.0, 'compound': 0.0}
+
+        upper = sum(map(str.isupper, words))
+        is_cap_diff = 0 < n_words - upper < n_words
+        # VADER scores every occurrence of a word in the context of its first occurrence,
+        # so each distinct word is scored once
+        valences = {}
+        for word in scored:
+            first = words.index(word)
+            if lowers[word] == 'kind' and first < n_words - 1 and lowers[words[first + 1]] == 'of':
+                valences[word] = 0
+            else:
+                valences[word] = self._valence(words, lowers, first, is_cap_diff)
+        sentiments = list(map(valences.get, words, repeat(0)))
+
+        buts = [word for word, lower in lowers.items() if lower == 'but']
+        if buts:
+            but = min(words.index(word) for word in buts)
+            sentiments = (
+                [sentiment * 0.5 for sentiment in sentiments[:but]]
+                + [sentiments[but]]
+                + [sentiment * 1.5 for sentiment in sentiments[but + 1:]]
+            )
+        return self._score(sentiments, text)
+
+    def polarity_scores_batch(self, texts):
+        """Polarity scores for each of ``texts``, in order; duplicate texts are scored once."""
+        scored = {}
+        results = []
+        for text in texts:
+            scores = scored.get(text)
+            if scores is None:
+                scores = scored[text] = self.polarity_scores(text)
+            results.append(dict(scores))
+        return results
+
+    def _negated(self, lower):
+        # VaderConstants.negated() for a single word
+        return lower in self.negations or "n't" in lower
+
+    def _valence(self, words, lowers, i, is_cap_diff):
+        # SentimentIntensityAnalyzer.sentiment_valence for the lexicon word at index i
+        valence = self.lexicon[lowers[words[i]]]
+        if is_cap_diff and words[i].isupper():
+            valence = valence + self.c_incr if valence > 0 else valence - self.c_incr
+
+        lexicon = self.lexicon
+        for start_i in range(3):
+            j = i - (start_i + 1)
+            if j < 0 or lowers[words[j]] in lexicon:
+                continue
+            scalar = self.boosters.get(lowers[words[j]], 0.0)
+            if scalar:
+                if valence < 0:
+                    scalar *= -1
+                if is_cap_diff and words[j].isupper():
+                    scalar = scalar + self.c_incr if valence > 0 else scalar - self.c_incr
+            if start_i == 1 and scalar != 0:
+                scalar = scalar * 0.95
+            if start_i == 2 and scalar != 0:
+                scalar = scalar * 0.9
+            valence = valence + scalar
+            valence = self._never_check(valence, words, lowers, start_i, i)
+            if start_i == 2:
+                valence = self._idioms_check(valence, words, i)
+
+        return self._least_check(valence, words, lowers, i)
+
+    def _never_check(self, valence, words, lowers, start_i, i):
+        if start_i == 0:
+            if self._negated(lowers[words[i - 1]]):
+                valence = valence * self.n_scalar
+        elif start_i == 1:
+            if words[i - 2] == 'never' and words[i - 1] in ('so', 'this'):
+                valence = valence * 1.5
+            elif self._negated(lowers[words[i - 2]]):
+                valence = valence * self.n_scalar
+        else:
+            if (words[i - 3] == 'never' and words[i - 2] in ('so', 'this')) or words[i - 1] in ('so', 'this'):
+                valence = valence * 1.25
+            elif self._negated(lowers[words[i - 3]]):
+                valence = valence * self.n_scalar
+        return valence
+
+    def _idioms_check(self, valence, words, i):
+        idiom_words = self.idiom_words
+        # Every phrase checked below contains words[i - 2], words[i - 1] or words[i]
+        if words[i] not in idiom_words and words[i - 1] not in idiom_words and words[i - 2] not in idiom_words:
+            return valence
+        idioms = self.idioms
+        onezero = f'{words[i - 1]} {words[i]}'
+        twoonezero = f'{words[i - 2]} {words[i - 1]} {words[i]}'
+        twoone = f'{words[i - 2]} {words[i - 1]}'
+        threetwoone = f'{words[i - 3]} {words[i - 2]} {words[i - 1]}'
+        threetwo = f'{words[i - 3]} {words[i - 2]}'
+        for sequence in (onezero, twoonezero, twoone, threetwoone, threetwo):
+            if sequence in idioms:
+                valence = idioms[sequence]
+                break
+        if len(words) - 1 > i:
+            zeroone = f'{words[i]} {words[i + 1]}'
+            if zeroone in idioms:
+                valence = idioms[zeroone]
+        if len(words) - 1 > i + 1:
+            zeroonetwo = f'{words[i]} {words[i + 1]} {words[i + 2]}'
+            if zeroonetwo in idioms:
+                valence = idioms[zeroonetwo]
+        if threetwo in self.boosters or twoone in self.boosters:
+            valence = valence + self.b_decr
+        return valence
+
+    def _least_check(self, valence, words, lowers, i):
+        least = i > 0 and lowers[words[i - 1]] == 'least' and 'least' not in self.lexicon
+        if least and i > 1:
+            if lowers[words[i - 2]] not in ('at', 'very'):
+                valence = valence * self.n_scalar
+        elif least:
+            valence = valence * self.n_scalar
+        return valence
+
+    @staticmethod
+    def _score(sentiments, text):
+        # SentimentIntensityAnalyzer.score_valence
+        sum_s = float(sum(sentiments))
+        ep_count = min(text.count('!'), 4)
+        qm_count = text.count('?')
+        qm_amplifier = 0
+        if qm_count > 1:
+            qm_amplifier = qm_count * 0.18 if qm_count <= 3 else 0.96
+        amplifier = ep_count * 0.292 + qm_amplifier
+        if sum_s > 0:
+            sum_s += amplifier
+        elif sum_s < 0:
+            sum_s -= amplifier
+        compound = sum_s / math.sqrt((sum_s * sum_s) + 15)
+
+        pos_sum = 0.0
+        neg_sum = 0.0
+        # Same summation order as VADER, skipping the (usually many) zeros
+        nonzero = list(filter(None, sentiments))
+        neu_count = len(sentiments) - len(nonzero)
+        for sentiment in nonzero:
+            if sentiment > 0:
+                pos_sum += float(sentiment) + 1
+            else:
+                neg_sum += float(sentiment) - 1
+        if pos_sum > math.fabs(neg_sum):
+            pos_sum += amplifier
+        elif pos_sum < math.fabs(neg_sum):
+            neg_sum -= amplifier
+
+        total = pos_sum + math.fabs(neg_sum) + neu_count
+        return {
+            'neg': round(math.fabs(neg_sum / total), 3),
+            'neu': round(math.fabs(neu_count / total), 3),
+            'pos': round(math.fabs(pos_sum / total), 3),
+            'compound': round(compound, 4),
+        }
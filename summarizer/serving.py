@@ -0,0 +1,123 @@
+"""
+Preloaded, copy-on-write friendly serving for multi-worker deployments.
+
+``gunicorn.conf.py`` (in the project root) imports the WSGI application in the
+gunicorn master before it forks (``preload_app``), which calls :func:`preload`:
+punkt, the stopwords, the VADER lexicon and the batch sentiment engine
+(``summarizer.utils``), the classifier and the keyword artifacts are loaded once.
+Forked workers share those pages with the master until something writes to
+them. The cyclic garbage collector would: every collection updates the header
+of each object it scans. :func:`freeze` moves all objects that exist before the
+fork into a permanent generation the collector never scans, so the shared pages
+stay shared. (Reference counting still touches the objects a request actually
+uses; the memory-mapped classifier arrays are not Python objects and stay clean.)
+
+:func:`memory_report` reads ``/proc/<pid>/smaps_rollup`` for a server process
+and its children and splits each one's memory into unique (private) and shared
+pages; see ``manage.py memory_report``.
+"""
+import gc
+import os
+from pathlib import Path
+
+# smaps fields summed by memory_report, in kB in /proc
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap')
+
+
+def preload():
+    """Load every resource the analyses use into this process."""
+    from . import utils  # noqa: F401  (punkt, stopwords, VADER lexicon, sentiment engine)
+    from .keyword_model import get_keyword_model
+    from .text_classifier_model import preload_classifier
+
+    preload_classifier()
+    get_keyword_model()
+
+
+def freeze():
+    """Collect garbage, then exempt every surviving object from the cyclic GC; call right before fork.
+
+    Returns the number of frozen objects.
+    """
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+def process_tree(pid):
+    """``pid`` followed by all of its descendants (from ``/proc``)."""
+    children = {}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = Path(entry.path, 'stat').read_text()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are space separated
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    tree = []
+    pending = [pid]
+    while pending:
+        current = pending.pop(0)
+        tree.append(current)
+        pending.extend(sorted(children.get(current, ())))
+    return tree
+
+
+def read_smaps(pid):
+    """:data:`SMAPS_FIELDS` of process ``pid`` in bytes, from ``smaps_rollup`` (or ``smaps`` on old kernels)."""
+    totals = dict.fromkeys(SMAPS_FIELDS, 0)
+    path = Path(f'/proc/{pid}/smaps_rollup')
+    if not path.exists():
+        path = Path(f'/proc/{pid}/smaps')
+    for line in path.read_text().splitlines():
+        name, _, value = line.partition(':')
+        if name in totals:
+            totals[name] += int(value.split()[0]) * 1024
+    return totals
+
+
+def _command(pid):
+    try:
+        return Path(f'/proc/{pid}/cmdline').read_bytes().replace(b'\0', b' ').decode(errors='replace').strip()
+    except OSError:
+        return ''
+
+
+def memory_report(pid):
+    """Unique and shared memory of server process ``pid`` and its children (workers).
+
+    Returns ``{'processes': [...], 'total_pss', 'total_unique', 'worker_unique_mean'}``;
+    each process has ``pid``, ``role`` (``master`` for ``pid``), ``command``,
+    ``rss``, ``pss``, ``shared``, ``unique`` and ``swap`` in bytes. ``pss``
+    charges each shared page to its sharers in equal parts, so the PSS total is
+    the deployment's real footprint, and the mean unique memory of a worker is
+    what one more worker would add.
+    """
+    processes = []
+    for index, current in enumerate(process_tree(pid)):
+        try:
+            smaps = read_smaps(current)
+        except OSError:
+            # Exited meanwhile, or not ours to read
+            continue
+        processes.append({
+            'pid': current,
+            'role': 'master' if index == 0 else 'worker',
+            'command': _command(current),
+            'rss': smaps['Rss'],
+            'pss': smaps['Pss'],
+            'shared': smaps['Shared_Clean'] + smaps['Shared_Dirty'],
+            'unique': smaps['Private_Clean'] + smaps['Private_Dirty'],
+            'swap': smaps['Swap'],
+        })
+    workers = [process['unique'] for process in processes if process['role'] == 'worker']
+    return {
+        'processes': processes,
+        'total_pss': sum(process['pss'] for process in processes),
+        'total_unique': sum(process['unique'] for process in processes),
+        'worker_unique_mean': sum(workers) / len(workers) if workers else None,
+    }
@@ -0,0 +1,427 @@
+"""
+Similar-document search over stored texts with a persisted sparse TF-IDF index.
+
+Texts are kept as :class:`~summarizer.models.Document` rows: sent with
+``store`` to ``/api/similar/``, imported by ``manage.py update_similarity_index
+--corpus``, or every analyzed text when ``STORE_ANALYZED`` is on.
+``manage.py update_similarity_index`` turns the documents added since its last
+run into a new segment under ``settings.SIMILARITY_INDEX_DIR``: an inverted
+index from term to the documents containing it, with their L2-normalized
+TF-IDF weights, saved as ``.npy`` arrays that servers memory-map. A query only
+reads the posting lists of its own highest weighted terms. Posting lists are
+impact-ordered (highest weight first) and a query reads at most
+``MAX_POSTINGS`` of each, so its cost is bounded whatever the number of
+documents; documents cut off that way only share a very common term, or a term
+of little weight in them, with the query.
+
+Terms are the keyword terms of :func:`summarizer.utils.extract_keywords`,
+weighted with the IDF of the fitted keyword model (plain term frequency without
+one) and hashed to 32-bit ids, so no vocabulary has to be kept in sync between
+segments. The manifest lists the live segments and is replaced atomically;
+small segments are merged as they accumulate. Configured by
+``settings.SUMMAREASE_SIMILARITY``.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .cache import content_hash
+from .keyword_model import get_keyword_model, get_keyword_model_version
+from .metrics import stage
+from .models import Document
+
+DEFAULTS = {
+    # Keep every text sent to the single-text analyses as a Document
+    'STORE_ANALYZED': False,
+    # Query terms looked up in the index; the rest (lowest weights) are ignored
+    'MAX_QUERY_TERMS': 32,
+    # Postings read per query term, highest weights first
+    'MAX_POSTINGS': 10_000,
+    'MAX_TOP_K': 100,
+    # Documents per segment written by one update
+    'SEGMENT_SIZE': 50_000,
+    # More segments than this are merged, smallest neighbours first
+    'MAX_SEGMENTS': 8,
+}
+
+MANIFEST_FILENAME = 'manifest.json'
+LOCK_FILENAME = '.lock'
+SEGMENT_ARRAYS = ('doc_ids', 'terms', 'offsets', 'rows', 'weights')
+
+
+def similarity_config():
+    return {**DEFAULTS, **getattr(settings, 'SUMMAREASE_SIMILARITY', {})}
+
+
+def store_document(text):
+    """Keep ``text`` for similar-document search; returns its :class:`Document`.
+
+    A text that is already stored is not stored again.
+    """
+    document, _ = Document.objects.get_or_create(
+        content_hash=content_hash(text), defaults={'text': text, 'size': len(text)},
+    )
+    return document
+
+
+def store_documents(texts, batch_size=1000):
+    """Store many texts at once, skipping known ones; returns how many were given."""
+    count = 0
+    batch = []
+    for text in texts:
+        batch.append(Document(text=text, content_hash=content_hash(text), size=len(text)))
+        count += 1
+        if len(batch) >= batch_size:
+            Document.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Document.objects.bulk_create(batch, ignore_conflicts=True)
+    return count
+
+
+def term_id(term):
+    """Stable 32-bit id of ``term`` (the same in every process, unlike ``hash``)."""
+    return zlib.crc32(term.encode('utf-8'))
+
+
+def document_vector(text):
+    """L2-normalized TF-IDF vector of ``text`` as ``(term_ids, weights)``, ids ascending."""
+    from .utils import _keyword_terms, analyze_document
+
+    terms = _keyword_terms(analyze_document(text))
+    model = get_keyword_model()
+    if model is not None:
+        unique, scores = model.transform(terms)
+    else:
+        counts = Counter(terms)
+        unique = list(counts)
+        scores = np.fromiter(counts.values(), dtype=np.float64, count=len(unique))
+    if not unique:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.float32)
+    ids = np.fromiter((term_id(term) for term in unique), dtype=np.uint32, count=len(unique))
+    # Terms whose ids collide share one weight
+    ids, inverse = np.unique(ids, return_inverse=True)
+    weights = np.bincount(inverse, weights=scores, minlength=len(ids))
+    return ids, (weights / np.linalg.norm(weights)).astype(np.float32)
+
+
+class Segment:
+    """An immutable part of the index: posting lists over the documents ``doc_ids``.
+
+    ``terms`` holds the term ids in ascending order and the postings of
+    ``terms[i]`` are ``rows[offsets[i]:offsets[i + 1]]`` (positions in
+    ``doc_ids``) with ``weights`` at the same positions, highest weight first.
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = Path(path)
+        for name in SEGMENT_ARRAYS:
+            setattr(self, name, np.load(self.path / f'{name}.npy', mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def scores(self, term_ids, weights, max_postings=None):
+        """Dot product of the query ``(term_ids, weights)`` with the documents sharing a term with it.
+
+        Returns ``(rows, scores)``: the positions of those documents in
+        ``doc_ids``, ascending, and their scores. Only the first
+        ``max_postings`` postings of each term are read, and the cost depends
+        on the postings read, not on the size of the segment.
+        """
+        rows, products = [], []
+        if len(self.terms):
+            positions = np.minimum(np.searchsorted(self.terms, term_ids), len(self.terms) - 1)
+            found = self.terms[positions] == term_ids
+            for position, weight in zip(positions[found], weights[found]):
+                start, end = self.offsets[position], self.offsets[position + 1]
+                if max_postings is not None:
+                    end = min(end, start + max_postings)
+                rows.append(self.rows[start:end])
+                products.append(weight * self.weights[start:end])
+        if not rows:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(products), minlength=len(rows))
+        return rows, scores.astype(np.float32)
+
+    def postings(self):
+        """All postings as ``(terms, rows, weights)`` arrays, for merging."""
+        terms = np.repeat(np.asarray(self.terms), np.diff(self.offsets))
+        return terms, np.asarray(self.rows), np.asarray(self.weights)
+
+
+def _write_segment(path, doc_ids, terms, rows, weights):
+    """Write a segment from unordered postings; ``rows`` index into ``doc_ids``."""
+    # By term, then impact (weight descending), then document
+    order = np.lexsort((rows, -weights, terms))
+    terms = terms[order]
+    unique, starts = np.unique(terms, return_index=True)
+    arrays = {
+        'doc_ids': np.asarray(doc_ids, dtype=np.int64),
+        'terms': unique.astype(np.uint32),
+        'offsets': np.append(starts, len(terms)).astype(np.int64),
+        'rows': rows[order].astype(np.int32),
+        'weights': weights[order].astype(np.float32),
+    }
+    # Written next to the index and renamed into place, so a segment is complete or absent
+    staging = Path(tempfile.mkdtemp(prefix='.segment-', dir=path.parent))
+    for name, array in arrays.items():
+        np.save(staging / f'{name}.npy', array)
+    staging.rename(path)
+
+
+def write_segment(path, doc_ids, vectors):
+    """Write the segment of the documents ``doc_ids`` with ``vectors`` from :func:`document_vector`."""
+    lengths = np.fromiter((len(ids) for ids, _ in vectors), dtype=np.int64, count=len(vectors))
+    terms = np.concatenate([ids for ids, _ in vectors] + [np.empty(0, dtype=np.uint32)])
+    weights = np.concatenate([values for _, values in vectors] + [np.empty(0, dtype=np.float32)])
+    rows = np.repeat(np.arange(len(vectors), dtype=np.int32), lengths)
+    _write_segment(Path(path), doc_ids, terms, rows, weights)
+
+
+def merge_segments(path, segments):
+    """Write the segments (adjacent, in manifest order) as one segment at ``path``."""
+    doc_ids, terms, rows, weights = [], [], [], []
+    row_offset = 0
+    for segment in segments:
+        segment_terms, segment_rows, segment_weights = segment.postings()
+        doc_ids.append(np.asarray(segment.doc_ids))
+        terms.append(segment_terms)
+        rows.append(segment_rows.astype(np.int64) + row_offset)
+        weights.append(segment_weights)
+        row_offset += len(segment)
+    _write_segment(Path(path), np.concatenate(doc_ids), np.concatenate(terms), np.concatenate(rows),
+                   np.concatenate(weights))
+
+
+def empty_manifest(keyword_model_version=None):
+    return {
+        'segments': [],
+        'sizes': [],
+        'documents': 0,
+        'last_document_id': 0,
+        'next_segment': 0,
+        'keyword_model_version': keyword_model_version,
+        'updated': None,
+    }
+
+
+def read_manifest(directory=None):
+    """The manifest of the index in ``directory`` (an empty one if nothing was indexed yet)."""
+    path = Path(directory or settings.SIMILARITY_INDEX_DIR) / MANIFEST_FILENAME
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return empty_manifest()
+
+
+def _write_manifest(directory, manifest):
+    manifest['updated'] = datetime.now(timezone.utc).isoformat()
+    temporary = directory / f'.{MANIFEST_FILENAME}.tmp'
+    temporary.write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary, directory / MANIFEST_FILENAME)
+
+
+@contextmanager
+def _update_lock(directory):
+    # One update at a time per index; readers never wait
+    with (directory / LOCK_FILENAME).open('w') as lock:
+        try:
+            import fcntl
+        except ImportError:
+            # Windows: lock the first byte instead; LK_LOCK gives up
+            # after ten seconds, so keep retrying until the holder is done
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _new_segment_name(manifest):
+    name = f"segment-{manifest['next_segment']:06d}"
+    manifest['next_segment'] += 1
+    return name
+
+
+def _merge_small_segments(directory, manifest, max_segments):
+    """Merge neighbouring segments, smallest pair first, until at most ``max_segments`` remain.
+
+    Returns the names of the segments that were replaced.
+    """
+    replaced = []
+    while len(manifest['segments']) > max(max_segments, 1):
+        sizes = manifest['sizes']
+        first = min(range(len(sizes) - 1), key=lambda i: sizes[i] + sizes[i + 1])
+        names = manifest['segments'][first:first + 2]
+        name = _new_segment_name(manifest)
+        merge_segments(directory / name, [Segment(directory / old) for old in names])
+        manifest['segments'][first:first + 2] = [name]
+        manifest['sizes'][first:first + 2] = [sizes[first] + sizes[first + 1]]
+        replaced.extend(names)
+    return replaced
+
+
+def update_index(directory=None, rebuild=False, merge=False):
+    """Index the documents stored since the last update; returns the new manifest.
+
+    New documents go into segments of ``SEGMENT_SIZE`` documents. The index is
+    rebuilt from all documents when ``rebuild`` is set or the keyword model,
+    whose IDF weights the vectors, has changed since it was built. ``merge``
+    merges all segments into one; otherwise only segments beyond
+    ``MAX_SEGMENTS`` are merged.
+    """
+    config = similarity_config()
+    directory = Path(directory or settings.SIMILARITY_INDEX_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    with _update_lock(directory):
+        manifest = read_manifest(directory)
+        obsolete = []
+        version = get_keyword_model_version()
+        if rebuild or manifest['keyword_model_version'] != version:
+            obsolete = manifest['segments']
+            manifest = {**empty_manifest(version), 'next_segment': manifest['next_segment']}
+
+        pending = Document.objects.filter(id__gt=manifest['last_document_id']).order_by('id')
+        doc_ids, vectors = [], []
+
+        def flush():
+            name = _new_segment_name(manifest)
+            write_segment(directory / name, doc_ids, vectors)
+            manifest['segments'].append(name)
+            manifest['sizes'].append(len(doc_ids))
+            manifest['documents'] += len(doc_ids)
+            manifest['last_document_id'] = doc_ids[-1]
+            # Committed segment by segment, so an interrupted update resumes where it stopped
+            _write_manifest(directory, manifest)
+            doc_ids.clear()
+            vectors.clear()
+
+        for document_id, text in pending.values_list('id', 'text').iterator(chunk_size=1000):
+            doc_ids.append(document_id)
+            vectors.append(document_vector(text))
+            if len(doc_ids) >= config['SEGMENT_SIZE']:
+                flush()
+        if doc_ids:
+            flush()
+
+        obsolete += _merge_small_segments(directory, manifest, 1 if merge else config['MAX_SEGMENTS'])
+        _write_manifest(directory, manifest)
+        # Processes that still map removed segments keep reading them until they reopen the index
+        for name in obsolete:
+            shutil.rmtree(directory / name, ignore_errors=True)
+    return manifest
+
+
+class SimilarityIndex:
+    """The segments listed in the manifest of ``directory``, memory-mapped."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or settings.SIMILARITY_INDEX_DIR)
+        self.manifest = read_manifest(self.directory)
+        self.segments = [Segment(self.directory / name) for name in self.manifest['segments']]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def search(self, vector, top_k=10, exclude=()):
+        """The ``top_k`` documents with the highest cosine similarity to ``vector``.
+
+        Returns ``(document_id, score)`` pairs, best first (ties by id). Only the
+        ``MAX_QUERY_TERMS`` highest weighted terms of the query and the first
+        ``MAX_POSTINGS`` postings of each are read, so a score may undershoot
+        the exact cosine for long queries and very common terms.
+        """
+        config = similarity_config()
+        term_ids, weights = vector
+        max_terms = config['MAX_QUERY_TERMS']
+        if max_terms is None or max_terms < 1:
+            raise ImproperlyConfigured("SUMMAREASE_SIMILARITY['MAX_QUERY_TERMS'] must be at least 1")
+        if len(term_ids) > max_terms:
+            keep = np.sort(np.argpartition(weights, len(weights) - max_terms)[-max_terms:])
+            term_ids, weights = term_ids[keep], weights[keep]
+        if top_k <= 0 or not len(term_ids):
+            return []
+        exclude = np.asarray(list(exclude), dtype=np.int64)
+        found_ids, found_scores = [], []
+        for segment in self.segments:
+            rows, scores = segment.scores(term_ids, weights, config['MAX_POSTINGS'])
+            keep = scores > 0
+            if len(exclude):
+                keep &= ~np.isin(segment.doc_ids[rows], exclude)
+            rows, scores = rows[keep], scores[keep]
+            if len(rows) > top_k:
+                best = np.argpartition(scores, len(scores) - top_k)[-top_k:]
+                rows, scores = rows[best], scores[best]
+            found_ids.append(np.asarray(segment.doc_ids[rows]))
+            found_scores.append(scores)
+        if not found_ids:
+            return []
+        ids = np.concatenate(found_ids)
+        scores = np.concatenate(found_scores)
+        order = np.lexsort((ids, -scores))[:top_k]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def _manifest_stamp(directory):
+    try:
+        status = (directory / MANIFEST_FILENAME).stat()
+    except FileNotFoundError:
+        return None
+    # The manifest is replaced, never rewritten in place, so a new inode means a new index
+    return status.st_ino, status.st_mtime_ns
+
+
+def get_index():
+    """The index of this process, reopened when an update has replaced the manifest."""
+    directory = Path(settings.SIMILARITY_INDEX_DIR)
+    key = str(directory)
+    stamp = _manifest_stamp(directory)
+    loaded = _loaded.get(key)
+    if loaded is None or loaded[0] != stamp:
+        with _load_lock:
+            loaded = _loaded.get(key)
+            if loaded is None or loaded[0] != stamp:
+                try:
+                    index = SimilarityIndex(directory)
+                except FileNotFoundError:
+                    # A merge removed a segment between reading the manifest and opening it
+                    stamp = _manifest_stamp(directory)
+                    index = SimilarityIndex(directory)
+                loaded = _loaded[key] = (stamp, index)
+    return loaded[1]
+
+
+def similar_documents(text, top_k=10, exclude=()):
+    """The ``top_k`` indexed documents most similar to ``text`` as ``(document_id, score)`` pairs."""
+    with stage('similarity'):
+        return get_index().search(document_vector(text), top_k, exclude)
@@ -0,0 +1,141 @@
+"""
+Sentence scoring for extractive summaries.
+
+Both methods work on the sentence-by-term count matrix of an
+:class:`~summarizer.utils.AnalyzedDocument` (``doc.term_matrix()``):
+
+* ``'frequency'`` scores a sentence by the document counts of its content
+  words, summed; all sentences are scored by one sparse matrix-vector product;
+* ``'textrank'`` ranks sentences by PageRank over the cosine similarity of
+  their TF-IDF rows. The n-by-n similarity graph is never built: each
+  power-iteration step multiplies by the matrix and its transpose, and at
+  most ``MAX_ITERATIONS`` steps are taken.
+
+:func:`top_sentences` picks the best sentences with ``argpartition``, ties
+going to the earlier sentence, and returns them in document order.
+Configured by ``settings.SUMMAREASE_SUMMARY``.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULTS = {
+    'METHOD': 'frequency',
+    # TextRank: damping factor, and power iteration stops after MAX_ITERATIONS
+    # steps or once the ranks change by less than TOLERANCE (L1)
+    'DAMPING': 0.85,
+    'MAX_ITERATIONS': 50,
+    'TOLERANCE': 1e-6,
+}
+
+METHODS = ('frequency', 'textrank')
+
+# Degrees below this are isolated sentences (rounding noise of X @ X.T)
+_MIN_DEGREE = 1e-12
+
+
+def summary_config():
+    return {**DEFAULTS, **getattr(settings, 'SUMMAREASE_SUMMARY', {})}
+
+
+def summary_method(method=None):
+    """``method``, or the configured ``METHOD``; raises ImproperlyConfigured for an unknown one."""
+    method = method or summary_config()['METHOD']
+    if method not in METHODS:
+        raise ImproperlyConfigured(f"SUMMAREASE_SUMMARY['METHOD'] must be one of: {', '.join(METHODS)}")
+    return method
+
+
+def frequency_scores(matrix, term_counts):
+    """Sum of ``term_counts`` over the words of each sentence (row of ``matrix``)."""
+    return matrix @ term_counts
+
+
+def _tfidf_rows(matrix):
+    # Rows weighted by smoothed IDF and L2-normalized; sentences without terms stay empty
+    rows = matrix.astype(np.float64)
+    n = rows.shape[0]
+    document_frequency = np.bincount(rows.indices, minlength=rows.shape[1])
+    rows.data *= (np.log((1 + n) / (1 + document_frequency)) + 1)[rows.indices]
+    norms = np.sqrt(np.add.reduceat(rows.data ** 2, rows.indptr[:-1])) if rows.nnz else np.zeros(n)
+    lengths = np.diff(rows.indptr)
+    norms[lengths == 0] = 1.0
+    rows.data /= np.repeat(norms, lengths)
+    return rows, (lengths > 0).astype(np.float64)
+
+
+def textrank_scores(matrix, damping=0.85, max_iterations=50, tolerance=1e-6):
+    """PageRank of each sentence in the graph weighted by the cosine similarity of its TF-IDF row."""
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    rows, self_similarity = _tfidf_rows(matrix)
+    columns = rows.T.tocsr()
+
+    def similarity(vector):
+        # (X X^T - I) v: edge weights without self-loops, without materializing X X^T
+        return np.maximum(rows @ (columns @ vector) - self_similarity * vector, 0)
+
+    degree = similarity(np.ones(n))
+    dangling = degree < _MIN_DEGREE
+    inverse_degree = np.where(dangling, 0.0, 1.0 / np.where(dangling, 1.0, degree))
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        # Isolated sentences spread their rank evenly, so the ranks keep summing to one
+        updated = (1 - damping) / n + damping * (similarity(rank * inverse_degree) + rank[dangling].sum() / n)
+        change = np.abs(updated - rank).sum()
+        rank = updated
+        if change < tolerance:
+            break
+    return rank
+
+
+def sentence_scores(doc, method=None):
+    """Score of each sentence of ``doc`` by ``method`` (default: the configured one), by index."""
+    method = summary_method(method)
+    matrix = doc.term_matrix()
+    if method == 'textrank':
+        config = summary_config()
+        return textrank_scores(
+            matrix, damping=config['DAMPING'], max_iterations=config['MAX_ITERATIONS'],
+            tolerance=config['TOLERANCE'],
+        )
+    return frequency_scores(matrix, doc.term_counts())
+
+
+def _ranked(candidates, scores, k):
+    # Best k of candidates by score, ties to the lower index, best first
+    candidate_scores = scores[candidates]
+    if k < len(candidates):
+        kth = candidate_scores[np.argpartition(-candidate_scores, k - 1)[k - 1]]
+        # Every candidate tied with the k-th best, so the tie-break below is exact
+        keep = candidate_scores >= kth
+        candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+    order = np.lexsort((candidates, -candidate_scores))
+    return candidates[order[:k]]
+
+
+def top_sentences(scores, eligible, sentences, max_sentences):
+    """Indices of the best ``max_sentences`` eligible sentences, in document order.
+
+    Ties go to the earlier sentence, and a sentence repeating one already
+    picked is skipped (its copy always ranks above it).
+    """
+    if max_sentences <= 0:
+        return []
+    candidates = np.flatnonzero(eligible)
+    k = max_sentences
+    while True:
+        ranked = _ranked(candidates, scores, k)
+        selected = []
+        seen = set()
+        for index in ranked.tolist():
+            if sentences[index] not in seen:
+                seen.add(sentences[index])
+                selected.append(index)
+                if len(selected) == max_sentences:
+                    break
+        if len(selected) == max_sentences or len(ranked) == len(candidates):
+            return sorted(selected)
+        # Repeats took some of the places: look further down the ranking
+        k *= 2
@@ -2,12 +2,72 @@ from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .utils import summarize_text, classify_text, classify_with_confidence, analyze_sentiment, extract_keywords
+from .utils import (
+    AnalyzedDocument,
+    analyze_document,
+    summarize_text,
+    classify_text,
+    classify_with_confidence,
+    analyze_sentiment,
+    extract_keywords,
+    classification_result,
+    analysis_result,
+    run_analyses,
+    run_batch,
+    iter_sentences,
+    rank_sentences_stream,
+    summarize_stream,
+    summary_result,
+    tokenizer,
+)
+from . import formats
+from .cache import ResultCache, content_hash, get_result_cache, make_key
+from .models import AnalysisJob, Document
+from unittest import mock
+import gzip
+import heapq
+import uuid
+from datetime import timedelta
+import os
+import io
+import tempfile
+import zipfile
+from io import StringIO
+from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, TransactionTestCase, override_settings
 from .views import summarize_view, classify_view, sentiment_view, keywords_view
 from django.test import RequestFactory
+from asgiref.sync import async_to_sync
 import json
 
 
+_artifact_dir = None
+_artifact_settings = None
+
+
+def setUpModule():
+    """Train the example classifier into a throwaway artifact directory for the suite"""
+    global _artifact_dir, _artifact_settings
+    _artifact_dir = tempfile.TemporaryDirectory()
+    # The result cache is off by default so tests don't see each other's results
+    _artifact_settings = override_settings(
+        CLASSIFIER_ARTIFACT_DIR=Path(_artifact_dir.name),
+        # No keyword model unless a test fits one
+        KEYWORD_ARTIFACT_DIR=Path(_artifact_dir.name) / 'keywords',
+        SUMMAREASE_RESULT_CACHE={'ENABLED': False},
+    )
+    _artifact_settings.enable()
+    call_command('train_classifier', artifact_version='test', stdout=StringIO())
+
+
+def tearDownModule():
+    _artifact_settings.disable()
+    _artifact_dir.cleanup()
+
+
 class TextSummarizationTestCase(TestCase):
     """Test cases for text summarization utility functions"""
     
@@ -53,6 +113,45 @@ class TextSummarizationTestCase(TestCase):
         self.assertLessEqual(len(sentences), 3)
 
 
+class AnalyzedDocumentTestCase(TestCase):
+    """Test cases for the shared single-pass analysis document"""
+
+    def test_sentences_and_offsets(self):
+        """Test that per-sentence token slices line up with the sentences"""
+        doc = AnalyzedDocument("The fox runs fast. A dog sleeps.")
+        self.assertEqual(len(doc), 2)
+        self.assertEqual(doc.sentence_tokens(0), ['the', 'fox', 'runs', 'fast', '.'])
+        self.assertEqual(doc.sentence_content_tokens(0), ['fox', 'runs', 'fast'])
+        self.assertEqual(doc.sentence_content_tokens(1), ['dog', 'sleeps'])
+        self.assertEqual(list(doc.content_offsets), [0, 3, 5])
+
+    def test_each_sentence_tokenized_once(self):
+        """Test that word tokenization runs once per sentence"""
+        text = "First sentence here. Second sentence here. Third one."
+        with mock.patch('summarizer.utils.word_tokenize', wraps=__import__('nltk').word_tokenize) as tokenize:
+            summarize_text(text, max_sentences=2)
+        self.assertEqual(tokenize.call_count, 3)
+
+    def test_document_reused_across_analyses(self):
+        """Test that all analyses accept a pre-analyzed document"""
+        text = "Machine learning improves healthcare. Doctors love machine learning."
+        doc = analyze_document(text)
+        self.assertIs(analyze_document(doc), doc)
+        self.assertEqual(summarize_text(doc, max_sentences=1), summarize_text(text, max_sentences=1))
+        self.assertEqual(extract_keywords(doc, top_k=3), extract_keywords(text, top_k=3))
+        self.assertEqual(analyze_sentiment(doc), analyze_sentiment(text))
+        self.assertEqual(classify_text(doc), classify_text(text))
+
+    def test_duplicate_sentences_scored_by_index(self):
+        """Test that duplicate sentences are not merged into one inflated score"""
+        text = "Cats purr. Cats purr. Dogs bark loudly at dogs."
+        from .summary_engine import sentence_scores
+        doc = analyze_document(text)
+        self.assertEqual(sentence_scores(doc, 'frequency').tolist(), [4, 4, 6])
+        summary = summarize_text(text, max_sentences=2)
+        self.assertEqual(summary, "Cats purr. Dogs bark loudly at dogs.")
+
+
 class TextSummarizationAPITestCase(APITestCase):
     """Test cases for text summarization API endpoints"""
     
@@ -422,6 +521,16 @@ class KeywordExtractionTestCase(TestCase):
         
         self.assertLessEqual(len(keywords), 3)
     
+    def test_extract_keywords_bigrams_stay_within_sentences(self):
+        """Test that key phrases never join the last word of one sentence to the first of the next"""
+        text = "Solar panels convert sunlight. Wind turbines spin slowly. Solar panels convert sunlight."
+        keywords = extract_keywords(text, top_k=20)
+
+        self.assertIn('solar panels', keywords)
+        self.assertIn('wind turbines', keywords)
+        self.assertNotIn('sunlight wind', keywords)
+        self.assertNotIn('slowly solar', keywords)
+    
     def test_extract_keywords_default_top_k(self):
         """Test keyword extraction uses default top_k when not provided"""
         text = "Machine learning and AI are important technologies"
@@ -498,3 +607,2094 @@ class KeywordExtractionAPITestCase(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['top_k'], 10)  # Default value
+
+
+class CombinedAnalysisAPITestCase(APITestCase):
+    """Test cases for the combined /api/analyze/ endpoint"""
+
+    text = ('Machine learning and artificial intelligence are transforming technology. '
+            'AI algorithms process data efficiently. I love how fast they are.')
+
+    def test_analyze_all_defaults(self):
+        """Test that all four analyses run by default"""
+        response = self.client.post(reverse('analyze'), {'text': self.text}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'summary', 'classification', 'sentiment', 'keywords'})
+        self.assertEqual(response.data['summary']['max_sentences'], 3)
+        self.assertEqual(response.data['keywords']['top_k'], 10)
+        self.assertIn('category', response.data['classification'])
+        self.assertIn('label', response.data['sentiment'])
+
+    def test_analyze_matches_single_endpoints(self):
+        """Test that combined results equal the individual endpoint results"""
+        options = {'summary': {'max_sentences': 1}, 'keywords': {'top_k': 4}, 'classification': {'top_k': 2}}
+        combined = self.client.post(reverse('analyze'), {'text': self.text, 'options': options}, format='json').data
+
+        summary = self.client.post(reverse('summarize'), {'text': self.text, 'max_sentences': 1}, format='json').data
+        keywords = self.client.post(reverse('keywords'), {'text': self.text, 'top_k': 4}, format='json').data
+        classify = self.client.post(reverse('classify'), {'text': self.text, 'top_k': 2}, format='json').data
+        sentiment = self.client.post(reverse('sentiment'), {'text': self.text}, format='json').data
+        self.assertEqual(combined['summary'], summary)
+        self.assertEqual(combined['keywords'], keywords)
+        self.assertEqual(combined['classification'], classify)
+        self.assertEqual(combined['sentiment'], sentiment)
+
+    def test_analyze_subset(self):
+        """Test that only the requested analyses run"""
+        data = {'text': self.text, 'analyses': ['sentiment', 'keywords']}
+        with mock.patch('summarizer.utils.summarize_text') as summarize:
+            response = self.client.post(reverse('analyze'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'sentiment', 'keywords'})
+        summarize.assert_not_called()
+
+    def test_analyze_tokenizes_once(self):
+        """Test that summary and keywords share one tokenization pass"""
+        data = {'text': self.text, 'analyses': ['summary', 'keywords']}
+        with mock.patch('summarizer.utils.word_tokenize', wraps=__import__('nltk').word_tokenize) as tokenize:
+            self.client.post(reverse('analyze'), data, format='json')
+        self.assertEqual(tokenize.call_count, 3)
+
+    def test_analyze_missing_text(self):
+        """Test API error when text is missing"""
+        response = self.client.post(reverse('analyze'), {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Text is required')
+
+    def test_analyze_unknown_analysis(self):
+        """Test API error for an unknown analysis name"""
+        data = {'text': self.text, 'analyses': ['summary', 'translation']}
+        response = self.client.post(reverse('analyze'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Unknown analysis: translation')
+
+    def test_analyze_invalid_option(self):
+        """Test API error when an option is not an integer"""
+        data = {'text': self.text, 'options': {'keywords': {'top_k': 'many'}}}
+        response = self.client.post(reverse('analyze'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'top_k must be an integer')
+
+
+class BatchAnalysisTestCase(TestCase):
+    """Test cases for the batch analysis helpers"""
+
+    def test_classification_batch_single_predict_call(self):
+        """Test that a classification batch makes one predict_proba call"""
+        from .text_classifier_model import get_classifier
+        classifier = get_classifier()
+        texts = ['Stock markets are volatile', 'Patients are receiving better care', 'Machine learning is AI']
+        with mock.patch.object(classifier, 'predict_proba', wraps=classifier.predict_proba) as predict:
+            results = run_batch('classification', texts, {'top_k': 2})
+        self.assertEqual(predict.call_count, 1)
+        self.assertEqual(results, [classification_result(text, top_k=2) for text in texts])
+
+    def test_batch_errors_are_per_item(self):
+        """Test that invalid items get an error without failing the batch"""
+        results = run_batch('sentiment', ['I love it!', '', None, 'I hate it!'])
+        self.assertEqual(results[0]['label'], 'positive')
+        self.assertEqual(results[1], {'error': 'Text is required'})
+        self.assertEqual(results[2], {'error': 'Text is required'})
+        self.assertEqual(results[3]['label'], 'negative')
+
+    def test_batch_analysis_exception_is_per_item(self):
+        """Test that an exception in one item is reported on that item only"""
+        def flaky(text, max_sentences=3):
+            if 'boom' in text:
+                raise RuntimeError('boom')
+            return {'summary': text}
+
+        with mock.patch.dict('summarizer.utils.ANALYSES', {'summary': flaky}):
+            results = run_batch('summary', ['fine', 'boom here', 'also fine'])
+        self.assertEqual(results, [{'summary': 'fine'}, {'error': 'boom'}, {'summary': 'also fine'}])
+
+
+class BatchAnalysisAPITestCase(APITestCase):
+    """Test cases for the batch API endpoints"""
+
+    def test_summarize_batch(self):
+        """Test batch summarization keeps input order"""
+        texts = ['First sentence. Second sentence.', 'Only one sentence here.']
+        response = self.client.post(reverse('summarize-batch'), {'texts': texts, 'max_sentences': 1}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['max_sentences'], 1)
+        self.assertEqual(response.data['results'][1]['summary'], 'Only one sentence here.')
+
+    def test_classify_batch(self):
+        """Test batch classification with a bad item"""
+        texts = ['Stock markets are volatile', '', 'Students are learning with online platforms']
+        response = self.client.post(reverse('classify-batch'), {'texts': texts}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(results[0]['category'], 'Business')
+        self.assertEqual(results[1], {'error': 'Text is required'})
+        self.assertEqual(results[2]['category'], 'Education')
+
+    def test_sentiment_and_keywords_batch(self):
+        """Test sentiment and keyword batch endpoints"""
+        texts = ['This is wonderful and amazing!', 'This is terrible and awful!']
+        sentiment = self.client.post(reverse('sentiment-batch'), {'texts': texts}, format='json')
+        keywords = self.client.post(reverse('keywords-batch'), {'texts': texts, 'top_k': 2}, format='json')
+
+        self.assertEqual([r['label'] for r in sentiment.data['results']], ['positive', 'negative'])
+        self.assertEqual(keywords.data['top_k'], 2)
+        self.assertTrue(all(len(r['keywords']) <= 2 for r in keywords.data['results']))
+
+    def test_batch_requires_texts(self):
+        """Test API error when texts is missing or not a list"""
+        for data in ({}, {'texts': 'not a list'}, {'texts': []}):
+            response = self.client.post(reverse('keywords-batch'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['error'], 'texts must be a non-empty list')
+
+    def test_batch_size_limit(self):
+        """Test API error when the batch is too large"""
+        with self.settings(SUMMAREASE_MAX_BATCH_SIZE=2):
+            response = self.client.post(reverse('sentiment-batch'), {'texts': ['a', 'b', 'c']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NLTKResourcesTestCase(TestCase):
+    """Test cases for the offline NLTK resource bootstrap"""
+
+    def test_missing_resource_fails_fast(self):
+        """Test that a missing package raises a clear configuration error"""
+        from . import nltk_resources
+
+        def find(path):
+            if path.startswith('sentiment/'):
+                raise LookupError(path)
+
+        with mock.patch('nltk.data.find', side_effect=find), mock.patch('nltk.download') as download:
+            with self.assertRaisesMessage(ImproperlyConfigured, 'Missing NLTK data: vader_lexicon'):
+                nltk_resources.ensure_resources()
+        download.assert_not_called()
+
+    def test_fetch_copies_from_local_source(self):
+        """Test that fetch_nltk_data vendors resources from a local directory"""
+        import nltk
+        from . import nltk_resources
+
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+            (Path(source) / 'tokenizers/punkt/PY3').mkdir(parents=True)
+            (Path(source) / 'tokenizers/punkt/PY3/english.pickle').write_bytes(b'')
+            (Path(source) / 'corpora/stopwords').mkdir(parents=True)
+            (Path(source) / 'corpora/stopwords/english').write_text('the\n')
+            (Path(source) / 'sentiment').mkdir()
+            with zipfile.ZipFile(Path(source) / 'sentiment/vader_lexicon.zip', 'w') as archive:
+                archive.writestr('vader_lexicon/vader_lexicon.txt', 'good\t1.9\t0.9\t[2]\n')
+
+            with self.settings(NLTK_DATA_DIR=Path(target)), \
+                    mock.patch.object(nltk.data, 'path', list(nltk.data.path)), \
+                    mock.patch('nltk.download') as download:
+                call_command('fetch_nltk_data', source=source, stdout=StringIO())
+            download.assert_not_called()
+            for path in nltk_resources.NLTK_RESOURCES.values():
+                self.assertTrue((Path(target) / path).exists())
+
+    def test_fetch_check_reports_missing(self):
+        """Test that --check fails when resources are missing"""
+        with mock.patch('summarizer.management.commands.fetch_nltk_data.missing_resources', return_value=['punkt']):
+            with self.assertRaisesMessage(CommandError, 'punkt'):
+                call_command('fetch_nltk_data', check=True)
+
+
+class ClassifierArtifactTestCase(TestCase):
+    """Test cases for the persisted classifier artifact"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name)
+
+    def test_train_command_writes_versioned_artifact(self):
+        """Test that train_classifier saves the artifact and its metadata"""
+        call_command('train_classifier', output_dir=str(self.path), artifact_version='v1', stdout=StringIO())
+
+        metadata = json.loads((self.path / 'v1' / 'metadata.json').read_text())
+        self.assertEqual(metadata['version'], 'v1')
+        self.assertEqual(metadata['n_samples'], 7)
+        self.assertEqual(sorted(metadata['classes']), ['Business', 'Education', 'Healthcare', 'Technology'])
+
+    def test_train_command_with_corpus(self):
+        """Test training from a JSONL corpus"""
+        corpus = self.path / 'corpus.jsonl'
+        corpus.write_text('\n'.join(json.dumps(r) for r in [
+            {'text': 'goals and matches', 'label': 'Sports'},
+            {'text': 'elections and votes', 'label': 'Politics'},
+        ]))
+        call_command('train_classifier', corpus=str(corpus), output_dir=str(self.path / 'models'),
+                     artifact_version='v1', stdout=StringIO())
+
+        from .text_classifier_model import load_classifier
+        version, classifier = load_classifier(self.path / 'models')
+        self.assertEqual(version, 'v1')
+        self.assertEqual(classifier.predict(['votes'])[0], 'Politics')
+
+    def test_train_command_refuses_existing_version(self):
+        """Test that an existing artifact version is never overwritten"""
+        call_command('train_classifier', output_dir=str(self.path), artifact_version='v1', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('train_classifier', output_dir=str(self.path), artifact_version='v1', stdout=StringIO())
+
+    def test_load_newest_memory_mapped_without_training(self):
+        """Test that loading picks the newest version, memory-maps arrays and never fits"""
+        import numpy as np
+        from .text_classifier_model import load_classifier, save_classifier, train_classifier
+        save_classifier(train_classifier(), self.path, version='20240101000000')
+        save_classifier(train_classifier(), self.path, version='20250101000000')
+
+        with mock.patch('sklearn.pipeline.Pipeline.fit') as fit:
+            version, classifier = load_classifier(self.path, mmap_mode='r')
+        fit.assert_not_called()
+        self.assertEqual(version, '20250101000000')
+        self.assertIsInstance(classifier.steps[-1][1].feature_log_prob_, np.memmap)
+        self.assertEqual(classifier.predict(['Stock markets are volatile'])[0], 'Business')
+
+    def test_missing_artifact_is_configuration_error(self):
+        """Test that a missing artifact raises a clear configuration error"""
+        from .text_classifier_model import load_classifier
+        with self.assertRaisesMessage(ImproperlyConfigured, 'train_classifier'):
+            load_classifier(self.path / 'empty')
+
+
+class ResultCacheTestCase(APITestCase):
+    """Test cases for the content-addressed result cache"""
+
+    def test_key_depends_on_text_params_and_version(self):
+        """Test that keys change with parameters and model version but not outer whitespace"""
+        digest = content_hash('Some text.')
+        self.assertEqual(content_hash('  Some text.\n'), digest)
+        key = make_key('summary', digest, {'max_sentences': 3}, None)
+        self.assertNotEqual(key, make_key('summary', digest, {'max_sentences': 2}, None))
+        self.assertNotEqual(key, make_key('keywords', digest, {'max_sentences': 3}, None))
+        self.assertNotEqual(key, make_key('summary', digest, {'max_sentences': 3}, 'v2'))
+        self.assertNotEqual(key, make_key('summary', content_hash('Other text.'), {'max_sentences': 3}, None))
+
+    def test_lru_eviction_and_counters(self):
+        """Test LRU eviction order and hit/miss/eviction counters"""
+        cache = ResultCache(max_entries=2, ttl=60)
+        cache.set('a', {'v': 1})
+        cache.set('b', {'v': 2})
+        self.assertEqual(cache.get('a'), (True, {'v': 1}))
+        cache.set('c', {'v': 3})
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.get('c'), (True, {'v': 3}))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['entries']), (2, 1, 1, 2))
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        cache = ResultCache(max_entries=10, ttl=5)
+        with mock.patch('summarizer.cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with mock.patch('summarizer.cache.time.monotonic', return_value=106.0):
+            self.assertEqual(cache.get('a'), (False, None))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_cached_value_is_a_copy(self):
+        """Test that callers cannot mutate a cached result"""
+        cache = ResultCache()
+        cache.set('a', {'keywords': ['x']})
+        cache.get('a')[1]['keywords'].append('y')
+        self.assertEqual(cache.get('a'), (True, {'keywords': ['x']}))
+
+    def test_shared_django_cache_tier(self):
+        """Test that a second process-local cache finds results in the shared tier"""
+        caches_setting = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=caches_setting):
+            ResultCache(django_cache_alias='default').set('k', {'v': 1})
+            other_worker = ResultCache(django_cache_alias='default')
+            self.assertEqual(other_worker.get('k'), (True, {'v': 1}))
+            self.assertEqual(other_worker.stats()['shared_hits'], 1)
+
+    def test_analyses_served_from_cache(self):
+        """Test that repeated analyses skip recomputation"""
+        text = 'Caching avoids repeated work. Repeated work is slow.'
+        with self.settings(SUMMAREASE_RESULT_CACHE={'ENABLED': True, 'MAX_ENTRIES': 16, 'TTL': 60}):
+            first = run_analyses(text)
+            with mock.patch('summarizer.utils.word_tokenize') as tokenize, \
+                    mock.patch('summarizer.utils._vader_analyzer') as vader:
+                second = run_analyses('  ' + text)
+                batch = run_batch('summary', [text, 'Fresh text here.'], {'max_sentences': 3})
+            tokenize.assert_called()  # only for the fresh batch item
+            vader.polarity_scores.assert_not_called()
+            self.assertEqual(first, second)
+            self.assertEqual(batch[0], first['summary'])
+            self.assertGreaterEqual(get_result_cache().stats()['hits'], 5)
+
+    def test_cache_stats_endpoint(self):
+        """Test the cache stats endpoint"""
+        with self.settings(SUMMAREASE_RESULT_CACHE={'ENABLED': True}):
+            self.client.post(reverse('sentiment'), {'text': 'Nice!'}, format='json')
+            self.client.post(reverse('sentiment'), {'text': 'Nice!'}, format='json')
+            response = self.client.get(reverse('cache-stats'))
+        self.assertTrue(response.data['enabled'])
+        self.assertEqual((response.data['hits'], response.data['misses']), (1, 1))
+
+
+class NearDuplicateTestCase(APITestCase):
+    """Test cases for near-duplicate fingerprints and their use by the result cache"""
+
+    text = (
+        'Report generated at 10:42 on 2024-03-01. Stock markets fell sharply today as investors sold shares '
+        'across the technology sector. Analysts expect volatile trading to continue while interest rates '
+        'remain high. Several large companies reported weaker earnings than forecast, and the central bank '
+        'signalled that it would keep rates unchanged for the rest of the quarter. Bond yields rose for a '
+        'third day, the dollar strengthened against most currencies, and oil prices slipped on concerns '
+        'about slowing demand.'
+    )
+    variant = (
+        'Report generated at 17:05 on 2024-03-02.  Stock markets fell sharply today as investors sold shares\n'
+        'across the technology sector. Analysts expect volatile trading to continue while interest rates '
+        'remain high. Several large companies reported weaker earnings than forecast, and the central bank '
+        'signalled that it would keep rates unchanged for the rest of the quarter. Bond yields rose for a '
+        'third day, the dollar strengthened against most currencies, and oil prices slipped on concerns '
+        'about slowing demand.\n\n-- Unsubscribe'
+    )
+    unrelated = (
+        'The football team won the championship match after extra time. Fans celebrated in the streets '
+        'of the city until late at night, and the coach praised the players for their determination in '
+        'a difficult season with many injuries.'
+    )
+    settings_on = {
+        'SUMMAREASE_RESULT_CACHE': {'ENABLED': True, 'MAX_ENTRIES': 64, 'TTL': 60},
+        'SUMMAREASE_NEAR_DUPLICATES': {'ENABLED': True},
+    }
+
+    def fingerprint(self, text):
+        from .near_duplicates import document_fingerprint
+        return document_fingerprint(analyze_document(text))
+
+    def test_fingerprint_tolerates_small_edits(self):
+        """Test that timestamps, whitespace and a footer barely change the fingerprint"""
+        base = self.fingerprint(self.text)
+        self.assertLessEqual((base ^ self.fingerprint(self.variant)).bit_count(), 9)
+        self.assertGreater((base ^ self.fingerprint(self.unrelated)).bit_count(), 9)
+        self.assertIsNone(self.fingerprint('Too short to fingerprint.'))
+
+    def test_banded_index_finds_every_match_within_threshold(self):
+        """Test that LSH lookup finds fingerprints up to the allowed distance, and no further"""
+        import random
+        from .near_duplicates import NearDuplicateIndex
+        rng = random.Random(0)
+        index = NearDuplicateIndex(threshold=0.9, max_entries=1000)
+        self.assertEqual(index.max_distance, 6)
+        fingerprints = {f'h{i}': rng.getrandbits(64) for i in range(500)}
+        for text_hash, fingerprint in fingerprints.items():
+            index.add(text_hash, fingerprint)
+        for text_hash, fingerprint in list(fingerprints.items())[:100]:
+            for flips in (0, 3, 6):
+                query = fingerprint
+                for bit in rng.sample(range(64), flips):
+                    query ^= 1 << bit
+                self.assertEqual(index.nearest(query), (text_hash, 1 - flips / 64))
+            self.assertIsNone(index.nearest(fingerprint, exclude=text_hash))
+        far = fingerprints['h0'] ^ sum(1 << bit for bit in range(0, 64, 8))
+        self.assertNotEqual((index.nearest(far) or ('',))[0], 'h0')
+
+        small = NearDuplicateIndex(max_entries=2)
+        for text_hash in ('a', 'b', 'c'):
+            small.add(text_hash, fingerprints['h1'] if text_hash == 'a' else rng.getrandbits(64))
+        self.assertEqual(len(small), 2)
+        self.assertIsNone(small.nearest(fingerprints['h1']))
+
+    def test_all_endpoints_reuse_near_duplicate_results(self):
+        """Test that each /api/ endpoint returns the cached analysis of a near-identical text"""
+        endpoints = ('summarize', 'classify', 'sentiment', 'keywords')
+        with self.settings(**self.settings_on):
+            originals = {name: self.client.post(reverse(name), {'text': self.text}, format='json').data
+                         for name in endpoints}
+            with mock.patch('summarizer.utils._vader_analyzer') as vader, \
+                    mock.patch('summarizer.utils._predict_proba') as predict:
+                for name in endpoints:
+                    response = self.client.post(reverse(name), {'text': self.variant}, format='json')
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    marker = response.data.pop('near_duplicate_of')
+                    self.assertEqual(marker['content_hash'], content_hash(self.text))
+                    self.assertGreaterEqual(marker['similarity'], 0.85)
+                    self.assertEqual(response.data, originals[name])
+            vader.polarity_scores.assert_not_called()
+            predict.assert_not_called()
+
+            # Different options are not served from another text's result
+            response = self.client.post(reverse('summarize'), {'text': self.variant, 'max_sentences': 1},
+                                        format='json')
+            self.assertNotIn('near_duplicate_of', response.data)
+            response = self.client.post(reverse('sentiment'), {'text': self.unrelated}, format='json')
+            self.assertNotIn('near_duplicate_of', response.data)
+            stats = self.client.get(reverse('cache-stats')).data['near_duplicates']
+            # The variant's fingerprint also matched for max_sentences=1, then was indexed itself
+            self.assertEqual((stats['matches'], stats['entries']), (5, 3))
+
+    def test_disabled_by_default(self):
+        """Test that near-duplicates are recomputed unless matching is enabled"""
+        with self.settings(SUMMAREASE_RESULT_CACHE={'ENABLED': True}):
+            self.client.post(reverse('sentiment'), {'text': self.text}, format='json')
+            response = self.client.post(reverse('sentiment'), {'text': self.variant}, format='json')
+            self.assertNotIn('near_duplicate_of', response.data)
+            self.assertEqual(self.client.get(reverse('cache-stats')).data['near_duplicates'], {'enabled': False})
+
+
+@override_settings(SUMMAREASE_POOL_WORKERS=0)
+class AsyncViewsTestCase(TestCase):
+    """Test cases for the async serving mode views"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def post(self, path, data=None, body=None):
+        return self.factory.post(path, data=body or json.dumps(data), content_type='application/json')
+
+    async def test_async_single_endpoints_match_sync(self):
+        """Test that async views return the same payloads as the DRF views"""
+        from . import async_views
+        text = 'Stock markets are volatile. Investors are nervous about markets.'
+        summary = await async_views.summarize_view(self.post('/api/text-summary/', {'text': text, 'max_sentences': 1}))
+        classify = await async_views.classify_view(self.post('/api/classify-text/', {'text': text}))
+
+        self.assertEqual(summary.status_code, 200)
+        self.assertEqual(json.loads(summary.content), {
+            'summary': summarize_text(text, 1), 'max_sentences': 1, 'approximate': False, 'strategy': 'exact',
+        })
+        self.assertEqual(json.loads(classify.content), classification_result(text))
+
+    async def test_async_validation_errors(self):
+        """Test that async views report the same validation errors"""
+        from . import async_views
+        missing = await async_views.sentiment_view(self.post('/api/sentiment/', {}))
+        bad_option = await async_views.keywords_view(self.post('/api/keywords/', {'text': 'x', 'top_k': 'many'}))
+        bad_json = await async_views.analyze_view(
+            self.factory.post('/api/analyze/', data='{nope', content_type='application/json'))
+        wrong_method = await async_views.summarize_view(self.factory.get('/api/text-summary/'))
+
+        self.assertEqual((missing.status_code, json.loads(missing.content)), (400, {'error': 'Text is required'}))
+        self.assertEqual(json.loads(bad_option.content), {'error': 'top_k must be an integer'})
+        self.assertEqual(bad_json.status_code, 400)
+        self.assertEqual(wrong_method.status_code, 405)
+
+    async def test_async_analyze_and_batch(self):
+        """Test the async combined and batch endpoints"""
+        from . import async_views
+        analyze = await async_views.analyze_view(
+            self.post('/api/analyze/', {'text': 'I love it.', 'analyses': ['sentiment']}))
+        batch = await async_views.sentiment_batch_view(
+            self.post('/api/sentiment/batch/', {'texts': ['I love it.', '']}))
+
+        self.assertEqual(json.loads(analyze.content)['sentiment']['label'], 'positive')
+        results = json.loads(batch.content)['results']
+        self.assertEqual(results[1], {'error': 'Text is required'})
+
+    def test_large_body_in_both_modes(self):
+        """Test that a body over DATA_UPLOAD_MAX_MEMORY_SIZE is served alike by the sync and async views"""
+        from django.conf import settings
+        from . import async_views
+        text = ' '.join(['Stock markets are volatile today.'] * 100_000)
+        body = json.dumps({'text': text, 'max_sentences': 1})
+        self.assertGreater(len(body), settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+
+        sync = self.client.post(reverse('summarize'), data=body, content_type='application/json')
+        async_response = async_to_sync(async_views.summarize_view)(self.post('/api/text-summary/', body=body))
+        self.assertEqual(sync.status_code, 200)
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(json.loads(async_response.content), sync.json())
+
+        # No limit unless MAX_BODY_BYTES is set; a body of exactly the limit is accepted, one byte more is not
+        size = len(body.encode())
+        for limit, expected in ((size, 200), (size - 1, 413)):
+            with self.settings(SUMMAREASE_WIRE={'MAX_BODY_BYTES': limit}):
+                sync = self.client.post(reverse('summarize'), data=body, content_type='application/json')
+                async_response = async_to_sync(async_views.summarize_view)(self.post('/api/text-summary/', body=body))
+            self.assertEqual(sync.status_code, expected)
+            self.assertEqual(async_response.status_code, expected)
+            self.assertEqual(json.loads(async_response.content), sync.json())
+
+    @override_settings(SUMMAREASE_POOL_WORKERS=1, **NearDuplicateTestCase.settings_on)
+    def test_cache_lookups_in_serving_process(self):
+        """Test that the async views look up and fill the serving process's cache, computing only misses in the pool"""
+        from . import async_views
+        from .near_duplicates import get_near_duplicate_index
+        from .pool import shutdown_executor
+        self.addCleanup(shutdown_executor)
+        summarize = async_to_sync(async_views.summarize_view)
+        batch = async_to_sync(async_views.sentiment_batch_view)
+        with mock.patch.object(async_views, 'run_in_pool', wraps=async_views.run_in_pool) as pool:
+            first = summarize(self.post('/api/text-summary/', {'text': NearDuplicateTestCase.text}))
+            # Fingerprint and summary computed in the pool
+            self.assertEqual(pool.call_count, 2)
+            again = summarize(self.post('/api/text-summary/', {'text': NearDuplicateTestCase.text}))
+            self.assertEqual(pool.call_count, 2)
+            near = summarize(self.post('/api/text-summary/', {'text': NearDuplicateTestCase.variant}))
+            # Only the fingerprint of the variant
+            self.assertEqual(pool.call_count, 3)
+            batch(self.post('/api/sentiment/batch/', {'texts': ['I love it.', 'I hate it.']}))
+            batch(self.post('/api/sentiment/batch/', {'texts': ['I love it.', 'I hate it.']}))
+            self.assertEqual(pool.call_count, 4)
+
+        self.assertEqual(json.loads(again.content), json.loads(first.content))
+        self.assertIn('near_duplicate_of', json.loads(near.content))
+        stats = get_result_cache().stats()
+        # The repeat, the near-duplicate's match and both repeated batch items
+        self.assertEqual((stats['entries'], stats['hits']), (4, 4))
+        self.assertEqual(get_near_duplicate_index().stats()['entries'], 1)
+
+    def test_async_urlconf_mirrors_sync_routes(self):
+        """Test that the async URLconf keeps every route and name"""
+        from . import async_urls, async_views, urls
+        self.assertEqual([p.name for p in async_urls.urlpatterns], [p.name for p in urls.urlpatterns])
+        by_name = {p.name: p.callback for p in async_urls.urlpatterns}
+        self.assertIs(by_name['analyze'], async_views.analyze_view)
+
+    @override_settings(SUMMAREASE_POOL_WORKERS=1)
+    def test_process_pool_runs_analysis(self):
+        """Test that a pool worker preloads resources and runs an analysis"""
+        import asyncio
+        from .pool import run_in_pool, shutdown_executor
+        self.addCleanup(shutdown_executor)
+        result = asyncio.run(run_in_pool(analysis_result, 'classification', 'Stock markets are volatile'))
+        self.assertEqual(result['category'], 'Business')
+
+
+class SummaryEngineTestCase(TestCase):
+    """Test cases for the sparse-matrix sentence scoring and TextRank"""
+
+    text = (
+        "Stock markets fell as investors sold shares. "
+        "The weather was mild on Tuesday. "
+        "Investors expect stock markets to recover as shares rebound. "
+        "A cat slept. "
+        "Analysts say investors and markets watch shares closely."
+    )
+
+    def test_term_matrix(self):
+        """Test that the sentence-by-term matrix counts each sentence's content words"""
+        doc = analyze_document("Dogs bark at dogs. Cats purr.")
+        terms, ids = doc.term_ids()
+        self.assertEqual(terms, ['dogs', 'bark', 'cats', 'purr'])
+        self.assertEqual(doc.term_matrix().toarray().tolist(), [[2, 1, 0, 0], [0, 0, 1, 1]])
+        self.assertEqual(doc.term_counts().tolist(), [2, 1, 1, 1])
+
+    def test_top_sentences(self):
+        """Test that argpartition selection matches a full sort, ties to the earlier sentence"""
+        import numpy as np
+        from .summary_engine import top_sentences
+        rng = np.random.default_rng(0)
+        scores = rng.integers(0, 5, size=200).astype(float)
+        eligible = scores > 0
+        sentences = [f'sentence {i}' for i in range(200)]
+        for k in (1, 7, 50, 500):
+            reference = sorted(np.flatnonzero(eligible).tolist(), key=lambda i: (-scores[i], i))[:k]
+            self.assertEqual(top_sentences(scores, eligible, sentences, k), sorted(reference))
+        # Repeats of a picked sentence give their place to the next best
+        repeated = ['same'] * 5 + ['other']
+        self.assertEqual(top_sentences(np.array([5., 5, 5, 5, 5, 1]), np.ones(6, bool), repeated, 2), [0, 5])
+
+    def test_summary_in_document_order(self):
+        """Test that the picked sentences keep their order in the text"""
+        summary = summarize_text(self.text, max_sentences=2)
+        first, second = summary.split('. ', 1)
+        self.assertLess(self.text.index(first), self.text.index(second))
+        self.assertEqual(summarize_stream(self.text, 2), summary)
+
+    def test_textrank(self):
+        """Test that TextRank favours sentences similar to many others"""
+        from .summary_engine import textrank_scores
+        doc = analyze_document(self.text)
+        ranks = textrank_scores(doc.term_matrix())
+        self.assertAlmostEqual(ranks.sum(), 1.0)
+        # Sentences sharing no words with the others are ranked last
+        self.assertEqual(sorted(ranks.argsort()[:2].tolist()), [1, 3])
+        summary = summarize_text(self.text, max_sentences=2, method='textrank')
+        self.assertNotIn('weather', summary)
+        self.assertNotIn('cat', summary)
+        self.assertEqual(summarize_text('', 2, method='textrank'), '')
+
+    def test_textrank_iterations_are_bounded(self):
+        """Test that power iteration stops after MAX_ITERATIONS steps"""
+        from .summary_engine import textrank_scores
+        matrix = analyze_document(self.text).term_matrix()
+        with mock.patch('summarizer.summary_engine.np.abs', wraps=__import__('numpy').abs) as steps:
+            textrank_scores(matrix, max_iterations=3, tolerance=0)
+        self.assertEqual(steps.call_count, 3)
+
+    def test_method_setting(self):
+        """Test that the configured method is used and kept apart in the result cache"""
+        from django.core.exceptions import ImproperlyConfigured
+        from .utils import model_version
+        frequency_version = model_version('summary')
+        with self.settings(SUMMAREASE_SUMMARY={'METHOD': 'textrank'}):
+            self.assertEqual(summarize_text(self.text, 2), summarize_text(self.text, 2, method='textrank'))
+            self.assertNotEqual(model_version('summary'), frequency_version)
+        with self.settings(SUMMAREASE_SUMMARY={'METHOD': 'lexrank'}):
+            with self.assertRaises(ImproperlyConfigured):
+                summarize_text(self.text, 2)
+
+
+class ParallelSummarizationTestCase(TestCase):
+    """Test cases for the map-reduce path of long documents"""
+
+    text = ' '.join(
+        f'Sentence {i} talks about {topic} and {other}. The {topic} matters here!'
+        for i, (topic, other) in enumerate(
+            [('markets', 'stocks'), ('health', 'care'), ('learning', 'students'), ('markets', 'care')] * 15)
+    )
+
+    @override_settings(SUMMAREASE_PARALLEL_THRESHOLD=1, SUMMAREASE_POOL_WORKERS=2)
+    def test_parallel_matches_serial(self):
+        """Test that the parallel path reproduces the serial tokens, counts, scores and summary"""
+        from .pool import shutdown_executor
+        from .summary_engine import sentence_scores
+        self.addCleanup(shutdown_executor)
+        parallel = AnalyzedDocument(self.text)
+        with self.settings(SUMMAREASE_PARALLEL_THRESHOLD=None):
+            serial = AnalyzedDocument(self.text)
+
+        self.assertTrue(parallel.parallel)
+        self.assertFalse(serial.parallel)
+        self.assertEqual(parallel.tokens, serial.tokens)
+        self.assertEqual(parallel.content_offsets, serial.content_offsets)
+        self.assertEqual(parallel.term_ids()[0], serial.term_ids()[0])
+        self.assertEqual(parallel.term_counts().tolist(), serial.term_counts().tolist())
+        for method in ('frequency', 'textrank'):
+            self.assertEqual(sentence_scores(parallel, method).tolist(), sentence_scores(serial, method).tolist())
+        self.assertEqual((parallel.term_matrix() != serial.term_matrix()).nnz, 0)
+        self.assertEqual(summarize_text(parallel, 5), summarize_text(serial, 5))
+
+    @override_settings(SUMMAREASE_PARALLEL_THRESHOLD=1, SUMMAREASE_POOL_WORKERS=0)
+    def test_serial_when_pool_disabled(self):
+        """Test that short-circuit conditions keep the serial path"""
+        self.assertFalse(AnalyzedDocument(self.text).parallel)
+
+
+class StreamingSummarizationTestCase(APITestCase):
+    """Test cases for the two-pass streaming summarizer"""
+
+    text = ParallelSummarizationTestCase.text + ' The markets matters here! Closing words.'
+
+    def chunks(self, size=37):
+        return (self.text[i:i + size] for i in range(0, len(self.text), size))
+
+    def test_matches_summarize_text(self):
+        """Test that every kind of source gives the in-memory summary"""
+        for max_sentences in (1, 3, 8):
+            expected = summarize_text(self.text, max_sentences)
+            self.assertEqual(summarize_stream(self.text, max_sentences), expected)
+            self.assertEqual(summarize_stream(self.chunks, max_sentences), expected)
+            self.assertEqual(summarize_stream(io.BytesIO(self.text.encode('utf-8')), max_sentences), expected)
+
+    def test_one_shot_source_is_spilled(self):
+        """Test that a generator is replayed from a spill file for the second pass"""
+        with mock.patch('summarizer.utils.tempfile.TemporaryFile', wraps=tempfile.TemporaryFile) as spill:
+            summary = summarize_stream(self.chunks(), 3)
+        spill.assert_called_once()
+        self.assertEqual(summary, summarize_text(self.text, 3))
+
+    def test_sentence_offsets(self):
+        """Test that sentences split across chunks keep their offsets in the full text"""
+        sentences = list(iter_sentences(self.chunks(11)))
+        self.assertEqual([sentence for _, sentence in sentences], analyze_document(self.text).sentences)
+        for offset, sentence in sentences:
+            self.assertEqual(self.text[offset:offset + len(sentence)], sentence)
+
+    def test_heap_is_bounded(self):
+        """Test that only max_sentences candidates are kept while scoring"""
+        with mock.patch('summarizer.utils.heapq.heappush', wraps=heapq.heappush) as push:
+            ranked = rank_sentences_stream(self.chunks, 2)
+        self.assertEqual(push.call_count, 2)
+        self.assertEqual(len(ranked), 2)
+        self.assertEqual(' '.join(sentence for _, _, sentence in ranked), summarize_text(self.text, 2))
+
+    def test_stream_endpoint(self):
+        """Test summarizing a raw text/plain body"""
+        url = reverse('summarize-stream') + '?max_sentences=2'
+        response = self.client.post(url, self.text, content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summary'], summarize_text(self.text, 2))
+        self.assertEqual(response.data['max_sentences'], 2)
+        for sentence in response.data['sentences']:
+            offset = sentence['offset']
+            self.assertEqual(self.text[offset:offset + len(sentence['text'])], sentence['text'])
+
+    def test_stream_endpoint_errors(self):
+        """Test that an empty body or a bad option is rejected"""
+        response = self.client.post(reverse('summarize-stream'), '', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Text is required')
+        response = self.client.post(reverse('summarize-stream') + '?max_sentences=x', 'Hi.', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stream_endpoint_without_content_length(self):
+        """Test that a chunked body with no Content-Length is read when the server terminates the input"""
+        from django.test import RequestFactory
+        from .views import summarize_stream_view
+
+        def post(**environ):
+            request = RequestFactory().post(reverse('summarize-stream') + '?max_sentences=2', '', content_type='text/plain')
+            request.META.pop('CONTENT_LENGTH', None)
+            request.META.update(environ, HTTP_TRANSFER_ENCODING='chunked')
+            return summarize_stream_view(request)
+
+        response = post(**{'wsgi.input': io.BytesIO(self.text.encode('utf-8')), 'wsgi.input_terminated': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summary'], summarize_text(self.text, 2))
+        # Without wsgi.input_terminated the end of the body is unknown
+        response = post(**{'wsgi.input': io.BytesIO(self.text.encode('utf-8'))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def make_pdf(pages):
+    """Bytes of a PDF whose pages show the given lists of text lines in Helvetica."""
+    def escape(line):
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    count = len(pages)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            ' '.join(f'{4 + 2 * i} 0 R' for i in range(count)), count)).encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i, lines in enumerate(pages):
+        stream = ('BT /F1 10 Tf 14 TL 40 800 Td ' + ' '.join(f'({escape(line)}) Tj T*' for line in lines) + ' ET')
+        objects.append(('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources '
+                        f'<< /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>').encode())
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream.encode('latin-1')))
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class PDFIngestionTestCase(APITestCase):
+    """Test cases for page-by-page PDF analysis"""
+
+    pages = [
+        ['Stock markets fell sharply as investors sold shares.', 'Markets remain volatile this week.'],
+        ['Investors expect interest rates to stay high.', 'The central bank kept rates unchanged and'],
+        ['markets reacted calmly to the decision.', 'Oil prices slipped on weaker demand.'],
+        ['Analysts say stock markets could recover.', 'Investors watch rates and markets closely.'],
+    ]
+
+    def upload(self, content, **data):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        upload = SimpleUploadedFile('report.pdf', content, content_type='application/pdf')
+        return self.client.post(reverse('pdf-analyze'), {'file': upload, **data}, format='multipart')
+
+    def test_pages_extracted_in_order(self):
+        """Test that pages come out one at a time, a sentence may span two pages"""
+        from .pdf import iter_pdf_pages
+        pages = list(iter_pdf_pages(io.BytesIO(make_pdf(self.pages))))
+        self.assertEqual(len(pages), 4)
+        self.assertIn('Oil prices slipped', pages[2])
+        sentences = [sentence for _, sentence in iter_sentences(iter(pages))]
+        spanning = [sentence for sentence in sentences if sentence.startswith('The central bank')]
+        self.assertEqual(len(spanning), 1)
+        self.assertTrue(spanning[0].endswith('markets reacted calmly to the decision.'))
+
+    def test_matches_in_memory_analysis(self):
+        """Test that the streamed summary and keywords equal those of the joined text"""
+        from .pdf import analyze_pdf, iter_pdf_pages
+        content = make_pdf(self.pages)
+        text = ''.join(iter_pdf_pages(io.BytesIO(content)))
+        keyword_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(keyword_dir.cleanup)
+        keyword_settings = self.settings(KEYWORD_ARTIFACT_DIR=Path(keyword_dir.name))
+        keyword_settings.enable()
+        self.addCleanup(keyword_settings.disable)
+        # With a fitted keyword model, so keywords are ranked the same way with no ties
+        call_command('fit_keyword_model', artifact_version='pdf', stdout=StringIO())
+        with mock.patch('summarizer.utils.tempfile.TemporaryFile', wraps=tempfile.TemporaryFile) as spill:
+            result = analyze_pdf(io.BytesIO(content), max_sentences=2, top_k=5)
+        spill.assert_called_once()
+        self.assertEqual((result['pages'], result['characters']), (4, len(text)))
+        self.assertEqual(result['summary']['summary'], summarize_text(text, 2))
+        self.assertEqual(result['keywords']['keywords'], extract_keywords(text, 5))
+        self.assertNotIn('summary', analyze_pdf(io.BytesIO(content), analyses=('keywords',)))
+
+    @override_settings(SUMMAREASE_POOL_WORKERS=2, SUMMAREASE_PDF={'PARALLEL_MIN_PAGES': 2, 'PAGES_PER_TASK': 1})
+    def test_parallel_extraction(self):
+        """Test that pages extracted on the process pool arrive in order"""
+        from . import pdf
+        from .pdf import iter_pdf_pages
+        from .pool import shutdown_executor
+        self.addCleanup(shutdown_executor)
+        content = make_pdf(self.pages * 3)
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as file:
+            file.write(content)
+            file.flush()
+            with mock.patch.object(pdf, '_parallel_pages', wraps=pdf._parallel_pages) as parallel:
+                pages = list(iter_pdf_pages(file.name))
+        parallel.assert_called_once()
+        with self.settings(SUMMAREASE_POOL_WORKERS=0):
+            self.assertEqual(pages, list(iter_pdf_pages(io.BytesIO(content))))
+
+    def test_reader_per_extraction(self):
+        """Test that tasks of one extraction share a reader, which is closed once the extraction ends"""
+        import shutil
+        from . import pdf
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as file:
+            file.write(make_pdf(self.pages))
+            file.flush()
+            with mock.patch.object(pdf, 'PdfReader', wraps=pdf.PdfReader) as reader:
+                extraction = tempfile.mkdtemp()
+                self.addCleanup(shutil.rmtree, extraction, True)
+                open(os.path.join(extraction, pdf._RUNNING), 'x').close()
+                pid, first = pdf._extract_pages(file.name, extraction, 0, 2)
+                _, second = pdf._extract_pages(file.name, extraction, 2, 4)
+            self.assertEqual(reader.call_count, 1)
+            self.assertEqual(first + second, list(pdf.iter_pdf_pages(io.BytesIO(make_pdf(self.pages)))))
+            handle = pdf._readers[extraction][0]
+            os.remove(os.path.join(extraction, pdf._RUNNING))
+            pdf._wait_for_release(extraction, {pid})
+            self.assertNotIn(extraction, pdf._readers)
+            self.assertTrue(handle.closed)
+
+    @override_settings(SUMMAREASE_POOL_WORKERS=2, SUMMAREASE_PDF={'PARALLEL_MIN_PAGES': 2, 'PAGES_PER_TASK': 1})
+    def test_workers_keep_nothing_open(self):
+        """Test that no pool worker holds the PDF open once analyze_pdf has returned"""
+        from . import pdf
+        from .pool import get_executor, shutdown_executor
+        self.addCleanup(shutdown_executor)
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as file:
+            file.write(make_pdf(self.pages * 3))
+            file.flush()
+            with mock.patch.object(pdf, '_parallel_pages', wraps=pdf._parallel_pages) as parallel:
+                self.assertEqual(pdf.analyze_pdf(file.name)['pages'], 12)
+            parallel.assert_called_once()
+            for pid in get_executor()._processes:
+                descriptors = Path(f'/proc/{pid}/fd')
+                if not descriptors.exists():
+                    self.skipTest('needs /proc')
+                targets = []
+                for descriptor in descriptors.iterdir():
+                    try:
+                        targets.append(os.readlink(descriptor))
+                    except OSError:
+                        pass
+                self.assertNotIn(file.name, targets)
+
+    def test_upload_endpoint(self):
+        """Test the multipart upload endpoint and its errors"""
+        response = self.upload(make_pdf(self.pages), max_sentences=1, analyses='summary')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['pages'], 4)
+        self.assertEqual(len(response.data['summary']['sentences']), 1)
+        self.assertNotIn('keywords', response.data)
+
+        self.assertEqual(self.upload(b'not a pdf').data, {'error': 'Invalid PDF file'})
+        self.assertEqual(self.upload(make_pdf(self.pages), analyses='sentiment').status_code, 400)
+        self.assertEqual(self.client.post(reverse('pdf-analyze'), {}, format='multipart').data,
+                         {'error': 'A PDF file is required'})
+        with self.settings(SUMMAREASE_PDF={'MAX_UPLOAD_BYTES': 100}):
+            self.assertEqual(self.upload(make_pdf(self.pages)).status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        with self.settings(SUMMAREASE_PDF={'MAX_PAGES': 2}):
+            self.assertEqual(self.upload(make_pdf(self.pages)).data, {'error': 'PDF files may have at most 2 pages'})
+
+
+class WireFormatTestCase(APITestCase):
+    """Test cases for compressed request bodies and MessagePack requests and responses"""
+
+    text = 'Stock markets are volatile. Investors are nervous about markets. The weather was mild.'
+
+    def post_body(self, body, content_type='application/json', **headers):
+        return self.client.generic(
+            'POST', reverse('summarize'), body, content_type=content_type, headers=headers)
+
+    def test_gzip_request_body(self):
+        """Test that a gzip-compressed body is analyzed like the plain one"""
+        body = json.dumps({'text': self.text, 'max_sentences': 1}).encode()
+        plain = self.post_body(body)
+        compressed = self.post_body(gzip.compress(body), **{'Content-Encoding': 'gzip'})
+        self.assertEqual(compressed.status_code, status.HTTP_200_OK)
+        self.assertEqual(compressed.json(), plain.json())
+
+    def test_zstd_request_body(self):
+        """Test that a zstd-compressed body is accepted"""
+        import zstandard
+        body = json.dumps({'text': self.text, 'max_sentences': 1}).encode()
+        response = self.post_body(zstandard.compress(body), **{'Content-Encoding': 'zstd'})
+        self.assertEqual(response.json()['summary'], summarize_text(self.text, 1))
+
+    @override_settings(SUMMAREASE_WIRE={'MAX_DECOMPRESSED_BYTES': 64 * 1024})
+    def test_decompression_limit(self):
+        """Test that a body expanding beyond the limit is refused before it is fully decompressed"""
+        bomb = gzip.compress(b'{"text": "' + b' ' * (4 * 2 ** 20) + b'"}')
+        self.assertLess(len(bomb), 8 * 1024)
+        with mock.patch.object(formats, 'DECOMPRESS_CHUNK_SIZE', 1024):
+            response = self.post_body(bomb, **{'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_invalid_and_unsupported_encodings(self):
+        """Test that corrupt and unknown encodings are rejected"""
+        corrupt = self.post_body(b'not gzip at all', **{'Content-Encoding': 'gzip'})
+        unknown = self.post_body(b'{}', **{'Content-Encoding': 'br'})
+        self.assertEqual(corrupt.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(unknown.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(unknown.json(), {'error': 'Unsupported Content-Encoding: br'})
+        # Browsers can read the error: the CORS headers are added to it
+        cross_origin = self.post_body(b'{}', **{'Content-Encoding': 'br', 'Origin': 'https://example.com'})
+        self.assertEqual(cross_origin.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertIn('Access-Control-Allow-Origin', cross_origin)
+
+    def test_msgpack_request_and_response(self):
+        """Test that MessagePack bodies are parsed and rendered when asked for"""
+        body = formats.packb({'texts': ['I love it.', ''], 'options': {}})
+        response = self.client.generic(
+            'POST', reverse('sentiment-batch'), gzip.compress(body), content_type=formats.MSGPACK_MEDIA_TYPE,
+            headers={'Accept': formats.MSGPACK_MEDIA_TYPE, 'Content-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Type'], formats.MSGPACK_MEDIA_TYPE)
+        data = formats.unpackb(response.content)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['results'][1], {'error': 'Text is required'})
+
+        invalid = self.post_body(b'\xc1', content_type=formats.MSGPACK_MEDIA_TYPE)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('MessagePack parse error', invalid.json()['detail'])
+
+    async def test_async_views_msgpack(self):
+        """Test that the async views negotiate MessagePack like the DRF views"""
+        from . import async_views
+        request = RequestFactory().post(
+            '/api/text-summary/', data=formats.packb({'text': self.text, 'max_sentences': 1}),
+            content_type=formats.MSGPACK_MEDIA_TYPE, headers={'Accept': formats.MSGPACK_MEDIA_TYPE})
+        response = await async_views.summarize_view(request)
+        self.assertEqual(response['Content-Type'], formats.MSGPACK_MEDIA_TYPE)
+        self.assertEqual(formats.unpackb(response.content)['summary'], summarize_text(self.text, 1))
+
+    def test_payload_benchmark(self):
+        """Test that the payload benchmark covers every format of every payload"""
+        from .benchmarks import make_corpora, payload_formats, wire_formats, wire_payloads
+        payloads = wire_payloads(make_corpora(sizes=('paragraph',), corpora=('sample',)), batch_size=3)
+        results = payload_formats(payloads, repeat=1)['results']
+        serializations, compressions = wire_formats()
+        self.assertEqual(len(results), len(payloads) * len(serializations) * (len(compressions) + 1))
+        self.assertEqual(results['batch-request/json']['relative_size'], 1.0)
+        self.assertLess(results['request/sample/paragraph/json+gzip']['bytes'],
+                        results['request/sample/paragraph/json']['bytes'])
+
+
+class KeywordModelTestCase(TestCase):
+    """Test cases for keyword extraction with a corpus-fitted IDF table"""
+
+    corpus = [
+        'The market opened higher and the market closed lower.',
+        'The market rallied as investors bought shares.',
+        'The market fell while investors sold bonds.',
+        'Doctors treated patients at the clinic.',
+    ]
+
+    def setUp(self):
+        self.artifact_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.artifact_dir.cleanup)
+        settings = self.settings(KEYWORD_ARTIFACT_DIR=Path(self.artifact_dir.name))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def fit(self, **options):
+        corpus = Path(self.artifact_dir.name) / 'corpus.jsonl'
+        corpus.write_text(''.join(json.dumps({'text': text}) + '\n' for text in self.corpus))
+        call_command('fit_keyword_model', corpus=str(corpus), artifact_version='v1', stdout=StringIO(), **options)
+
+    def test_fallback_without_artifact(self):
+        """Test that extraction still works from the single document when nothing is fitted"""
+        from .keyword_model import get_keyword_model
+        self.assertIsNone(get_keyword_model())
+        self.assertIn('market', extract_keywords('The market market fell.', top_k=3))
+
+    def test_rare_terms_rank_first(self):
+        """Test that terms common in the corpus rank below rare ones"""
+        text = 'The market rose. The clinic helped.'
+        self.fit()
+        keywords = extract_keywords(text, top_k=10)
+        # 'market' is in three of the four corpus documents, 'clinic' in one
+        self.assertLess(keywords.index('clinic'), keywords.index('market'))
+
+    def test_matches_sklearn_transform(self):
+        """Test that scores match TfidfVectorizer.transform for in-vocabulary terms"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from .keyword_model import fit_keyword_model
+        from .utils import _keyword_terms
+
+        model = fit_keyword_model(self.corpus)
+        vectorizer = TfidfVectorizer(analyzer=_keyword_terms, norm=None).fit(
+            analyze_document(text) for text in self.corpus)
+        doc = analyze_document(self.corpus[0])
+        terms, scores = model.transform(_keyword_terms(doc))
+        row = vectorizer.transform([doc]).toarray()[0]
+        expected = {term: row[index] for term, index in vectorizer.vocabulary_.items() if row[index] > 0}
+        self.assertEqual(dict(zip(terms, scores)).keys(), expected.keys())
+        for term, score in zip(terms, scores):
+            self.assertAlmostEqual(score, expected[term])
+
+    def test_unseen_terms_are_kept(self):
+        """Test that terms outside the vocabulary get the highest IDF instead of being dropped"""
+        self.fit()
+        self.assertEqual(extract_keywords('Zebras. The market opened.', top_k=1), ['zebras'])
+
+    def test_top_k_and_ties(self):
+        """Test the top-k selection order and bounds"""
+        from .keyword_model import KeywordModel
+        import numpy as np
+        model = KeywordModel({'b': 0, 'a': 1, 'c': 2}, np.array([1.0, 1.0, 2.0]), 3)
+        self.assertEqual(model.top_terms(['a', 'b', 'c'], 2), ['c', 'a'])
+        self.assertEqual(model.top_terms(['a', 'b'], 10), ['a', 'b'])
+        self.assertEqual(model.top_terms(['a'], 0), [])
+
+    def test_command_errors(self):
+        """Test that an existing version or a bad corpus is reported"""
+        self.fit()
+        with self.assertRaises(CommandError):
+            self.fit()
+        bad = Path(self.artifact_dir.name) / 'bad.jsonl'
+        bad.write_text('not json\n')
+        with self.assertRaises(CommandError):
+            call_command('fit_keyword_model', corpus=str(bad), stdout=StringIO())
+
+    def test_model_version_in_cache_key(self):
+        """Test that the keyword model version is part of the keywords cache key"""
+        from .utils import model_version
+        self.assertIsNone(model_version('keywords'))
+        self.fit()
+        self.assertEqual(model_version('keywords'), 'v1')
+
+
+class BatchSentimentEngineTestCase(TestCase):
+    """Test cases for the batch VADER engine"""
+
+    texts = [
+        'I love this phone!!! The screen is AMAZING, but the battery is not great.',
+        'The service was kind of slow and the food was barely edible.',
+        'Never so happy with a purchase. Absolutely wonderful :)',
+        "It isn't bad at all, at least not the worst I have seen?? Really??",
+        'This product is the shit. Yeah right, cut the mustard it did not.',
+        'The package arrived on Tuesday.',
+        'GOOD quality, VERY good price, would not buy again though...',
+        'Least helpful support ever, very least effort.',
+        '',
+        '!!',
+        'sort of nice, kinda meh, the bomb honestly - totally fine',
+    ]
+
+    def setUp(self):
+        from .sentiment_engine import BatchSentimentEngine
+        from .utils import _vader_analyzer
+        self.analyzer = _vader_analyzer
+        self.engine = BatchSentimentEngine(_vader_analyzer)
+
+    def assertScoresClose(self, scores, expected):
+        self.assertEqual(scores.keys(), expected.keys())
+        for key in expected:
+            self.assertAlmostEqual(scores[key], expected[key], places=3)
+
+    def test_matches_vader(self):
+        """Test that every rule gives VADER's scores"""
+        for text in self.texts:
+            with self.subTest(text=text):
+                self.assertScoresClose(self.engine.polarity_scores(text), self.analyzer.polarity_scores(text))
+
+    def test_matches_vader_on_generated_texts(self):
+        """Test agreement on random mixes of lexicon words, boosters, negations and punctuation"""
+        import random
+        constants = self.analyzer.constants
+        rng = random.Random(7)
+        vocabulary = (
+            rng.sample(sorted(self.analyzer.lexicon), 300) + sorted(constants.BOOSTER_DICT)
+            + sorted(constants.NEGATE) + ' '.join(constants.SPECIAL_CASE_IDIOMS).split()
+            + ['but', 'least', 'at', 'very', 'never', 'so', 'this', 'kind', 'of', 'the', 'a', 'cat', ':)']
+        )
+        punctuation = ['', '', ',', '.', '!', '?', '!!', "'", '(', '?!?']
+        for _ in range(2000):
+            words = []
+            for _ in range(rng.randint(0, 25)):
+                word = rng.choice(vocabulary)
+                if rng.random() < 0.1:
+                    word = word.upper()
+                mark = rng.choice(punctuation)
+                words.append(mark + word if rng.random() < 0.3 else word + mark)
+            text = ' '.join(words)
+            self.assertScoresClose(self.engine.polarity_scores(text), self.analyzer.polarity_scores(text))
+
+    def test_sentiment_batch_matches_single(self):
+        """Test that batch payloads equal analyze_sentiment, labels included"""
+        from .utils import sentiment_results
+        texts = [text for text in self.texts if text] * 2
+        results = sentiment_results(texts)
+        for text, result in zip(texts, results):
+            expected = analyze_sentiment(text)
+            self.assertEqual(result['label'], expected['label'])
+            self.assertScoresClose(result['scores'], expected['scores'])
+
+    def test_run_batch_uses_engine(self):
+        """Test that the sentiment batch endpoint path does not call polarity_scores per text"""
+        with mock.patch.object(self.analyzer, 'polarity_scores') as polarity_scores:
+            results = run_batch('sentiment', ['I love it!', 'I hate it!'])
+        polarity_scores.assert_not_called()
+        self.assertEqual([result['label'] for result in results], ['positive', 'negative'])
+
+    @override_settings(SUMMAREASE_PARALLEL_THRESHOLD=1, SUMMAREASE_POOL_WORKERS=2)
+    def test_parallel_batch_matches_serial(self):
+        """Test that a large batch scored on the pool gives the serial results"""
+        from .pool import shutdown_executor
+        from .utils import sentiment_results
+        self.addCleanup(shutdown_executor)
+        texts = [text for text in self.texts if text] * 3
+        parallel = sentiment_results(texts)
+        with self.settings(SUMMAREASE_PARALLEL_THRESHOLD=None):
+            self.assertEqual(parallel, sentiment_results(texts))
+
+
+class SentenceSentimentTestCase(APITestCase):
+    """Test cases for per-sentence sentiment streamed as NDJSON"""
+
+    text = 'I love this product!  The delivery was terribly slow. It arrived on Monday.'
+
+    def read_lines(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.endswith('\n'))
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_sentence_sentiments(self):
+        """Test offsets, labels and scores of each sentence"""
+        from .utils import sentence_sentiments
+        results = list(sentence_sentiments(self.text))
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertEqual([result['label'] for result in results], ['positive', 'negative', 'neutral'])
+        for result in results:
+            sentence = self.text[result['start']:result['end']]
+            self.assertEqual(result['scores'], analyze_sentiment(sentence)['scores'])
+        self.assertEqual(self.text[results[1]['start']:results[1]['end']], 'The delivery was terribly slow.')
+
+    def test_streaming_endpoint(self):
+        """Test that mode=sentences streams one JSON object per line"""
+        response = self.client.post(reverse('sentiment'), {'text': self.text, 'mode': 'sentences'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        from .utils import sentence_sentiments
+        self.assertEqual(self.read_lines(response), list(sentence_sentiments(self.text)))
+
+    def test_mode_in_query_string_and_default(self):
+        """Test the query string mode and the unchanged document mode"""
+        url = reverse('sentiment') + '?mode=sentences'
+        response = self.client.post(url, {'text': self.text}, format='json')
+        self.assertEqual(len(self.read_lines(response)), 3)
+        response = self.client.post(reverse('sentiment'), {'text': self.text}, format='json')
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.data, analyze_sentiment(self.text))
+
+    def test_invalid_mode(self):
+        """Test that an unknown mode is rejected"""
+        response = self.client.post(reverse('sentiment'), {'text': self.text, 'mode': 'words'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'mode must be one of: document, sentences')
+
+    @override_settings(SUMMAREASE_POOL_WORKERS=0)
+    async def test_async_streaming(self):
+        """Test that the async view streams the same lines"""
+        from . import async_views
+        from .utils import sentence_sentiments
+        request = RequestFactory().post(
+            '/api/sentiment/', data=json.dumps({'text': self.text, 'mode': 'sentences'}),
+            content_type='application/json')
+        response = await async_views.sentiment_view(request)
+        self.assertTrue(response.is_async)
+        lines = [json.loads(line) async for line in response.streaming_content]
+        self.assertEqual(lines, list(sentence_sentiments(self.text)))
+
+
+class BenchmarkTestCase(TestCase):
+    """Test cases for the benchmark suite and its baseline comparison"""
+
+    def run_benchmark(self, *args, **options):
+        stdout = StringIO()
+        call_command(
+            'benchmark', *args, functions='summarize_text,analyze_sentiment', sizes='paragraph',
+            repeat=2, warmup=0, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_corpora(self):
+        """Test that corpora are deterministic and about the requested size"""
+        from .benchmarks import make_corpora, synthetic_text
+        self.assertEqual(synthetic_text(500), synthetic_text(500))
+        texts = make_corpora(sizes=('paragraph',))
+        self.assertEqual(set(texts), {('synthetic', 'paragraph'), ('sample', 'paragraph')})
+        self.assertEqual(len(texts['sample', 'paragraph'].split()), 120)
+        self.assertLess(abs(len(texts['synthetic', 'paragraph'].split()) - 120), 25)
+
+    def test_baseline_and_compare(self):
+        """Test writing a baseline and flagging regressions against it"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'baseline.json'
+            output = self.run_benchmark(output=str(path))
+            self.assertIn('summarize_text/synthetic/paragraph', output)
+            baseline = json.loads(path.read_text())
+            self.assertEqual(len(baseline['results']), 4)
+            self.assertEqual(
+                set(baseline['results']['analyze_sentiment/sample/paragraph']),
+                {'words', 'repeat', 'mean_ms', 'p95_ms', 'peak_kib'})
+
+            # A baseline ten times faster than anything measurable is always a regression
+            for result in baseline['results'].values():
+                result['mean_ms'] = result['mean_ms'] / 10
+            path.write_text(json.dumps(baseline))
+            with self.assertRaisesMessage(CommandError, 'regression'):
+                self.run_benchmark(compare=str(path), threshold=0.5)
+
+    def test_compare(self):
+        """Test the regression check itself"""
+        from .benchmarks import compare
+        baseline = {'format': 1, 'results': {'f/s/p': {'mean_ms': 10.0, 'p95_ms': 12.0, 'peak_kib': 100.0}}}
+        current = {'format': 1, 'results': {
+            'f/s/p': {'mean_ms': 11.0, 'p95_ms': 20.0, 'peak_kib': 90.0},
+            'new/s/p': {'mean_ms': 1.0, 'p95_ms': 1.0, 'peak_kib': 1.0},
+        }}
+        self.assertEqual(compare(current, baseline, threshold=0.2), [('f/s/p', 'p95_ms', 12.0, 20.0, 8.0 / 12.0)])
+        with self.assertRaises(ValueError):
+            compare(current, {'format': 99, 'results': {}})
+
+    def test_tokenizer_backend(self):
+        """Test that the tokenizer backend is passed to the timed functions, not set in the settings"""
+        from . import utils
+        from .benchmarks import run_benchmarks
+        regex = utils.TOKENIZERS['regex']
+        texts = {('synthetic', 'paragraph'): 'Dr. Smith arrived. He was late.'}
+        with mock.patch.object(regex, 'sentences', wraps=regex.sentences) as sentences:
+            results = run_benchmarks(('summarize_text',), texts, repeat=1, warmup=0, tokenizer='regex')
+        self.assertEqual(results['environment']['tokenizer'], 'regex')
+        # One timed call and one under tracemalloc
+        self.assertEqual(sentences.call_count, 2)
+        self.assertEqual(utils.get_tokenizer().name, 'nltk')
+
+    def test_unknown_function(self):
+        """Test that an unknown function name is rejected"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark', functions='nope', stdout=StringIO())
+
+
+class MetricsTestCase(APITestCase):
+    """Test cases for per-stage timings, Server-Timing and the metrics endpoint"""
+
+    text = 'Stock markets are volatile. Investors worry about markets. The weather is nice.'
+
+    def setUp(self):
+        from .metrics import stage_seconds
+        stage_seconds.clear()
+        self.addCleanup(stage_seconds.clear)
+
+    def stages(self, response):
+        header = response['Server-Timing']
+        return {part.split(';')[0]: float(part.split('dur=')[1]) for part in header.split(', ')}
+
+    def test_disabled_by_default(self):
+        """Test that no header is added and stage() is a no-op when metrics are off"""
+        from .metrics import stage, stage_seconds, timing_active
+        response = self.client.post(reverse('summarize'), {'text': self.text}, format='json')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(stage_seconds.series(), [])
+        self.assertFalse(timing_active())
+        self.assertIs(stage('x'), stage('y'))
+
+    @override_settings(SUMMAREASE_METRICS=True)
+    def test_server_timing_stages(self):
+        """Test that summary and classification requests report their stages"""
+        response = self.client.post(reverse('summarize'), {'text': self.text}, format='json')
+        stages = self.stages(response)
+        for name in ('parse', 'sentence_tokenize', 'word_tokenize', 'scoring', 'total'):
+            self.assertIn(name, stages)
+        self.assertGreaterEqual(stages['total'], stages['word_tokenize'])
+
+        response = self.client.post(reverse('classify'), {'text': self.text}, format='json')
+        self.assertEqual(response.data, classification_result(self.text))
+        self.assertIn('vectorize', self.stages(response))
+        self.assertIn('inference', self.stages(response))
+
+    @override_settings(SUMMAREASE_METRICS=True)
+    def test_prometheus_histograms(self):
+        """Test the histogram series per endpoint, stage and size bucket"""
+        self.client.post(reverse('sentiment'), {'text': self.text}, format='json')
+        self.client.post(reverse('sentiment'), {'text': self.text * 200}, format='json')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE summarease_stage_seconds histogram', body)
+        self.assertIn('summarease_stage_seconds_count{endpoint="sentiment",stage="sentiment",size="1KB"} 1', body)
+        self.assertIn('summarease_stage_seconds_count{endpoint="sentiment",stage="total",size="100KB"} 1', body)
+        self.assertIn('summarease_stage_seconds_bucket{endpoint="sentiment",stage="total",size="1KB",le="+Inf"} 1', body)
+        self.assertNotIn('endpoint="metrics"', body)
+
+    @override_settings(SUMMAREASE_METRICS=True)
+    def test_streaming_responses(self):
+        """Test that a streamed body is timed until its last chunk, without a Server-Timing header"""
+        import time
+        from .metrics import stage, stage_seconds
+
+        def slow_sentiments(text):
+            for index in range(3):
+                with stage('sentiment'):
+                    time.sleep(0.02)
+                yield {'index': index}
+
+        with mock.patch('summarizer.views.sentence_sentiments', slow_sentiments):
+            response = self.client.post(reverse('sentiment'), {'text': self.text, 'mode': 'sentences'}, format='json')
+            self.assertNotIn('Server-Timing', response)
+            self.assertEqual(stage_seconds.series(), [])
+            self.assertEqual(len(list(response.streaming_content)), 3)
+        recorded = {labels[1]: (total, count) for labels, _, total, count in stage_seconds.series()}
+        self.assertEqual(recorded['sentiment'][1], 1)
+        self.assertGreaterEqual(recorded['sentiment'][0], 0.06)
+        self.assertGreaterEqual(recorded['total'][0], recorded['sentiment'][0])
+
+    @override_settings(SUMMAREASE_METRICS=True)
+    async def test_async_streaming_responses(self):
+        """Test that an async streamed body is timed until its last chunk"""
+        import asyncio
+        from django.http import StreamingHttpResponse
+        from django.urls import resolve
+        from .metrics import TimingMiddleware, stage, stage_seconds
+
+        async def lines():
+            for line in (b'a', b'b'):
+                with stage('sentiment'):
+                    await asyncio.sleep(0.02)
+                yield line
+
+        async def view(request):
+            return StreamingHttpResponse(lines())
+
+        request = RequestFactory().post(reverse('sentiment'))
+        request.resolver_match = resolve(reverse('sentiment'))
+        response = await TimingMiddleware(view)(request)
+        self.assertEqual(stage_seconds.series(), [])
+        self.assertEqual([line async for line in response.streaming_content], [b'a', b'b'])
+        recorded = {labels[1]: total for labels, _, total, _ in stage_seconds.series()}
+        self.assertGreaterEqual(recorded['sentiment'], 0.04)
+        self.assertGreaterEqual(recorded['total'], recorded['sentiment'])
+
+    @override_settings(SUMMAREASE_METRICS=True, SUMMAREASE_RESULT_CACHE={'ENABLED': True})
+    def test_cache_counters(self):
+        """Test that the result cache counters are exported"""
+        self.client.post(reverse('keywords'), {'text': self.text}, format='json')
+        self.client.post(reverse('keywords'), {'text': self.text}, format='json')
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('summarease_result_cache_hits_total 1', body)
+        self.assertIn('summarease_result_cache_misses_total 1', body)
+
+    def test_histogram_buckets(self):
+        """Test cumulative bucket counts and size buckets"""
+        from .metrics import Histogram, size_bucket
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(('a',), value)
+        self.assertEqual(histogram.series(), [(('a',), [1, 3], 6.05, 4)])
+        self.assertEqual([size_bucket(size) for size in (0, 1000, 1001, 2_000_000)], ['1KB', '1KB', '10KB', 'inf'])
+
+
+class LatencyBudgetTestCase(APITestCase):
+    """Test cases for approximate analysis of texts over the latency budget"""
+
+    def setUp(self):
+        # 40 distinct sentences of about 60 characters each
+        self.text = ' '.join(
+            f'Sentence number {i} talks about {topic} and more {topic}.'
+            for i, topic in enumerate(['markets', 'doctors', 'students', 'networks'] * 10)
+        )
+
+    def test_small_text_is_exact(self):
+        """Test that texts within the budget are analyzed exactly"""
+        result = summary_result(self.text, max_sentences=2, budget_ms=1000)
+        self.assertEqual(result['summary'], summarize_text(self.text, 2))
+        self.assertFalse(result['approximate'])
+        self.assertEqual(result['strategy'], 'exact')
+
+    @override_settings(SUMMAREASE_BUDGET={'CHARS_PER_MS': 1, 'SECTION_CHARS': 200})
+    def test_sample_strategy(self):
+        """Test that sampled sections cover the whole text in whole sentences"""
+        from .utils import approximate_text
+        sample, strategy = approximate_text(self.text, 600)
+        self.assertEqual(strategy, 'sample')
+        self.assertLessEqual(len(sample), 600 + 10)
+        sentences = tokenizer.tokenize(sample)
+        self.assertTrue(all(sentence in self.text for sentence in sentences))
+        # Sections are spread over the text, up to its last sentence
+        self.assertIn(tokenizer.tokenize(self.text)[-1], sentences)
+        self.assertIn('Sentence number 0 ', sample)
+
+    @override_settings(SUMMAREASE_BUDGET={'CHARS_PER_MS': 1, 'STRATEGY': 'leading'})
+    def test_leading_strategy(self):
+        """Test that the leading strategy keeps the beginning, cut at a sentence boundary"""
+        from .utils import approximate_text
+        sample, strategy = approximate_text(self.text, 300)
+        self.assertEqual(strategy, 'leading')
+        self.assertTrue(self.text.startswith(sample))
+        self.assertTrue(sample.endswith('.'))
+        self.assertLessEqual(len(sample), 300)
+
+    @override_settings(SUMMAREASE_BUDGET={'CHARS_PER_MS': 1, 'DEFAULT_MS': 500, 'MAX_MS': 1000})
+    def test_api_reports_approximation(self):
+        """Test that summary and keyword responses say when and how they were approximated"""
+        summary = self.client.post(reverse('summarize'), {'text': self.text}, format='json')
+        self.assertEqual(summary.status_code, status.HTTP_200_OK)
+        self.assertTrue(summary.data['approximate'])
+        self.assertEqual(summary.data['strategy'], 'sample')
+        self.assertTrue(all(sentence in self.text for sentence in tokenizer.tokenize(summary.data['summary'])))
+
+        # Budgets above MAX_MS are capped, so the text is still sampled
+        keywords = self.client.post(reverse('keywords') + '?budget_ms=100000', {'text': self.text}, format='json')
+        self.assertTrue(keywords.data['approximate'])
+        self.assertTrue(keywords.data['keywords'])
+
+        combined = self.client.post(reverse('analyze'), {
+            'text': self.text, 'analyses': ['summary', 'classification'],
+        }, format='json')
+        self.assertTrue(combined.data['summary']['approximate'])
+        self.assertEqual(combined.data['classification'], classification_result(self.text))
+
+    @override_settings(SUMMAREASE_BUDGET={'DEFAULT_MS': None, 'MAX_MS': None, 'CHARS_PER_MS': 1})
+    def test_unbounded_budget(self):
+        """Test that without a default budget the analysis is exact unless a budget is requested"""
+        exact = self.client.post(reverse('summarize'), {'text': self.text}, format='json')
+        self.assertFalse(exact.data['approximate'])
+        budgeted = self.client.post(reverse('summarize'), {'text': self.text, 'budget_ms': 500}, format='json')
+        self.assertTrue(budgeted.data['approximate'])
+
+    @override_settings(SUMMAREASE_BUDGET={'CHARS_PER_MS': 1, 'DEFAULT_MS': 500, 'MAX_MS': 1000})
+    def test_explicit_budget(self):
+        """Test that a budget passed to run_analyses replaces the default and is not capped"""
+        from .utils import run_analyses
+        self.assertTrue(run_analyses(self.text, ('summary',))['summary']['approximate'])
+        exact = run_analyses(self.text, ('summary', 'keywords'), budget_ms=None)
+        self.assertFalse(exact['summary']['approximate'])
+        self.assertFalse(exact['keywords']['approximate'])
+        self.assertFalse(run_analyses(self.text, ('summary',), budget_ms=len(self.text))['summary']['approximate'])
+        budgeted = run_analyses(self.text, ('summary',), {'summary': {'budget_ms': 500}}, budget_ms=None)
+        self.assertTrue(budgeted['summary']['approximate'])
+
+    def test_invalid_budget(self):
+        """Test that a non-positive budget is rejected"""
+        for budget in (-5, 'soon'):
+            response = self.client.post(reverse('summarize'), {'text': self.text, 'budget_ms': budget}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('keywords'), {'text': self.text, 'budget_ms': -1}, format='json')
+        self.assertEqual(response.data, {'error': 'budget_ms must be a positive integer'})
+
+    @override_settings(SUMMAREASE_BUDGET={'CHARS_PER_MS': 1, 'STRATEGY': 'random'})
+    def test_unknown_strategy(self):
+        """Test that a misconfigured strategy is reported"""
+        with self.assertRaises(ImproperlyConfigured):
+            summary_result(self.text, budget_ms=100)
+
+
+class TokenizerBackendTestCase(TestCase):
+    """Test cases for the pluggable tokenizer backends"""
+
+    def setUp(self):
+        from .benchmarks import sample_text, synthetic_text
+        self.texts = [sample_text(3000), synthetic_text(3000), synthetic_text(800, seed=7)]
+
+    def test_regex_words(self):
+        """Test that the regex backend extracts lowercased word runs"""
+        from .utils import TOKENIZERS
+        words = TOKENIZERS['regex'].words("The well-known shop doesn't open, 24/7!")
+        self.assertEqual(words, ['the', 'well', 'known', 'shop', 'doesn', 't', 'open', '24', '7'])
+
+    def test_regex_sentences(self):
+        """Test sentence ends, ellipses, initials, abbreviations and offsets"""
+        from .utils import RegexTokenizer
+        backend = RegexTokenizer({'dr'})
+        text = '  He met Dr. Jones... at noon.  "Really?" J. Smith asked! End'
+        spans = list(backend.span_tokenize(text))
+        self.assertEqual([text[start:end] for start, end in spans],
+                         ['He met Dr. Jones... at noon.', '"Really?"', 'J. Smith asked!', 'End'])
+        self.assertEqual(backend.sentences(text), [text[start:end] for start, end in spans])
+        self.assertEqual(backend.sentences('   '), [])
+
+    def test_punkt_abbreviations(self):
+        """Test that punkt still exposes the abbreviations the regex backend relies on"""
+        from .utils import FALLBACK_ABBREVIATIONS, TOKENIZERS, punkt_abbreviations
+        # If NLTK renames this private attribute the regex backend silently falls back to a short list
+        self.assertTrue(hasattr(tokenizer, '_params'), 'punkt model has no _params')
+        self.assertTrue(hasattr(tokenizer._params, 'abbrev_types'), 'punkt parameters have no abbrev_types')
+        self.assertEqual(punkt_abbreviations(), frozenset(tokenizer._params.abbrev_types))
+        self.assertEqual(TOKENIZERS['regex'].abbreviations, punkt_abbreviations())
+        self.assertEqual(punkt_abbreviations(object()), FALLBACK_ABBREVIATIONS)
+
+    def test_sentence_parity_with_punkt(self):
+        """Test that the regex sentence splitter agrees with punkt on the benchmark corpora"""
+        from .utils import TOKENIZERS
+        for text in self.texts:
+            self.assertEqual(list(TOKENIZERS['regex'].span_tokenize(text)), list(tokenizer.span_tokenize(text)))
+
+    def test_summary_parity(self):
+        """Test how far summaries of the two backends differ"""
+        from .benchmarks import summary_overlap, tokenizer_parity
+        parity = tokenizer_parity(self.texts, max_sentences=3)
+        self.assertEqual(parity['texts'], 3)
+        self.assertGreaterEqual(parity['mean_overlap'], 0.9)
+        self.assertGreaterEqual(parity['min_overlap'], 0.5)
+        self.assertEqual(summary_overlap('One here. Two here.', 'Two here. Three here.'), 1 / 3)
+
+    @override_settings(SUMMAREASE_TOKENIZER='regex')
+    def test_setting_selects_backend(self):
+        """Test that the regex backend replaces word_tokenize everywhere"""
+        text = self.texts[0]
+        with mock.patch('summarizer.utils.word_tokenize') as tokenize:
+            summary = summarize_text(text, 2)
+            self.assertEqual(summarize_stream(io.StringIO(text), 2), summary)
+            self.assertTrue(extract_keywords(text))
+        tokenize.assert_not_called()
+
+    def test_cache_key_includes_backend(self):
+        """Test that results of different backends never share a cache entry"""
+        from .utils import model_version
+        self.assertIsNone(model_version('summary'))
+        with override_settings(SUMMAREASE_TOKENIZER='regex'):
+            self.assertEqual(model_version('summary'), '+regex')
+            self.assertIsNone(model_version('sentiment'))
+
+    @override_settings(SUMMAREASE_TOKENIZER='spacy')
+    def test_unknown_backend(self):
+        """Test that an unknown backend is reported"""
+        with self.assertRaises(ImproperlyConfigured):
+            summarize_text('Some text here.')
+
+
+class ClassifierRegistryTestCase(APITestCase):
+    """Test cases for versioned classifier reloads"""
+
+    def setUp(self):
+        from .text_classifier_model import save_classifier, train_classifier
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        save_classifier(train_classifier(), self.directory.name, version='v1')
+        settings_override = override_settings(CLASSIFIER_ARTIFACT_DIR=Path(self.directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def add_version(self, version):
+        # A model that always answers 'Sports'
+        from .text_classifier_model import save_classifier, train_classifier
+        classifier = train_classifier(['Football and tennis', 'Goals and matches'], ['Sports', 'Sports'])
+        save_classifier(classifier, self.directory.name, version=version)
+
+    def test_reload_swaps_atomically(self):
+        """Test that a reload serves the new version while old snapshots keep the old model"""
+        from .text_classifier_model import get_active_classifier, reload_classifier
+        old_version, old_classifier = get_active_classifier()
+        self.assertEqual(old_version, 'v1')
+        self.add_version('v2')
+        # Nothing changes until a reload
+        self.assertEqual(get_active_classifier()[0], 'v1')
+        self.assertEqual(reload_classifier(), ('v1', 'v2'))
+        self.assertEqual(get_active_classifier()[0], 'v2')
+        self.assertEqual(classification_result('Doctors and nurses')['category'], 'Sports')
+        # A request holding the old pair finishes on the old model
+        self.assertEqual(old_classifier.predict(['Doctors and nurses in hospitals'])[0], 'Healthcare')
+
+    def test_active_file_pins_version(self):
+        """Test that the ACTIVE file selects the version reloads switch to"""
+        from .text_classifier_model import read_active_version, reload_classifier, write_active_version
+        self.add_version('v2')
+        write_active_version('v1')
+        self.assertEqual(read_active_version(), 'v1')
+        self.assertEqual(reload_classifier()[1], 'v1')
+        write_active_version(None)
+        self.assertEqual(reload_classifier()[1], 'v2')
+        with self.assertRaises(ImproperlyConfigured):
+            write_active_version('v9')
+
+    def test_failed_reload_keeps_serving(self):
+        """Test that a broken artifact leaves the served model in place"""
+        from .text_classifier_model import get_active_classifier, reload_classifier
+        get_active_classifier()
+        self.add_version('v2')
+        (Path(self.directory.name) / 'v2' / 'classifier.joblib').write_bytes(b'broken')
+        with self.assertRaises(Exception):
+            reload_classifier()
+        self.assertEqual(get_active_classifier()[0], 'v1')
+
+    def test_signal_triggers_reload(self):
+        """Test that the reload signal swaps the model"""
+        import signal
+        import time
+        from .text_classifier_model import get_active_classifier, install_reload_signal
+        get_active_classifier()
+        self.add_version('v2')
+        previous = signal.getsignal(signal.SIGHUP)
+        self.addCleanup(signal.signal, signal.SIGHUP, previous)
+        self.assertEqual(install_reload_signal(), 'SIGHUP')
+        os.kill(os.getpid(), signal.SIGHUP)
+        deadline = time.monotonic() + 10
+        while get_active_classifier()[0] != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(get_active_classifier()[0], 'v2')
+        with override_settings(CLASSIFIER_RELOAD_SIGNAL=None):
+            self.assertIsNone(install_reload_signal())
+
+    def test_version_in_responses_and_metrics(self):
+        """Test that classification responses and metrics report the served version"""
+        response = self.client.post(reverse('classify'), {'text': 'Stock markets'}, format='json')
+        self.assertEqual(response.data['model_version'], 'v1')
+        batch = self.client.post(reverse('classify-batch'), {'texts': ['Stock markets', 'AI']}, format='json')
+        self.assertEqual([item['model_version'] for item in batch.data['results']], ['v1', 'v1'])
+        metrics = self.client.get(reverse('metrics'))
+        self.assertIn('summarease_model_info{model="classifier",version="v1"} 1', metrics.content.decode())
+
+    def test_admin_endpoint(self):
+        """Test that staff can list and switch versions; others cannot"""
+        from django.contrib.auth.models import User
+        url = reverse('classifier-model')
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(url).data['active_version'], 'v1')
+        self.add_version('v2')
+        listing = self.client.get(url)
+        self.assertEqual(listing.data, {'active_version': 'v1', 'pinned_version': None, 'versions': ['v1', 'v2']})
+
+        switched = self.client.post(url, {}, format='json')
+        self.assertEqual(switched.data['previous_version'], 'v1')
+        self.assertEqual(switched.data['active_version'], 'v2')
+        pinned = self.client.post(url, {'version': 'v1'}, format='json')
+        self.assertEqual((pinned.data['active_version'], pinned.data['pinned_version']), ('v1', 'v1'))
+        missing = self.client.post(url, {'version': 'v7'}, format='json')
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url).data['active_version'], 'v1')
+
+
+class PreloadedServingTestCase(TestCase):
+    """Test cases for the preloaded serving mode and the memory report"""
+
+    def test_freeze(self):
+        """Test that freezing exempts the preloaded objects from the cyclic GC"""
+        import gc
+        from .serving import freeze, preload
+        preload()
+        self.addCleanup(gc.unfreeze)
+        self.assertGreater(freeze(), 0)
+        self.assertEqual(gc.get_freeze_count(), freeze())
+
+    def test_gunicorn_config(self):
+        """Test that the gunicorn config preloads the app and freezes before fork"""
+        import gc
+        import runpy
+        config = runpy.run_path(str(Path(__file__).resolve().parent.parent / 'gunicorn.conf.py'))
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['wsgi_app'], 'summarease_project.wsgi:application')
+        self.addCleanup(gc.unfreeze)
+        self.addCleanup(gc.enable)
+        config['on_starting'](None)
+        self.assertFalse(gc.isenabled())
+        config['pre_fork'](None, None)
+        self.assertGreater(gc.get_freeze_count(), 0)
+        config['post_fork'](None, None)
+        self.assertTrue(gc.isenabled())
+
+    def test_memory_report_of_forked_worker(self):
+        """Test unique and shared memory of a master and a forked child"""
+        import signal
+        from .serving import memory_report
+        child = os.fork()
+        if child == 0:
+            signal.pause()
+            os._exit(0)
+        try:
+            report = memory_report(os.getpid())
+        finally:
+            os.kill(child, signal.SIGKILL)
+            os.waitpid(child, 0)
+        processes = {process['pid']: process for process in report['processes']}
+        master, worker = processes[os.getpid()], processes[child]
+        self.assertEqual((master['role'], worker['role']), ('master', 'worker'))
+        for process in (master, worker):
+            self.assertGreater(process['rss'], 0)
+            self.assertGreater(process['unique'], 0)
+            self.assertLessEqual(process['pss'], process['rss'])
+        # The child has barely written anything since the fork: most of it is shared
+        self.assertGreater(worker['shared'], worker['unique'])
+        self.assertGreater(report['worker_unique_mean'], 0)
+
+    def test_memory_report_command(self):
+        """Test the report command's table and JSON output"""
+        out = StringIO()
+        call_command('memory_report', os.getpid(), stdout=out)
+        self.assertIn('master', out.getvalue())
+        self.assertIn('Total PSS', out.getvalue())
+        out = StringIO()
+        call_command('memory_report', os.getpid(), json=True, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['processes'][0]['pid'], os.getpid())
+        with self.assertRaises(CommandError):
+            call_command('memory_report', 2 ** 22 + 1, stdout=StringIO())
+
+
+class AnalysisJobTestCase(APITestCase):
+    """Test cases for the background job API and its workers"""
+
+    text = 'Stock markets are volatile. Investors are nervous about markets. The weather is mild.'
+
+    def submit(self, **data):
+        return self.client.post(reverse('jobs'), {'text': self.text, **data}, format='json')
+
+    def test_submit_and_poll(self):
+        """Test that a submitted job is queued, run by a worker and its result polled"""
+        from .jobs import claim_job, run_job
+        response = self.submit(analyses=['summary', 'sentiment'], options={'summary': {'max_sentences': 1}})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['status'], response.data['priority']), ('queued', 'normal'))
+        url = response['Location']
+        self.assertEqual(url, reverse('job-detail', args=[response.data['id']]))
+        self.assertEqual(self.client.get(url).data['status'], 'queued')
+
+        job = claim_job('test-worker')
+        self.assertEqual(str(job.id), response.data['id'])
+        self.assertEqual(self.client.get(url).data['status'], 'running')
+        self.assertEqual(run_job(job), 'succeeded')
+
+        result = self.client.get(url).data
+        self.assertEqual(result['status'], 'succeeded')
+        expected = run_analyses(self.text, ['summary', 'sentiment'], {'summary': {'max_sentences': 1}})
+        self.assertEqual(result['result'], expected)
+        self.assertIsNotNone(result['expires_at'])
+
+    def test_invalid_submissions(self):
+        """Test that bad jobs are rejected up front"""
+        self.assertEqual(self.submit(priority='urgent').data, {'error': 'priority must be one of: low, normal, high'})
+        self.assertEqual(self.client.post(reverse('jobs'), {}, format='json').status_code, 400)
+        self.assertEqual(self.submit(analyses=['translate']).status_code, 400)
+        self.assertEqual(self.client.get(reverse('job-detail', args=[uuid.uuid4()])).status_code, 404)
+        job_id = self.submit().data['id']
+        self.assertEqual(self.client.get(reverse('job-detail', args=[job_id]), {'wait': -1}).status_code, 400)
+
+    def test_claim_order_and_filters(self):
+        """Test that workers take jobs by priority then age, within their filters"""
+        from .jobs import claim_job, submit_job
+        low = submit_job('Low priority text.', ['sentiment'], priority=AnalysisJob.Priority.LOW)
+        first = submit_job('First normal text.', ['sentiment'])
+        second = submit_job('Second normal text.', ['sentiment'])
+        large = submit_job('Large text. ' * 100, ['sentiment'], priority=AnalysisJob.Priority.HIGH)
+        self.assertEqual(claim_job('interactive', max_size=100).id, first.id)
+        self.assertIsNone(claim_job('interactive', max_size=100, min_priority=AnalysisJob.Priority.HIGH))
+        self.assertEqual(claim_job('heavy', min_size=1000).id, large.id)
+        self.assertEqual(claim_job('any').id, second.id)
+        self.assertEqual(claim_job('any').id, low.id)
+        self.assertIsNone(claim_job('any'))
+        self.assertEqual(AnalysisJob.objects.get(id=large.id).worker, 'heavy')
+
+    def test_failed_job(self):
+        """Test that an analysis error fails the job with its message"""
+        from .jobs import claim_job, run_job, submit_job
+        job = submit_job(self.text, ['translate'])
+        self.assertEqual(run_job(claim_job('worker')), 'failed')
+        data = self.client.get(reverse('job-detail', args=[job.id])).data
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(data['error'], "'translate'")
+
+    def test_expiry_and_stale_jobs(self):
+        """Test that expired results disappear and stale jobs are requeued or failed"""
+        from django.utils import timezone
+        from .jobs import purge_expired, requeue_stale, submit_job
+        past = timezone.now() - timedelta(hours=2)
+        expired = submit_job(self.text, ['sentiment'])
+        AnalysisJob.objects.filter(id=expired.id).update(status='succeeded', result={}, expires_at=past)
+        self.assertEqual(self.client.get(reverse('job-detail', args=[expired.id])).status_code, 404)
+        self.assertEqual(purge_expired(), 1)
+
+        stale = submit_job(self.text, ['sentiment'])
+        exhausted = submit_job(self.text, ['sentiment'])
+        AnalysisJob.objects.filter(id=stale.id).update(status='running', started_at=past, attempts=1)
+        AnalysisJob.objects.filter(id=exhausted.id).update(status='running', started_at=past, attempts=3)
+        self.assertEqual(requeue_stale(), (1, 1))
+        self.assertEqual(AnalysisJob.objects.get(id=stale.id).status, 'queued')
+        self.assertEqual(AnalysisJob.objects.get(id=exhausted.id).status, 'failed')
+
+    @override_settings(SUMMAREASE_JOBS={'MAX_WAIT': 1, 'POLL_INTERVAL': 0.05})
+    def test_long_poll(self):
+        """Test that a long poll returns at once for finished jobs and at MAX_WAIT otherwise"""
+        import time
+        from .jobs import claim_job, run_job
+        url = self.submit()['Location']
+        started = time.monotonic()
+        self.assertEqual(self.client.get(url, {'wait': 60}).data['status'], 'queued')
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        run_job(claim_job('worker'))
+        started = time.monotonic()
+        self.assertEqual(self.client.get(url, {'wait': 60}).data['status'], 'succeeded')
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(SUMMAREASE_BUDGET={'CHARS_PER_MS': 1, 'DEFAULT_MS': 10})
+    def test_worker_command(self):
+        """Test that run_jobs drains the queue and analyzes long texts exactly"""
+        ids = [self.submit(analyses=['summary']).data['id'] for _ in range(3)]
+        # The API itself would approximate this text under the tiny budget
+        self.assertTrue(self.client.post(reverse('summarize'), {'text': self.text}, format='json').data['approximate'])
+        out = StringIO()
+        call_command('run_jobs', once=True, name='cmd', stdout=out)
+        self.assertEqual(out.getvalue().count('succeeded'), 3)
+        for job_id in ids:
+            job = AnalysisJob.objects.get(id=job_id)
+            self.assertEqual((job.status, job.worker), ('succeeded', 'cmd'))
+            self.assertFalse(job.result['summary']['approximate'])
+
+    async def test_async_views(self):
+        """Test the async submit and long-poll views"""
+        from . import async_views
+        factory = RequestFactory()
+        request = factory.post('/api/jobs/', data=json.dumps({'text': self.text, 'priority': 'high'}),
+                               content_type='application/json')
+        submitted = await async_views.job_submit_view(request)
+        self.assertEqual(submitted.status_code, 202)
+        job_id = json.loads(submitted.content)['id']
+        detail = await async_views.job_detail_view(factory.get(f'/api/jobs/{job_id}/'), job_id=job_id)
+        self.assertEqual(json.loads(detail.content)['priority'], 'high')
+        missing = await async_views.job_detail_view(factory.get('/api/jobs/x/'), job_id=uuid.uuid4())
+        self.assertEqual(missing.status_code, 404)
+
+
+class ThreadedJobWorkerTestCase(TransactionTestCase):
+    """Test cases for a job worker running several jobs at once"""
+
+    def test_concurrent_worker(self):
+        """Test that a worker with --concurrency runs every job once"""
+        from .jobs import submit_job
+        jobs = [submit_job(f'Text number {i}. It is short.', ['sentiment', 'keywords']) for i in range(6)]
+        out = StringIO()
+        call_command('run_jobs', once=True, concurrency=3, stdout=out)
+        self.assertEqual(AnalysisJob.objects.filter(status='succeeded').count(), 6)
+        self.assertEqual(out.getvalue().count('succeeded'), 6)
+        self.assertTrue(all(job.attempts == 1 for job in AnalysisJob.objects.filter(id__in=[j.id for j in jobs])))
+
+
+class SimilaritySearchTestCase(APITestCase):
+    """Test cases for the similar-document index and the /api/similar/ endpoint"""
+
+    corpus = [
+        'Stock markets fell sharply as investors sold shares. Traders expect volatile markets.',
+        'Investors bought shares after the stock markets recovered. Markets closed higher.',
+        'The football team won the championship match. Fans celebrated the team victory.',
+        'The team lost the football match in extra time. Fans of the team were upset.',
+        'Heavy rain and strong wind are forecast for the weekend weather.',
+    ]
+
+    def setUp(self):
+        self._index_dir = tempfile.TemporaryDirectory()
+        self._settings = override_settings(SIMILARITY_INDEX_DIR=Path(self._index_dir.name))
+        self._settings.enable()
+
+    def tearDown(self):
+        self._settings.disable()
+        self._index_dir.cleanup()
+
+    def brute_force(self, text, exclude=()):
+        import numpy as np
+        from .similarity import document_vector
+        query_ids, query_weights = document_vector(text)
+        query = dict(zip(query_ids.tolist(), query_weights.tolist()))
+        scores = []
+        for document in Document.objects.exclude(id__in=exclude):
+            ids, weights = document_vector(document.text)
+            score = sum(query.get(term, 0.0) * weight for term, weight in zip(ids.tolist(), weights.tolist()))
+            if score > 0:
+                scores.append((document.id, score))
+        return sorted(scores, key=lambda item: (-item[1], item[0]))
+
+    def test_search_matches_brute_force_across_segments(self):
+        """Test that incremental segments and merges give the exact cosine ranking"""
+        from .similarity import read_manifest, similar_documents, store_documents, update_index
+        store_documents(self.corpus[:3])
+        update_index()
+        store_documents(self.corpus[3:] + self.corpus[:1])  # the repeated text is not stored twice
+        manifest = update_index()
+        self.assertEqual((manifest['documents'], len(manifest['segments'])), (5, 2))
+
+        query = 'Football fans watched the team win the match.'
+        expected = self.brute_force(query)
+        found = similar_documents(query, top_k=3)
+        self.assertEqual([document_id for document_id, _ in found], [document_id for document_id, _ in expected[:3]])
+        for (_, score), (_, exact) in zip(found, expected):
+            self.assertAlmostEqual(score, exact, places=5)
+        first = Document.objects.get(text=self.corpus[0])
+        self.assertNotIn(first.id, [document_id for document_id, _ in similar_documents(self.corpus[0], 5, [first.id])])
+
+        merged = update_index(merge=True)
+        self.assertEqual((merged['documents'], len(merged['segments'])), (5, 1))
+        self.assertEqual(similar_documents(query, top_k=3), found)
+        # Replaced segments are deleted
+        self.assertEqual(sorted(p.name for p in Path(self._index_dir.name).glob('segment-*')), merged['segments'])
+        self.assertEqual(read_manifest()['segments'], merged['segments'])
+
+    def test_posting_limits(self):
+        """Test that the postings read per query term are capped by the settings"""
+        from .similarity import similar_documents, store_documents, update_index
+        store_documents(self.corpus)
+        update_index()
+        query = 'Markets.'
+        self.assertEqual(len(similar_documents(query, top_k=5)), 2)
+        with override_settings(SUMMAREASE_SIMILARITY={'MAX_POSTINGS': 1}):
+            self.assertEqual(len(similar_documents(query, top_k=5)), 1)
+        self.assertEqual(similar_documents('', top_k=5), [])
+        for max_terms in (0, -1):
+            with override_settings(SUMMAREASE_SIMILARITY={'MAX_QUERY_TERMS': max_terms}):
+                with self.assertRaises(ImproperlyConfigured):
+                    similar_documents(query, top_k=5)
+
+    def test_segment_scores_are_sparse(self):
+        """Test that a segment scores only the documents in the query's postings"""
+        import numpy as np
+        from .similarity import SimilarityIndex, document_vector, store_documents, update_index
+        store_documents(self.corpus)
+        update_index()
+        segment = SimilarityIndex().segments[0]
+        term_ids, weights = document_vector('Markets.')
+        rows, scores = segment.scores(term_ids, weights)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(np.all(np.diff(rows) > 0))
+        self.assertTrue(np.all(scores > 0))
+        self.assertEqual([len(part) for part in segment.scores(term_ids[:0], weights[:0])], [0, 0])
+
+    def test_similar_store_option(self):
+        """Test that store is parsed as a boolean, so "false" and 0 do not store the query"""
+        url = reverse('similar')
+        for value in ('false', 'False', '0', 0, False, 'off'):
+            response = self.client.post(url, {'text': self.corpus[0], 'store': value}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('document_id', response.data)
+        self.assertFalse(Document.objects.exists())
+        for value in ('true', '1', 1, True):
+            response = self.client.post(url, {'text': self.corpus[0], 'store': value}, format='json')
+            self.assertIn('document_id', response.data)
+        self.assertEqual(Document.objects.count(), 1)
+        response = self.client.post(url, {'text': self.corpus[0], 'store': 'maybe'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error': 'store must be a boolean'})
+
+    def test_similar_endpoint(self):
+        """Test querying by text and by stored document, storing queries and errors"""
+        url = reverse('similar')
+        response = self.client.post(url, {'text': self.corpus[2], 'store': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        stored_id = response.data['document_id']
+        for text in self.corpus:
+            self.client.post(url, {'text': text, 'store': True}, format='json')
+        out = StringIO()
+        call_command('update_similarity_index', stdout=out)
+        self.assertIn('Indexed 5 documents in 1 segment(s)', out.getvalue())
+
+        response = self.client.post(url, {'document_id': stored_id, 'top_k': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['indexed_documents'], 5)
+        results = response.data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['preview'], self.corpus[3])
+        self.assertNotIn(stored_id, [item['document_id'] for item in results])
+        # A stored text is not returned as similar to itself either
+        by_text = self.client.post(url, {'text': self.corpus[2], 'top_k': 2}, format='json').data['results']
+        self.assertEqual(by_text, results)
+
+        self.assertEqual(self.client.post(url, {'document_id': 999999}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(url, {}, format='json').data, {'error': 'Text or document_id is required'})
+        self.assertEqual(self.client.post(url, {'text': 'x', 'top_k': 0}, format='json').status_code, 400)
+
+    def test_similar_previews(self):
+        """Test that results carry the first characters of each text without loading whole documents"""
+        import re
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .similarity import store_documents, update_index
+        from .views import SIMILAR_PREVIEW_CHARS
+        long_text = 'Football fans cheered for the team again. ' * 100
+        store_documents([long_text])
+        update_index()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('similar'), {'text': self.corpus[2]}, format='json')
+        self.assertEqual(response.data['results'][0]['preview'], long_text[:SIMILAR_PREVIEW_CHARS])
+        self.assertEqual(response.data['results'][0]['size'], len(long_text))
+        for query in queries:
+            self.assertIsNone(re.search(r'(?<!SUBSTR\()"summarizer_document"\."text"', query['sql']), query['sql'])
+
+    def test_store_analyzed_texts_and_rebuild(self):
+        """Test that analyzed texts are kept when enabled and a rebuild reindexes everything"""
+        with override_settings(SUMMAREASE_SIMILARITY={'STORE_ANALYZED': True}):
+            self.client.post(reverse('sentiment'), {'text': self.corpus[0]}, format='json')
+            self.client.post(reverse('analyze'), {'text': self.corpus[1], 'analyses': ['summary']}, format='json')
+        self.client.post(reverse('sentiment'), {'text': self.corpus[2]}, format='json')
+        self.assertEqual(list(Document.objects.values_list('text', flat=True)), self.corpus[:2])
+        with tempfile.TemporaryDirectory() as directory:
+            corpus = Path(directory) / 'corpus.jsonl'
+            corpus.write_text('\n'.join(json.dumps({'text': text}) for text in self.corpus))
+            call_command('update_similarity_index', corpus=str(corpus), stdout=StringIO())
+        self.assertEqual(Document.objects.count(), 5)
+        call_command('update_similarity_index', rebuild=True, stdout=StringIO())
+        from .similarity import read_manifest
+        manifest = read_manifest()
+        self.assertEqual((manifest['documents'], manifest['segments']), (5, ['segment-000001']))
+
+    def test_update_lock_without_fcntl(self):
+        """Test that index updates fall back to msvcrt where fcntl is missing"""
+        import sys
+        from .similarity import store_documents, update_index
+        calls = []
+        msvcrt = mock.Mock(LK_LOCK='lock', LK_UNLCK='unlock')
+        msvcrt.locking.side_effect = lambda fd, mode, size: calls.append(mode)
+        store_documents(self.corpus)
+        with mock.patch.dict(sys.modules, {'fcntl': None, 'msvcrt': msvcrt}):
+            self.assertEqual(update_index()['documents'], 5)
+        self.assertEqual(calls, ['lock', 'unlock'])
+
+
+class LoadTestTestCase(LiveServerTestCase):
+    """Test cases for the load-testing harness against a live server"""
+
+    def test_synthetic_load(self):
+        """Test a short synthetic run: every request answered, report complete"""
+        import os
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'report.json'
+            call_command(
+                'loadtest', url=self.live_server_url, requests=12, concurrency=3, texts=4, max_words=80,
+                mix='summary=1,sentiment=1,keywords=1', server_pid=os.getpid(), sample_interval=0.05,
+                output=str(output), stdout=StringIO())
+            report = json.loads(output.read_text())
+        self.assertEqual(report['requests'], 12)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['status_codes'], {'200': 12})
+        self.assertNotIn('/api/classify-text/', report['endpoints'])
+        self.assertLessEqual(report['p50_ms'], report['p99_ms'])
+        self.assertGreater(report['peak_rss_mib'], 0)
+
+    def test_replay_log(self):
+        """Test replaying recorded requests and text-only lines, with errors counted"""
+        from .loadtest import read_log, request_stream, run_load
+        with tempfile.TemporaryDirectory() as directory:
+            log = Path(directory) / 'requests.jsonl'
+            log.write_text('\n'.join([
+                json.dumps({'path': '/api/sentiment/', 'body': {'text': 'I love it'}}),
+                json.dumps({'path': '/api/sentiment/', 'body': {}}),
+                json.dumps({'request_id': 'x', 'body': 'Markets are volatile today.'}),
+            ]))
+            entries = read_log(log)
+        report = run_load(self.live_server_url, request_stream(entries, {'classification': 1}), 6, concurrency=2)
+        self.assertEqual(report['requests'], 6)
+        self.assertEqual(report['errors'], 2)
+        self.assertEqual(report['endpoints']['/api/classify-text/']['requests'], 2)
+
+    def test_invalid_options(self):
+        """Test that a bad mix or log is reported"""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='nope=1', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('loadtest', log='/nonexistent.jsonl', stdout=StringIO())
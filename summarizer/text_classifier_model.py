@@ -1,33 +1,58 @@
 """
-Basic custom text classification model trainer using scikit-learn pipeline.
+Basic custom text classification model using a scikit-learn pipeline.
 
-This script demonstrates training a simple text classification model
-that categorizes input texts into predefined labels such as 'Technology',
-'Healthcare', 'Business', and 'Education'. It uses the TF-IDF vectorizer
-to convert text data into numeric features and the Multinomial Naive Bayes
-algorithm as the classifier.
+The model categorizes input texts into predefined labels such as
+'Technology', 'Healthcare', 'Business', and 'Education'. It uses the TF-IDF
+vectorizer to convert text data into numeric features and the Multinomial
+Naive Bayes algorithm as the classifier.
 
 Components:
 - TfidfVectorizer: Converts raw text to a matrix of TF-IDF features.
 - MultinomialNB: Probabilistic classifier suited for discrete features like word counts.
 
 Training data:
-- `training_texts`: List of example text samples.
+- `training_texts`: List of example text samples (the default corpus).
 - `training_labels`: Corresponding category labels for each text sample.
 
-Usage:
-- Fit the model with training data using `text_classifier.fit(training_texts, training_labels)`.
-- Use `text_classifier.predict(new_texts)` to predict categories for new texts.
+Artifacts:
+- The pipeline is never trained at import. `python manage.py train_classifier`
+  fits it and saves a versioned artifact under `settings.CLASSIFIER_ARTIFACT_DIR`
+  as `<version>/classifier.joblib` plus `<version>/metadata.json`.
+- Artifacts are dumped uncompressed so `joblib.load(..., mmap_mode='r')` can
+  memory-map the numpy arrays (IDF weights, NB log probabilities).
+- `get_classifier()` serves the active version of the artifact directory's
+  `ClassifierRegistry`: the version named in its `ACTIVE` file, else the newest.
+  `reload_classifier()` loads and warms up the then-active version and swaps it
+  in atomically; requests that already hold the previous model finish on it.
+  Reloads are triggered by `CLASSIFIER_RELOAD_SIGNAL` (SIGHUP by default) or
+  the admin endpoint `/api/models/classifier/`.
 
 Note:
 - This is a basic example intended for educational purposes and may need
   additional data and tuning for production use.
 
 """
+import json
+import os
+import signal
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import sklearn
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from sklearn.pipeline import make_pipeline
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 
+ARTIFACT_FILENAME = 'classifier.joblib'
+METADATA_FILENAME = 'metadata.json'
+# Optional file in the artifact directory naming the version to serve
+ACTIVE_FILENAME = 'ACTIVE'
+
 training_texts = [
     "Python and AI are transforming the world",
     "Hospitals are improving healthcare with new technologies",
@@ -48,8 +73,202 @@ training_labels = [
     "Healthcare"
 ]
 
-text_classifier = make_pipeline(
-    TfidfVectorizer(),
-    MultinomialNB()
-)
-text_classifier.fit(training_texts, training_labels)
\ No newline at end of file
+
+def build_classifier():
+    """Return an untrained TF-IDF + Multinomial NB pipeline."""
+    return make_pipeline(
+        TfidfVectorizer(),
+        MultinomialNB()
+    )
+
+
+def train_classifier(texts=None, labels=None):
+    """Fit a new pipeline, on the default corpus unless ``texts``/``labels`` are given."""
+    if texts is None:
+        texts, labels = training_texts, training_labels
+    classifier = build_classifier()
+    classifier.fit(texts, labels)
+    return classifier
+
+
+def save_classifier(classifier, directory=None, version=None, n_samples=None):
+    """Write ``classifier`` as a new versioned artifact and return its directory."""
+    directory = Path(directory or settings.CLASSIFIER_ARTIFACT_DIR)
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    target = directory / version
+    if target.exists():
+        raise FileExistsError(f'Classifier artifact version {version} already exists in {directory}')
+    target.mkdir(parents=True)
+    # No compression: compressed pickles cannot be memory-mapped on load
+    joblib.dump(classifier, target / ARTIFACT_FILENAME)
+    metadata = {
+        'version': version,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'sklearn_version': sklearn.__version__,
+        'classes': [str(label) for label in classifier.classes_],
+        'n_samples': n_samples,
+    }
+    (target / METADATA_FILENAME).write_text(json.dumps(metadata, indent=2))
+    return target
+
+
+def available_versions(directory=None):
+    """Versions with a complete artifact in ``directory``, oldest first."""
+    directory = Path(directory or settings.CLASSIFIER_ARTIFACT_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(
+        path.name for path in directory.iterdir()
+        if (path / ARTIFACT_FILENAME).is_file() and (path / METADATA_FILENAME).is_file()
+    )
+
+
+def load_classifier(directory=None, version=None, mmap_mode=None):
+    """Load an artifact (the newest one by default); returns ``(version, classifier)``.
+
+    ``mmap_mode`` defaults to ``settings.CLASSIFIER_MMAP_MODE``; with ``'r'`` the
+    model's numpy arrays are memory-mapped from the artifact file.
+    """
+    directory = Path(directory or settings.CLASSIFIER_ARTIFACT_DIR)
+    versions = available_versions(directory)
+    if version is None:
+        if not versions:
+            raise ImproperlyConfigured(
+                f"No classifier artifact in {directory}. Run 'python manage.py train_classifier' first."
+            )
+        version = versions[-1]
+    elif version not in versions:
+        raise ImproperlyConfigured(f'Classifier artifact version {version} not found in {directory}')
+    if mmap_mode is None:
+        mmap_mode = settings.CLASSIFIER_MMAP_MODE
+    classifier = joblib.load(directory / version / ARTIFACT_FILENAME, mmap_mode=mmap_mode)
+    return version, classifier
+
+
+def read_active_version(directory=None):
+    """Version named in the directory's ``ACTIVE`` file, or None to serve the newest."""
+    path = Path(directory or settings.CLASSIFIER_ARTIFACT_DIR) / ACTIVE_FILENAME
+    try:
+        return path.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_active_version(version, directory=None):
+    """Make ``version`` the one every process serves after its next reload (None: the newest)."""
+    directory = Path(directory or settings.CLASSIFIER_ARTIFACT_DIR)
+    if version is None:
+        (directory / ACTIVE_FILENAME).unlink(missing_ok=True)
+        return
+    if version not in available_versions(directory):
+        raise ImproperlyConfigured(f'Classifier artifact version {version} not found in {directory}')
+    # Write and rename so readers never see a partial file
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.active-')
+    with os.fdopen(fd, 'w') as file:
+        file.write(version + '\n')
+    os.replace(temporary, directory / ACTIVE_FILENAME)
+
+
+class ClassifierRegistry:
+    """The versioned classifier artifacts of one directory and the version being served.
+
+    :meth:`active` returns the served ``(version, classifier)`` pair without
+    locking. :meth:`reload` loads the target version (the ``ACTIVE`` file's, or
+    the newest) and warms it up before swapping the pair, so callers that
+    already took the old pair keep using it and no request waits for a load.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._active = None
+        self._lock = threading.Lock()
+
+    def active(self):
+        """The served ``(version, classifier)``, loaded on first use."""
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._load(None)
+                active = self._active
+        return active
+
+    def reload(self, version=None):
+        """Load ``version`` (default: the target version) and swap it in; returns ``(previous, new)``."""
+        with self._lock:
+            previous = self._active
+            self._active = self._load(version)
+        return (previous[0] if previous else None), self._active[0]
+
+    def _load(self, version):
+        version, classifier = load_classifier(self.directory, version or read_active_version(self.directory))
+        # One prediction touches the (possibly memory-mapped) arrays before the model serves traffic
+        classifier.predict(['warm up'])
+        return version, classifier
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry():
+    """The :class:`ClassifierRegistry` of ``settings.CLASSIFIER_ARTIFACT_DIR`` in this process."""
+    key = str(settings.CLASSIFIER_ARTIFACT_DIR)
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(key, ClassifierRegistry(key))
+    return registry
+
+
+def get_active_classifier():
+    """``(version, classifier)`` being served; use both from one call so they always match."""
+    return get_registry().active()
+
+
+def get_classifier():
+    """The classifier pipeline this process serves, loaded from its artifact on first use."""
+    return get_active_classifier()[1]
+
+
+def get_classifier_version():
+    """Version of the artifact returned by :func:`get_classifier`."""
+    return get_active_classifier()[0]
+
+
+def preload_classifier():
+    """Load the classifier at startup so the first request does not pay for it."""
+    return get_classifier()
+
+
+def reload_classifier(version=None):
+    """Swap in ``version`` (default: the ``ACTIVE`` file's, else the newest); returns ``(previous, new)``.
+
+    The analysis process pool is restarted so its workers load the new model;
+    tasks already running there finish on the old one.
+    """
+    from . import pool
+
+    previous, new = get_registry().reload(version)
+    if previous != new and not pool.in_pool_worker:
+        pool.shutdown_executor(wait=False)
+    return previous, new
+
+
+def _reload_on_signal(signum, frame):
+    # Load in a thread: the handler interrupts whatever the main thread is doing
+    threading.Thread(target=reload_classifier, name='classifier-reload', daemon=True).start()
+
+
+def install_reload_signal():
+    """Reload the classifier when this process receives ``settings.CLASSIFIER_RELOAD_SIGNAL``.
+
+    Returns the signal name, or None when disabled or not possible (not the
+    main thread, or a platform without the signal).
+    """
+    name = getattr(settings, 'CLASSIFIER_RELOAD_SIGNAL', None)
+    signum = getattr(signal, name, None) if name else None
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return None
+    signal.signal(signum, _reload_on_signal)
+    return name
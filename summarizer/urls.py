@@ -1,9 +1,40 @@
 from django.urls import path
-from .views import summarize_view, classify_view, sentiment_view, keywords_view
+from .views import (
+    summarize_view,
+    summarize_stream_view,
+    pdf_analyze_view,
+    classify_view,
+    sentiment_view,
+    keywords_view,
+    analyze_view,
+    summarize_batch_view,
+    classify_batch_view,
+    sentiment_batch_view,
+    keywords_batch_view,
+    cache_stats_view,
+    metrics_view,
+    classifier_model_view,
+    job_submit_view,
+    job_detail_view,
+    similar_view,
+)
 
 urlpatterns = [
     path('text-summary/', summarize_view, name='summarize'),
     path('classify-text/', classify_view, name='classify'),
     path('sentiment/', sentiment_view, name='sentiment'),
     path('keywords/', keywords_view, name='keywords'),
+    path('analyze/', analyze_view, name='analyze'),
+    path('text-summary/stream/', summarize_stream_view, name='summarize-stream'),
+    path('pdf/', pdf_analyze_view, name='pdf-analyze'),
+    path('text-summary/batch/', summarize_batch_view, name='summarize-batch'),
+    path('classify-text/batch/', classify_batch_view, name='classify-batch'),
+    path('sentiment/batch/', sentiment_batch_view, name='sentiment-batch'),
+    path('keywords/batch/', keywords_batch_view, name='keywords-batch'),
+    path('cache/stats/', cache_stats_view, name='cache-stats'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('models/classifier/', classifier_model_view, name='classifier-model'),
+    path('jobs/', job_submit_view, name='jobs'),
+    path('jobs/<uuid:job_id>/', job_detail_view, name='job-detail'),
+    path('similar/', similar_view, name='similar'),
 ]
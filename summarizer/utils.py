@@ -1,115 +1,1079 @@
+import codecs
+import heapq
+import os
+import re
+import tempfile
+from array import array
+from collections import Counter
+from itertools import repeat
+
 import nltk
 import nltk.data
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
-from collections import defaultdict
-from .text_classifier_model import text_classifier
+from .cache import content_hash, get_result_cache, make_key
+from .keyword_model import get_keyword_model, get_keyword_model_version
+from .metrics import stage, timing_active
+from .near_duplicates import document_fingerprint, get_near_duplicate_index
+from .nltk_resources import ensure_resources
+from . import summary_engine
+from .sentiment_engine import BatchSentimentEngine
+from .similarity import similarity_config, store_document
+from .text_classifier_model import get_active_classifier, get_classifier, get_classifier_version
 from nltk.sentiment import SentimentIntensityAnalyzer
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
 
-nltk.download('punkt')
-nltk.download('stopwords')
-# Download sentiment lexicon for VADER
-nltk.download('vader_lexicon')
+# punkt, stopwords and the VADER lexicon must already be on disk; never download at import
+ensure_resources()
 
 tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
 
+STOP_WORDS = frozenset(stopwords.words('english'))
 
-def summarize_text(text, max_sentences=3):
-    """Returns Summary of the text"""
-    sentences = tokenizer.tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    
-    word_freq = defaultdict(int)
-    for sent in sentences:
-        words = word_tokenize(sent.lower())
-        for word in words:
-            if word.isalpha() and word not in stop_words:
-                word_freq[word] += 1
-                
-    sentence_scores = defaultdict(int)
+# Same token shape as TfidfVectorizer's default token_pattern
+_KEYWORD_TOKEN_RE = re.compile(r'(?u)\b\w\w+\b')
+
+
+# Tokenizer backends, selected per deployment with settings.SUMMAREASE_TOKENIZER.
+# Summaries and keywords only use alphabetic words and sentence boundaries, so a
+# couple of regular expressions get close to punkt + Treebank at a fraction of the cost.
+
+class NLTKTokenizer:
+    """Reference backend: punkt sentences and Treebank ``word_tokenize`` words."""
+
+    name = 'nltk'
+
+    def span_tokenize(self, text):
+        return tokenizer.span_tokenize(text)
+
+    def sentences(self, text):
+        return tokenizer.tokenize(text)
+
+    def words(self, sentence):
+        """Lowercased tokens of ``sentence``."""
+        return word_tokenize(sentence.lower())
+
+
+# A run of sentence-final punctuation (plus closing quotes/brackets) at the end of a
+# whitespace-delimited token, followed by whitespace; group 1 is the token before it
+_SENTENCE_END_RE = re.compile(r'(?<!\S)(\S*?)([.!?]+)["\')\]\u2019\u201d]*(?=\s)')
+_NON_SPACE_RE = re.compile(r'\S')
+_WORD_RE = re.compile(r'\w+')
+
+
+class RegexTokenizer:
+    """Fast backend: precompiled regular expressions for sentence ends and words.
+
+    Sentences end at ``.``, ``!`` or ``?`` followed by whitespace, except after
+    an ellipsis, an initial or a period that ends one of punkt's abbreviations. Words are
+    runs of ``\\w`` characters, so contractions and hyphenated words are split
+    where Treebank keeps them whole (``"well-known"`` counts as two content
+    words rather than none).
+    """
+
+    name = 'regex'
+
+    def __init__(self, abbreviations=()):
+        self.abbreviations = frozenset(abbreviations)
+
+    def span_tokenize(self, text):
+        start = len(text) - len(text.lstrip())
+        stop = len(text.rstrip())
+        for match in _SENTENCE_END_RE.finditer(text, start, stop):
+            punctuation = match.group(2)
+            if punctuation == '.':
+                token = match.group(1).lstrip('"\'([\u2018\u201c').lower()
+                if token in self.abbreviations or token.rpartition('-')[2] in self.abbreviations:
+                    continue
+                # Like punkt, a single letter before a period is taken for an initial
+                if len(token) == 1 and token.isalpha():
+                    continue
+            elif punctuation[:2] == '..' and punctuation.strip('.') == '':
+                continue
+            yield start, match.end()
+            start = _NON_SPACE_RE.search(text, match.end(), stop).start()
+        if start < stop:
+            yield start, stop
+
+    def sentences(self, text):
+        return [text[start:end] for start, end in self.span_tokenize(text)]
+
+    def words(self, sentence):
+        """Lowercased word tokens of ``sentence``."""
+        return _WORD_RE.findall(sentence.lower())
+
+
+# Used if a punkt model ever stops exposing its abbreviations (``_params`` is private to NLTK)
+FALLBACK_ABBREVIATIONS = frozenset({
+    'dr', 'mr', 'mrs', 'ms', 'prof', 'st', 'jr', 'sr', 'vs', 'etc', 'e.g', 'i.e', 'u.s', 'inc', 'co', 'corp',
+    'ltd', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec', 'no', 'gen',
+})
+
+
+def punkt_abbreviations(model=None):
+    """The abbreviations learned by the punkt ``model`` (default: the English one), for :class:`RegexTokenizer`."""
+    params = getattr(model or tokenizer, '_params', None)
+    abbreviations = getattr(params, 'abbrev_types', None)
+    return FALLBACK_ABBREVIATIONS if abbreviations is None else frozenset(abbreviations)
+
+
+TOKENIZERS = {
+    'nltk': NLTKTokenizer(),
+    'regex': RegexTokenizer(punkt_abbreviations()),
+}
+
+
+def get_tokenizer(name=None):
+    """The tokenizer backend ``name``, by default the one named by ``settings.SUMMAREASE_TOKENIZER`` (``'nltk'``)."""
+    name = name or getattr(settings, 'SUMMAREASE_TOKENIZER', 'nltk')
+    try:
+        return TOKENIZERS[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"SUMMAREASE_TOKENIZER must be one of: {', '.join(TOKENIZERS)}")
+
+
+def _tokenize_sentences(sentences, backend=None):
+    """Word-tokenize ``sentences`` with ``backend`` (default: the configured one); the unit of work of
+    both the serial and parallel paths.
+
+    Returns ``(tokens, token_counts, content_tokens, content_counts)`` where the
+    counts are per sentence.
+    """
+    tokens = []
+    content_tokens = []
+    token_counts = []
+    content_counts = []
+    words = (backend or get_tokenizer()).words
     for sent in sentences:
-        for word in word_tokenize(sent.lower()):
-            if word in word_freq:
-                sentence_scores[sent] += word_freq[word]
-                
-    ranked_sentences = sorted(sentence_scores, key=sentence_scores.get, reverse=True)
-    print(ranked_sentences)
-    summary = ' '.join(ranked_sentences[:max_sentences])
-    return summary
+        before, content_before = len(tokens), len(content_tokens)
+        for word in words(sent):
+            tokens.append(word)
+            if word.isalpha() and word not in STOP_WORDS:
+                content_tokens.append(word)
+        token_counts.append(len(tokens) - before)
+        content_counts.append(len(content_tokens) - content_before)
+    return tokens, token_counts, content_tokens, content_counts
+
+
+def _term_ids(words):
+    """``(terms, ids)``: the distinct ``words`` in order of first occurrence, and the id of each word."""
+    vocabulary = {}
+    ids = np.fromiter(
+        (vocabulary.setdefault(word, len(vocabulary)) for word in words), dtype=np.int32, count=len(words))
+    return list(vocabulary), ids
+
+
+def _tokenize_chunk(sentences, backend):
+    # Map step of the parallel path: tokenize a chunk and number its content words
+    tokens, token_counts, content_tokens, content_counts = _tokenize_sentences(sentences, backend)
+    return (tokens, token_counts, content_tokens, content_counts, *_term_ids(content_tokens))
+
+
+def _offsets(counts):
+    offsets = array('l', [0])
+    total = 0
+    for count in counts:
+        total += count
+        offsets.append(total)
+    return offsets
+
+
+def _parallel_chunks(items):
+    """Split ``items`` into contiguous chunks for the pool, or ``None`` to stay serial."""
+    from . import pool
+
+    workers = settings.SUMMAREASE_POOL_WORKERS
+    if pool.in_pool_worker or workers == 0 or len(items) < 2:
+        return None
+    chunk_count = min(len(items), 4 * (workers or os.cpu_count() or 1))
+    size = -(-len(items) // chunk_count)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class AnalyzedDocument:
+    """Sentence split and word tokens of a text, computed once per request.
+
+    Every sentence is word-tokenized exactly once. Lowercased tokens and the
+    stopword-filtered alphabetic ("content") tokens of all sentences are kept
+    in two flat lists; ``token_offsets[i]:token_offsets[i + 1]`` and
+    ``content_offsets[i]:content_offsets[i + 1]`` delimit sentence ``i``.
+
+    Content tokens are numbered by term (``term_ids()``), from which the
+    sentence-by-term count matrix used for scoring is built once.
+
+    Texts of at least ``SUMMAREASE_PARALLEL_THRESHOLD`` characters take a
+    map-reduce path: sentences are split serially (so boundaries are exactly
+    the serial ones), then chunks of sentences are tokenized and their terms
+    numbered in the process pool, and the per-chunk vocabularies merged. Both
+    paths give identical results.
+
+    ``strategy`` records how ``text`` was derived from the request's text:
+    ``'exact'`` for the text itself, otherwise the approximate strategy of
+    :func:`approximate_text` that sampled it. ``backend`` is the tokenizer
+    backend to use (an instance such as ``RegexTokenizer()``), by default
+    the configured one.
+    """
+
+    __slots__ = ('text', 'strategy', 'backend', 'sentences', 'tokens', 'token_offsets', 'content_tokens',
+                 'content_offsets', 'parallel', '_term_ids', '_term_matrix')
+
+    def __init__(self, text, strategy='exact', backend=None):
+        self.text = text
+        self.strategy = strategy
+        self.backend = backend or get_tokenizer()
+        with stage('sentence_tokenize'):
+            self.sentences = self.backend.sentences(text)
+        self._term_ids = None
+        self._term_matrix = None
+        threshold = settings.SUMMAREASE_PARALLEL_THRESHOLD
+        chunks = _parallel_chunks(self.sentences) if threshold is not None and len(text) >= threshold else None
+        self.parallel = chunks is not None
+        with stage('word_tokenize'):
+            self._tokenize(chunks)
+
+    def _tokenize(self, chunks):
+        if chunks is None:
+            tokens, token_counts, content_tokens, content_counts = _tokenize_sentences(self.sentences, self.backend)
+        else:
+            from .pool import get_executor
+
+            tokens, token_counts, content_tokens, content_counts = [], [], [], []
+            vocabulary = {}
+            ids = [np.zeros(0, dtype=np.int32)]
+            for part in get_executor().map(_tokenize_chunk, chunks, repeat(self.backend)):
+                tokens.extend(part[0])
+                token_counts.extend(part[1])
+                content_tokens.extend(part[2])
+                content_counts.extend(part[3])
+                # Renumber the chunk's terms into the document's vocabulary (first occurrence order, as serially)
+                terms, chunk_ids = part[4], part[5]
+                mapping = np.fromiter(
+                    (vocabulary.setdefault(term, len(vocabulary)) for term in terms), dtype=np.int32, count=len(terms))
+                ids.append(mapping[chunk_ids])
+            self._term_ids = (list(vocabulary), np.concatenate(ids))
+        self.tokens = tokens
+        self.content_tokens = content_tokens
+        self.token_offsets = _offsets(token_counts)
+        self.content_offsets = _offsets(content_counts)
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def sentence_tokens(self, index):
+        """Lowercased tokens of sentence ``index``."""
+        return self.tokens[self.token_offsets[index]:self.token_offsets[index + 1]]
+
+    def sentence_content_tokens(self, index):
+        """Stopword-filtered alphabetic tokens of sentence ``index``."""
+        return self.content_tokens[self.content_offsets[index]:self.content_offsets[index + 1]]
+
+    def term_ids(self):
+        """``(terms, ids)``: the distinct content tokens by id, and the id of each content token."""
+        if self._term_ids is None:
+            self._term_ids = _term_ids(self.content_tokens)
+        return self._term_ids
+
+    def term_counts(self):
+        """Count of each term over the whole document, by id."""
+        terms, ids = self.term_ids()
+        return np.bincount(ids, minlength=len(terms))
+
+    def term_matrix(self):
+        """Sparse (CSR) sentence-by-term matrix of content token counts (computed once)."""
+        if self._term_matrix is None:
+            terms, ids = self.term_ids()
+            matrix = csr_matrix(
+                (np.ones(len(ids), dtype=np.int64), ids.copy(), np.asarray(self.content_offsets)),
+                shape=(len(self.sentences), len(terms)),
+            )
+            matrix.sum_duplicates()
+            self._term_matrix = matrix
+        return self._term_matrix
+
+
+def analyze_document(text):
+    """Return an :class:`AnalyzedDocument` for ``text`` (passed through if it already is one)."""
+    if isinstance(text, AnalyzedDocument):
+        return text
+    return AnalyzedDocument(text)
+
+
+def _document_text(text):
+    return text.text if isinstance(text, AnalyzedDocument) else text
+
+
+def summarize_text(text, max_sentences=3, method=None):
+    """Returns Summary of the text (a string or an :class:`AnalyzedDocument`)
+
+    The best ``max_sentences`` sentences by ``method`` (``'frequency'`` or
+    ``'textrank'``; default ``SUMMAREASE_SUMMARY['METHOD']``, see
+    ``summarizer/summary_engine.py``), in document order.
+    """
+    doc = analyze_document(text)
+    with stage('scoring'):
+        scores = summary_engine.sentence_scores(doc, method)
+        # Sentences without content words are never picked
+        eligible = np.diff(np.asarray(doc.content_offsets)) > 0
+        selected = summary_engine.top_sentences(scores, eligible, doc.sentences, max_sentences)
+    return ' '.join(doc.sentences[index] for index in selected)
+
+
+# Latency budgets: texts too long to analyze within a request's budget are
+# summarized and keyword-ranked from a sample of their sentences
+
+BUDGET_DEFAULTS = {
+    'DEFAULT_MS': 2000,
+    'MAX_MS': 10_000,
+    'CHARS_PER_MS': 400,
+    'STRATEGY': 'sample',
+    'SECTION_CHARS': 8192,
+}
+
+APPROXIMATE_STRATEGIES = ('sample', 'leading')
+
+
+def _budget_config():
+    return {**BUDGET_DEFAULTS, **getattr(settings, 'SUMMAREASE_BUDGET', {})}
+
+
+def resolve_budget(budget_ms=None):
+    """Budget of a request in ms: ``budget_ms`` capped at ``MAX_MS``, or ``DEFAULT_MS`` (None = unbounded)."""
+    config = _budget_config()
+    if budget_ms is None:
+        budget_ms = config['DEFAULT_MS']
+    if budget_ms is not None and config['MAX_MS'] is not None:
+        budget_ms = min(budget_ms, config['MAX_MS'])
+    return budget_ms
+
+
+def _whole_sentences(text, start, end):
+    # Sentences of text[start:end], dropping those cut by a window edge
+    spans = list(get_tokenizer().span_tokenize(text[start:end]))
+    if start > 0:
+        spans = spans[1:]
+    if end < len(text):
+        spans = spans[:-1]
+    if not spans:
+        # No sentence boundary inside the window: keep it as is
+        return text[start:end]
+    return text[start + spans[0][0]:start + spans[-1][1]]
+
+
+def approximate_text(text, budget_ms):
+    """``(text, 'exact')`` if ``text`` can be analyzed within ``budget_ms``, else a sample and its strategy.
+
+    The exact cost is estimated from the text length at ``CHARS_PER_MS``. Longer
+    texts are cut to the characters the budget allows: ``'sample'`` takes
+    evenly spaced sections of ``SECTION_CHARS`` across the whole text (so word
+    frequencies are estimated from every part of it), ``'leading'`` takes the
+    beginning. Sections are trimmed to whole sentences.
+    """
+    if budget_ms is None:
+        return text, 'exact'
+    config = _budget_config()
+    limit = budget_ms * config['CHARS_PER_MS']
+    if len(text) <= limit:
+        return text, 'exact'
+    strategy = config['STRATEGY']
+    if strategy not in APPROXIMATE_STRATEGIES:
+        raise ImproperlyConfigured(
+            f"SUMMAREASE_BUDGET['STRATEGY'] must be one of: {', '.join(APPROXIMATE_STRATEGIES)}"
+        )
+    if strategy == 'leading':
+        return _whole_sentences(text, 0, limit), strategy
+    section = max(1, min(config['SECTION_CHARS'], limit))
+    count = max(1, limit // section)
+    step = (len(text) - section) / max(count - 1, 1)
+    starts = sorted({int(i * step) for i in range(count)})
+    return '\n\n'.join(_whole_sentences(text, start, start + section) for start in starts), strategy
+
+
+def budgeted_document(text, budget_ms=None, resolved=False):
+    """:class:`AnalyzedDocument` of ``text``, or of a sample of it when it exceeds the budget.
+
+    ``budget_ms`` of None means the server default (see :func:`resolve_budget`);
+    with ``resolved`` it is used as is (None = exact). An :class:`AnalyzedDocument`
+    is returned as is.
+    """
+    if isinstance(text, AnalyzedDocument):
+        return text
+    source, strategy = approximate_text(text, budget_ms if resolved else resolve_budget(budget_ms))
+    return AnalyzedDocument(source, strategy)
+
+
+def _approximation(doc):
+    return {'approximate': doc.strategy != 'exact', 'strategy': doc.strategy}
+
+
+# Streaming summarization: memory depends on max_sentences and the vocabulary, not the text length
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _read_chunks(readable, encoding='utf-8'):
+    """Yield text chunks from a file-like object, decoding bytes incrementally."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    while True:
+        chunk = readable.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+class _TwoPassSource:
+    """Iterate a text source twice without holding it in memory.
+
+    ``source`` may be a string, a callable returning a fresh iterable of text
+    chunks, a seekable file-like object, or any one-shot iterable / stream;
+    one-shot sources are spilled to a temporary file during the first pass.
+    """
+
+    def __init__(self, source, encoding='utf-8'):
+        self.source = source
+        self.encoding = encoding
+        self.spill = None
+
+    def _chunks(self):
+        source = self.source
+        if isinstance(source, str):
+            return [source]
+        if callable(source):
+            return source()
+        if hasattr(source, 'read'):
+            return _read_chunks(source, self.encoding)
+        return source
+
+    def _replayable(self):
+        source = self.source
+        return isinstance(source, str) or callable(source) or (
+            hasattr(source, 'seekable') and source.seekable())
+
+    def first_pass(self):
+        if self._replayable():
+            yield from self._chunks()
+            return
+        self.spill = tempfile.TemporaryFile('w+', encoding='utf-8')
+        for chunk in self._chunks():
+            self.spill.write(chunk)
+            yield chunk
+
+    def second_pass(self):
+        if self.spill is not None:
+            self.spill.seek(0)
+            return _read_chunks(self.spill)
+        if hasattr(self.source, 'read'):
+            self.source.seek(0)
+        return self._chunks()
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+def iter_sentences(chunks):
+    """Yield ``(offset, sentence)`` for text arriving in ``chunks``, split by the tokenizer backend.
+
+    Only the trailing, possibly unfinished, sentence is buffered between chunks.
+    """
+    span_tokenize = get_tokenizer().span_tokenize
+    buffer = ''
+    consumed = 0
+    for chunk in chunks:
+        buffer += chunk
+        spans = list(span_tokenize(buffer))
+        # The last sentence may continue in the next chunk; keep it buffered
+        for start, end in spans[:-1]:
+            yield consumed + start, buffer[start:end]
+        if spans:
+            cut = spans[-1][0]
+            buffer = buffer[cut:]
+            consumed += cut
+    for start, end in span_tokenize(buffer):
+        yield consumed + start, buffer[start:end]
+
+
+def rank_sentences_stream(source, max_sentences=3, keyword_counts=None):
+    """Best ``max_sentences`` sentences of a streamed text, picked like :func:`summarize_text`.
+
+    Pass one counts content words; pass two scores each sentence and keeps
+    only a heap of the best candidates. Sentences are ranked by word
+    frequency whatever ``SUMMAREASE_SUMMARY['METHOD']`` is, as TextRank needs
+    the whole text at once. Returns ``(index, offset, sentence)`` tuples in
+    document order. Pass a Counter as ``keyword_counts`` to also count the
+    keyword terms of the text during pass one (see :func:`rank_keyword_counts`).
+    """
+    passes = _TwoPassSource(source)
+    try:
+        word_freq = Counter()
+        for _, sentence in iter_sentences(passes.first_pass()):
+            tokens, _, content_tokens, _ = _tokenize_sentences([sentence])
+            word_freq.update(content_tokens)
+            if keyword_counts is not None:
+                keyword_counts.update(_sentence_keyword_terms(tokens))
+
+        # Min-heap on (score, -index): the root is the worst kept candidate
+        heap = []
+        kept = set()
+        if max_sentences > 0:
+            for index, (offset, sentence) in enumerate(iter_sentences(passes.second_pass())):
+                score = sum(word_freq[word] for word in _tokenize_sentences([sentence])[2])
+                # A repeated sentence ties with its earlier copy and ranks below it, so it never displaces it
+                if score <= 0 or sentence in kept:
+                    continue
+                entry = (score, -index, offset, sentence)
+                if len(heap) < max_sentences:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    kept.discard(heapq.heapreplace(heap, entry)[3])
+                else:
+                    continue
+                kept.add(sentence)
+    finally:
+        passes.close()
+    return [(-neg_index, offset, sentence) for _, neg_index, offset, sentence in sorted(heap, key=lambda e: -e[1])]
+
+
+def summarize_stream(source, max_sentences=3):
+    """Streaming equivalent of :func:`summarize_text` for texts too large to hold in memory."""
+    return ' '.join(sentence for _, _, sentence in rank_sentences_stream(source, max_sentences))
+
+
+def _split_pipeline(classifier):
+    # (vectorizer steps, final estimator) of a pipeline, so the two can be timed apart
+    if timing_active() and hasattr(classifier, 'steps') and len(classifier.steps) > 1:
+        return classifier[:-1], classifier[-1]
+    return None, classifier
+
 
+def _predict(classifier, texts):
+    features, estimator = _split_pipeline(classifier)
+    if features is not None:
+        with stage('vectorize'):
+            texts = features.transform(texts)
+    with stage('inference'):
+        return estimator.predict(texts)
+
+
+def _predict_proba(classifier, texts):
+    """``classifier.predict_proba(texts)``; timed as vectorize + inference stages when metrics are on."""
+    features, estimator = _split_pipeline(classifier)
+    if features is not None:
+        with stage('vectorize'):
+            texts = features.transform(texts)
+    with stage('inference'):
+        return estimator.predict_proba(texts)
 
 
 def classify_text(text):
     """Returns predicted category for the given text"""
-    prediction = text_classifier.predict([text])[0]
+    prediction = _predict(get_classifier(), [_document_text(text)])[0]
     return prediction
 
 # New helpers
 _vader_analyzer = SentimentIntensityAnalyzer()
+_sentiment_engine = BatchSentimentEngine(_vader_analyzer)
 
 
-def analyze_sentiment(text: str):
-    """Return sentiment scores and label using NLTK VADER."""
-    scores = _vader_analyzer.polarity_scores(text)
-    compound = scores.get('compound', 0.0)
+def _sentiment_label(compound):
     if compound >= 0.05:
-        label = 'positive'
-    elif compound <= -0.05:
-        label = 'negative'
-    else:
-        label = 'neutral'
+        return 'positive'
+    if compound <= -0.05:
+        return 'negative'
+    return 'neutral'
+
+
+def analyze_sentiment(text):
+    """Return sentiment scores and label using NLTK VADER."""
+    with stage('sentiment'):
+        scores = _vader_analyzer.polarity_scores(_document_text(text))
     return {
-        'label': label,
+        'label': _sentiment_label(scores.get('compound', 0.0)),
         'scores': scores,
     }
 
 
-def extract_keywords(text: str, top_k: int = 10):
-    """Extract top keywords/keyphrases using TF-IDF on the single document."""
-    if not text.strip():
+def sentence_sentiments(text):
+    """Yield the sentiment of each sentence of ``text``, one at a time.
+
+    Each item has the sentence ``index``, its ``start``/``end`` character
+    offsets in ``text`` and the same ``label``/``scores`` as :func:`analyze_sentiment`.
+    """
+    text = _document_text(text)
+    for index, (start, end) in enumerate(get_tokenizer().span_tokenize(text)):
+        scores = _sentiment_engine.polarity_scores(text[start:end])
+        yield {
+            'index': index,
+            'start': start,
+            'end': end,
+            'label': _sentiment_label(scores['compound']),
+            'scores': scores,
+        }
+
+
+def _sentence_keyword_terms(tokens):
+    """Unigrams and bigrams of one sentence's lowercased ``tokens``, stop words removed."""
+    words = [
+        word
+        for token in tokens
+        for word in _KEYWORD_TOKEN_RE.findall(token)
+        if word not in ENGLISH_STOP_WORDS
+    ]
+    return words + [' '.join(pair) for pair in zip(words, words[1:])]
+
+
+def _keyword_terms(doc):
+    """Unigrams and within-sentence bigrams of ``doc`` for the TF-IDF keyword vectorizer."""
+    terms = []
+    for index in range(len(doc)):
+        terms.extend(_sentence_keyword_terms(doc.sentence_tokens(index)))
+    return terms
+
+
+def rank_keyword_counts(counts, top_k=10):
+    """Top ``top_k`` keywords from a Counter of keyword terms counted over a whole text.
+
+    Uses the corpus IDF of the keyword model when one is fitted, like
+    :func:`extract_keywords`; without one, terms rank by frequency (ties
+    alphabetically), as TF-IDF over a single document does.
+    """
+    model = get_keyword_model()
+    if model is not None:
+        return model.top_terms(counts, top_k)
+    return sorted(counts, key=lambda term: (-counts[term], term))[:max(top_k, 0)]
+
+
+def extract_keywords(text, top_k: int = 10):
+    """Extract top keywords/keyphrases using TF-IDF, with the corpus IDF when a keyword model is fitted."""
+    if not _document_text(text).strip():
         return []
     
     try:
-        vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), max_features=5000)
-        tfidf_matrix = vectorizer.fit_transform([text])
-        feature_names = vectorizer.get_feature_names_out()
-        scores = tfidf_matrix.toarray()[0]
-        ranked_indices = scores.argsort()[::-1]
-        keywords = []
-        for idx in ranked_indices[:top_k]:
-            term = feature_names[idx]
-            score = float(scores[idx])
-            if score > 0:
-                keywords.append(term)  # Return just the term, not the dictionary
-        return keywords
+        doc = analyze_document(text)
+        with stage('keywords'):
+            model = get_keyword_model()
+            if model is not None:
+                # Corpus IDF fitted offline: only the document's own terms are counted here
+                return model.top_terms(_keyword_terms(doc), top_k)
+            # No fitted model: TF-IDF over the single document (i.e. term frequency)
+            # Reuse the document's word tokens instead of re-tokenizing the raw text
+            vectorizer = TfidfVectorizer(analyzer=_keyword_terms, max_features=5000)
+            tfidf_matrix = vectorizer.fit_transform([doc])
+            feature_names = vectorizer.get_feature_names_out()
+            scores = tfidf_matrix.toarray()[0]
+            ranked_indices = scores.argsort()[::-1]
+            keywords = []
+            for idx in ranked_indices[:top_k]:
+                term = feature_names[idx]
+                score = float(scores[idx])
+                if score > 0:
+                    keywords.append(term)  # Return just the term, not the dictionary
+            return keywords
     except Exception:
         # Fallback: simple word extraction
-        words = text.lower().split()
+        words = _document_text(text).lower().split()
         # Remove common stop words and short words
         stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
         keywords = [word for word in words if len(word) > 2 and word not in stop_words]
         return keywords[:top_k]
 
 
-def classify_with_confidence(text: str, top_k: int = 3):
+def _classifier_classes(classifier):
+    """Class labels of ``classifier``, in ``predict_proba`` column order."""
+    # If using a Pipeline, classes_ live on the final estimator
+    classes = getattr(classifier, 'classes_', None)
+    if classes is None and hasattr(classifier, 'steps'):
+        try:
+            classes = classifier.named_steps[list(classifier.named_steps.keys())[-1]].classes_
+        except Exception:
+            classes = None
+    if classes is None or len(classes) == 0:
+        # Try to get from estimator_ attribute
+        classes = getattr(getattr(classifier, 'estimator', None), 'classes_', [])
+    return list(classes)
+
+
+def _top_labels(classifier, proba, top_k):
+    pairs = list(zip(_classifier_classes(classifier), list(proba)))
+    pairs.sort(key=lambda x: x[1], reverse=True)
+    return [{'label': label, 'confidence': float(prob)} for label, prob in pairs[:top_k]]
+
+
+def classify_with_confidence(text, top_k: int = 3):
     """Return top-k labels with probabilities using the existing classifier."""
+    text = _document_text(text)
+    classifier = get_classifier()
     try:
-        proba = text_classifier.predict_proba([text])[0]
-        # If using a Pipeline, classes_ live on the final estimator
-        classes = getattr(text_classifier, 'classes_', None)
-        if classes is None and hasattr(text_classifier, 'steps'):
-            try:
-                classes = text_classifier.named_steps[list(text_classifier.named_steps.keys())[-1]].classes_
-            except Exception:
-                classes = []
-        if not classes:
-            # Try to get from estimator_ attribute
-            classes = getattr(getattr(text_classifier, 'estimator', None), 'classes_', [])
-        pairs = list(zip(list(classes), list(proba)))
-        pairs.sort(key=lambda x: x[1], reverse=True)
-        top = [{'label': label, 'confidence': float(prob)} for label, prob in pairs[:top_k]]
-        return top
+        proba = _predict_proba(classifier, [text])[0]
+        return _top_labels(classifier, proba, top_k)
     except Exception:
-        label = text_classifier.predict([text])[0]
-        return [{'label': label, 'confidence': 1.0}]
\ No newline at end of file
+        label = _predict(classifier, [text])[0]
+        return [{'label': label, 'confidence': 1.0}]
+
+
+# Result payloads shared by the single-analysis views and /api/analyze/
+
+def summary_result(text, max_sentences=3, budget_ms=None):
+    doc = budgeted_document(text, budget_ms)
+    return {
+        'summary': summarize_text(doc, max_sentences=max_sentences),
+        'max_sentences': max_sentences,
+        **_approximation(doc),
+    }
+
+
+def classification_result(text, top_k=3):
+    """Predicted category and top-k labels from a single ``predict_proba`` call, with the model version."""
+    text = _document_text(text)
+    # One snapshot of the registry: a concurrent reload cannot mix two models in one result
+    version, classifier = get_active_classifier()
+    try:
+        proba = _predict_proba(classifier, [text])[0]
+        ranked = _top_labels(classifier, proba, len(proba))
+        return {'category': ranked[0]['label'], 'top': ranked[:top_k], 'model_version': version}
+    except Exception:
+        label = _predict(classifier, [text])[0]
+        return {'category': label, 'top': [{'label': label, 'confidence': 1.0}], 'model_version': version}
+
+
+def sentiment_result(text):
+    return analyze_sentiment(text)
+
+
+def keywords_result(text, top_k=10, budget_ms=None):
+    doc = budgeted_document(text, budget_ms)
+    return {'keywords': extract_keywords(doc, top_k=top_k), 'top_k': top_k, **_approximation(doc)}
+
+
+ANALYSES = {
+    'summary': summary_result,
+    'classification': classification_result,
+    'sentiment': sentiment_result,
+    'keywords': keywords_result,
+}
+
+# Integer options accepted by each analysis, with their defaults; a budget_ms of
+# None stands for the server default (SUMMAREASE_BUDGET['DEFAULT_MS'])
+ANALYSIS_OPTIONS = {
+    'summary': {'max_sentences': 3, 'budget_ms': None},
+    'classification': {'top_k': 3},
+    'sentiment': {},
+    'keywords': {'top_k': 10, 'budget_ms': None},
+}
+
+# Analyses that work on the tokenized document rather than the raw text
+_DOCUMENT_ANALYSES = {'summary', 'keywords'}
+
+
+def model_version(name):
+    """Version of the model behind analysis ``name``; part of its cache key.
+
+    Summaries and keywords also depend on the tokenizer backend, which is
+    appended to the version unless it is the reference NLTK backend, and
+    summaries on the scoring method unless it is ``'frequency'``.
+    """
+    if name == 'classification':
+        return get_classifier_version()
+    version = get_keyword_model_version() if name == 'keywords' else None
+    if name == 'summary' and summary_engine.summary_method() != 'frequency':
+        version = f'+{summary_engine.summary_method()}'
+    if name in _DOCUMENT_ANALYSES:
+        backend = get_tokenizer().name
+        if backend != NLTKTokenizer.name:
+            version = f'{version or ""}+{backend}'
+    return version
+
+
+class CacheLookup:
+    """Outcome of looking up a text's analyses in the result cache (see :func:`lookup_analyses`).
+
+    ``misses`` lists the analyses still to compute. Lookups and stores run in
+    the serving process, so the async views share one cache and one
+    near-duplicate index while the computing happens in the pool.
+    """
+
+    __slots__ = ('cache', 'near_duplicates', 'text_hash', 'keys', 'params', 'misses', 'fingerprint')
+
+    def __init__(self, cache, near_duplicates, text_hash, misses):
+        self.cache = cache
+        self.near_duplicates = near_duplicates
+        self.text_hash = text_hash
+        self.keys = {}
+        self.params = {}
+        self.misses = misses
+        self.fingerprint = None
+
+
+def lookup_analyses(text, analyses=tuple(ANALYSES), options=None):
+    """Results of ``analyses`` for ``text`` found in the result cache, and the :class:`CacheLookup`."""
+    options = options or {}
+    cache = get_result_cache()
+    if cache is None:
+        return {}, CacheLookup(None, None, None, list(analyses))
+    with stage('cache'):
+        lookup = CacheLookup(cache, get_near_duplicate_index(), content_hash(_document_text(text)), [])
+        results = {}
+        for name in analyses:
+            lookup.params[name] = {**ANALYSIS_OPTIONS[name], **options.get(name, {})}
+            lookup.keys[name] = make_key(name, lookup.text_hash, lookup.params[name], model_version(name))
+            found, result = cache.get(lookup.keys[name])
+            if found:
+                results[name] = result
+            else:
+                lookup.misses.append(name)
+    return results, lookup
+
+
+def lookup_near_duplicates(lookup, fingerprint):
+    """Cached results of a near-identical text for ``lookup.misses``, marked with ``near_duplicate_of``.
+
+    ``fingerprint`` is the text's :func:`text_fingerprint`; the analyses found
+    are removed from ``lookup.misses`` and cached under the text's own keys.
+    """
+    lookup.fingerprint = fingerprint
+    match = lookup.near_duplicates.nearest(fingerprint, exclude=lookup.text_hash) if fingerprint else None
+    if match is None:
+        return {}
+    results = {}
+    with stage('cache'):
+        for name in list(lookup.misses):
+            found, result = lookup.cache.get(make_key(name, match[0], lookup.params[name], model_version(name)))
+            if found:
+                result['near_duplicate_of'] = {'content_hash': match[0], 'similarity': match[1]}
+                results[name] = result
+                lookup.misses.remove(name)
+                lookup.cache.set(lookup.keys[name], result)
+    return results
+
+
+def store_analyses(lookup, results):
+    """Cache freshly computed ``results`` and index the text's fingerprint for near-duplicate matching."""
+    if lookup.cache is None or not results:
+        return
+    with stage('cache'):
+        for name, result in results.items():
+            lookup.cache.set(lookup.keys[name], result)
+    if lookup.fingerprint:
+        # Later near-duplicates of this text can reuse the results just cached
+        lookup.near_duplicates.add(lookup.text_hash, lookup.fingerprint)
+
+
+def text_fingerprint(text):
+    """Near-duplicate fingerprint of ``text`` as analyzed under the default budget (0 if too short)."""
+    with stage('fingerprint'):
+        return document_fingerprint(budgeted_document(text, resolve_budget(None), resolved=True)) or 0
+
+
+# budget_ms of run_analyses for requests: an analysis's own budget_ms capped at
+# MAX_MS, or DEFAULT_MS (see resolve_budget)
+REQUEST_BUDGET = object()
+
+
+def _analysis_budget(params, budget_ms=REQUEST_BUDGET):
+    # Budget an analysis runs under; a caller's budget_ms (e.g. a job's) is trusted, so it is not capped
+    if budget_ms is REQUEST_BUDGET:
+        return resolve_budget(params.get('budget_ms'))
+    return budget_ms if params.get('budget_ms') is None else params['budget_ms']
+
+
+def compute_analyses(text, analyses, options=None, document=None, budget_ms=REQUEST_BUDGET):
+    """Compute ``analyses`` for ``text`` without the result cache.
+
+    Summary and keyword analyses share one :class:`AnalyzedDocument` per
+    budget; ``document`` is an optional ``budget -> document`` function
+    supplying them. ``budget_ms`` is as in :func:`run_analyses`.
+    """
+    options = options or {}
+    documents = {}
+
+    def budget_document(budget):
+        if budget not in documents:
+            documents[budget] = budgeted_document(text, budget, resolved=True)
+        return documents[budget]
+
+    document = document or budget_document
+    results = {}
+    for name in analyses:
+        params = options.get(name, {})
+        if name in _DOCUMENT_ANALYSES:
+            results[name] = ANALYSES[name](document(_analysis_budget(params, budget_ms)), **params)
+        else:
+            results[name] = ANALYSES[name](text, **params)
+    return results
+
+
+def store_analyzed(text):
+    """Keep ``text`` for similar-document search when ``STORE_ANALYZED`` is on."""
+    if similarity_config()['STORE_ANALYZED']:
+        with stage('store'):
+            store_document(_document_text(text))
+
+
+def run_analyses(text, analyses=tuple(ANALYSES), options=None, budget_ms=REQUEST_BUDGET):
+    """Run several analyses over one text, sharing a single :class:`AnalyzedDocument`.
+
+    ``options`` maps an analysis name to the keyword arguments of its result
+    function, e.g. ``{'summary': {'max_sentences': 2}}``. Returns a dict keyed
+    by analysis name. Results come from the result cache when possible, and the
+    document is only built if a summary or keyword result has to be computed
+    (once per budget, as an oversized text is sampled to fit it). With
+    near-duplicate matching on, a cache miss is looked up by fingerprint, and
+    the cached result of a near-identical text is returned marked with
+    ``near_duplicate_of`` (see ``summarizer/near_duplicates.py``). With
+    ``STORE_ANALYZED`` on, the text is also kept for similar-document search.
+
+    By default summaries and keywords are budgeted like a request's (see
+    :func:`resolve_budget`). A ``budget_ms`` given here is used instead of
+    ``DEFAULT_MS`` and nothing is capped at ``MAX_MS`` (None: always exact);
+    the analysis jobs run this way.
+    """
+    store_analyzed(text)
+    results, lookup = lookup_analyses(text, analyses, options)
+    documents = {}
+
+    def document(budget):
+        if budget not in documents:
+            documents[budget] = budgeted_document(text, budget, resolved=True)
+        return documents[budget]
+
+    if lookup.misses and lookup.near_duplicates is not None:
+        with stage('fingerprint'):
+            fingerprint = document_fingerprint(document(_analysis_budget({}, budget_ms))) or 0
+        results.update(lookup_near_duplicates(lookup, fingerprint))
+    computed = compute_analyses(text, lookup.misses, options, document, budget_ms)
+    store_analyses(lookup, computed)
+    results.update(computed)
+    return {name: results[name] for name in analyses}
+
+
+def analysis_result(name, text, **options):
+    """Result payload of one analysis, served from the result cache when possible."""
+    return run_analyses(text, (name,), {name: options})[name]
+
+
+def classification_results(texts, top_k=3):
+    """Classification payloads for many texts from one ``predict_proba`` call."""
+    version, classifier = get_active_classifier()
+    probas = _predict_proba(classifier, [_document_text(text) for text in texts])
+    classes = _classifier_classes(classifier)
+    # Stable sort on the negated probabilities keeps ties in class order, like _top_labels
+    ranked = np.argsort(-probas, axis=1, kind='stable')
+    results = []
+    for row, order in zip(probas, ranked):
+        top = [{'label': classes[i], 'confidence': float(row[i])} for i in order[:max(top_k, 1)]]
+        results.append({'category': top[0]['label'], 'top': top[:top_k], 'model_version': version})
+    return results
+
+
+def _polarity_chunk(texts):
+    return _sentiment_engine.polarity_scores_batch(texts)
+
+
+def sentiment_results(texts):
+    """Sentiment payloads for many texts from the batch VADER engine.
+
+    Scores equal ``analyze_sentiment`` text by text. Batches of at least
+    ``SUMMAREASE_PARALLEL_THRESHOLD`` characters in total are split into
+    chunks scored on the analysis process pool.
+    """
+    texts = [_document_text(text) for text in texts]
+    threshold = settings.SUMMAREASE_PARALLEL_THRESHOLD
+    chunks = _parallel_chunks(texts) if threshold is not None and sum(map(len, texts)) >= threshold else None
+    with stage('sentiment'):
+        if chunks is None:
+            scores = _sentiment_engine.polarity_scores_batch(texts)
+        else:
+            from .pool import get_executor
+
+            scores = [item for part in get_executor().map(_polarity_chunk, chunks) for item in part]
+    return [{'label': _sentiment_label(item['compound']), 'scores': item} for item in scores]
+
+
+# Analyses with a vectorized implementation over a whole batch
+BATCH_ANALYSES = {
+    'classification': classification_results,
+    'sentiment': sentiment_results,
+}
+
+
+def lookup_batch(name, texts, options=None):
+    """Phase one of :func:`run_batch`: ``(results, keys, pending)``.
+
+    ``results`` holds the cached results and the errors for invalid items by
+    index (None elsewhere), ``keys`` the cache keys by index, and ``pending``
+    the indices still to compute.
+    """
+    options = options or {}
+    cache = get_result_cache()
+    version = model_version(name)
+    results = [None] * len(texts)
+    keys = {}
+    pending = []
+    for index, text in enumerate(texts):
+        if not (isinstance(text, str) and text):
+            results[index] = {'error': 'Text is required'}
+            continue
+        if cache is not None:
+            keys[index] = make_key(name, content_hash(text), {**ANALYSIS_OPTIONS[name], **options}, version)
+            found, result = cache.get(keys[index])
+            if found:
+                results[index] = result
+                continue
+        pending.append(index)
+    return results, keys, pending
+
+
+def compute_batch(name, texts, options=None):
+    """Analysis ``name`` of each of ``texts`` without the cache, as ``(result, ok)`` pairs.
+
+    A failed item gets ``({'error': ...}, False)``.
+    """
+    options = options or {}
+    computed = []
+    batch_function = BATCH_ANALYSES.get(name)
+    if batch_function is not None and texts:
+        try:
+            computed = batch_function(texts, **options)
+        except Exception:
+            # One bad item spoils the vectorized call; fall back to per-item results
+            computed = []
+    if len(computed) == len(texts):
+        return [(result, True) for result in computed]
+
+    function = ANALYSES[name]
+    outcomes = []
+    for text in texts:
+        try:
+            outcomes.append((function(text, **options), True))
+        except Exception as exc:
+            outcomes.append(({'error': str(exc) or exc.__class__.__name__}, False))
+    return outcomes
+
+
+def store_batch(results, keys, pending, outcomes):
+    """Fill ``results`` with the ``outcomes`` of the ``pending`` items, caching the successful ones."""
+    cache = get_result_cache()
+    for index, (result, ok) in zip(pending, outcomes):
+        results[index] = result
+        if ok and cache is not None:
+            cache.set(keys[index], result)
+    return results
+
+
+def run_batch(name, texts, options=None):
+    """Run analysis ``name`` over ``texts``, returning results in input order.
+
+    Items that are not non-empty strings, or whose analysis raises, get an
+    ``{'error': ...}`` entry instead of failing the whole batch. Cached results
+    are reused; only the misses are computed.
+    """
+    results, keys, pending = lookup_batch(name, texts, options)
+    outcomes = compute_batch(name, [texts[index] for index in pending], options)
+    return store_batch(results, keys, pending, outcomes)
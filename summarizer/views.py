@@ -1,66 +1,467 @@
-from rest_framework.decorators import api_view
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.functions import Substr
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
+from .cache import content_hash, get_result_cache
+from .jobs import get_job, job_payload, jobs_config, parse_priority, submit_job, wait_for_job
+from .metrics import render_prometheus, stage
+from .models import Document
+from .near_duplicates import get_near_duplicate_index
+from .pdf import PDF_ANALYSES, InvalidPDF, analyze_pdf, pdf_config
+from .similarity import get_index, similar_documents, similarity_config, store_document
+from .text_classifier_model import (
+    available_versions,
+    get_classifier_version,
+    read_active_version,
+    reload_classifier,
+    write_active_version,
+)
 from .utils import (
-    summarize_text,
-    classify_text,
-    analyze_sentiment,
-    extract_keywords,
-    classify_with_confidence,
+    ANALYSES,
+    ANALYSIS_OPTIONS,
+    analysis_result,
+    rank_sentences_stream,
+    resolve_budget,
+    run_analyses,
+    run_batch,
+    sentence_sentiments,
 )
 
 
-@api_view(['POST'])
-def summarize_view(request):
-    text = request.data.get('text', '')
-    max_sentences = request.data.get('max_sentences') or request.query_params.get('max_sentences')
+def _int_option(value, name, default):
+    """Coerce an optional integer request option, raising ValueError with the API message."""
+    try:
+        return int(value) if value is not None else default
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+
+
+def _bool_option(value, name, default):
+    """Coerce an optional boolean request option ("true"/"false", 1/0, ...) like DRF's BooleanField."""
+    if value is None:
+        return default
     try:
-        max_sentences = int(max_sentences) if max_sentences is not None else 3
-    except ValueError:
-        return Response({'error': 'max_sentences must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return serializers.BooleanField().to_internal_value(value)
+    except serializers.ValidationError:
+        raise ValueError(f'{name} must be a boolean')
+
+
+def _parse_options(name, lookup, resolve_budgets=True):
+    """Integer options of analysis ``name`` read with ``lookup(option)``.
+
+    The budget is resolved here unless ``resolve_budgets`` is false (jobs leave
+    an unset budget to the worker's policy).
+    """
+    options = {
+        option: _int_option(lookup(option), option, default)
+        for option, default in ANALYSIS_OPTIONS[name].items()
+    }
+    if 'budget_ms' in options:
+        if options['budget_ms'] is not None and options['budget_ms'] <= 0:
+            raise ValueError('budget_ms must be a positive integer')
+        if resolve_budgets:
+            # Resolved before the cache key is made, so a new default or cap takes effect
+            options['budget_ms'] = resolve_budget(options['budget_ms'])
+    return options
+
+
+def _request_options(name, data, query_params):
+    # Options may come in the body or, for convenience, in the query string
+    return _parse_options(name, lambda option: data.get(option) or query_params.get(option))
 
+
+def parse_single_request(name, data, query_params):
+    """Validate a single-analysis request; returns ``(text, options)`` or raises ValueError."""
+    options = _request_options(name, data, query_params)
+    text = data.get('text', '')
     if not text:
-        return Response({'error': 'Text is required'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    summary = summarize_text(text, max_sentences=max_sentences)
-    return Response({'summary': summary, 'max_sentences': max_sentences}, status=status.HTTP_200_OK)
+        raise ValueError('Text is required')
+    return text, options
+
+
+@api_view(['POST'])
+def summarize_view(request):
+    try:
+        with stage('parse'):
+            text, options = parse_single_request('summary', request.data, request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(analysis_result('summary', text, **options), status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 def classify_view(request):
-    text = request.data.get('text', '')
-    top_k = request.data.get('top_k') or request.query_params.get('top_k')
     try:
-        top_k = int(top_k) if top_k is not None else 3
-    except ValueError:
-        return Response({'error': 'top_k must be an integer'}, status=400)
+        with stage('parse'):
+            text, options = parse_single_request('classification', request.data, request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
+    return Response(analysis_result('classification', text, **options))
+
+
+SENTIMENT_MODES = ('document', 'sentences')
+
+
+def parse_sentiment_mode(data, query_params):
+    """``mode`` of a sentiment request: one score for the text, or one per sentence."""
+    mode = data.get('mode') or query_params.get('mode') or 'document'
+    if mode not in SENTIMENT_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(SENTIMENT_MODES)}")
+    return mode
 
-    if not text:
-        return Response({'error': 'Text is required'}, status=400)
 
-    category = classify_text(text)
-    top = classify_with_confidence(text, top_k=top_k)
-    return Response({'category': category, 'top': top})
+def ndjson_lines(records):
+    """Encode ``records`` as newline-delimited JSON, one line at a time."""
+    for record in records:
+        yield json.dumps(record) + '\n'
 
 
 @api_view(['POST'])
 def sentiment_view(request):
-    text = request.data.get('text', '')
-    if not text:
-        return Response({'error': 'Text is required'}, status=status.HTTP_400_BAD_REQUEST)
-    sentiment = analyze_sentiment(text)
+    try:
+        with stage('parse'):
+            text, options = parse_single_request('sentiment', request.data, request.query_params)
+            mode = parse_sentiment_mode(request.data, request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if mode == 'sentences':
+        # Streamed as computed, so long transcripts start arriving at once
+        return StreamingHttpResponse(ndjson_lines(sentence_sentiments(text)), content_type='application/x-ndjson')
+    sentiment = analysis_result('sentiment', text, **options)
     return Response(sentiment, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 def keywords_view(request):
-    text = request.data.get('text', '')
-    top_k = request.data.get('top_k') or request.query_params.get('top_k')
     try:
-        top_k = int(top_k) if top_k is not None else 10
-    except ValueError:
-        return Response({'error': 'top_k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        with stage('parse'):
+            text, options = parse_single_request('keywords', request.data, request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(analysis_result('keywords', text, **options), status=status.HTTP_200_OK)
+
+
+def _body_stream(request):
+    # DRF has no stream without a Content-Length, as with chunked uploads. Under
+    # ASGI the Django request holds the whole body; under WSGI the raw input is
+    # only safe to read to the end when the server terminates it for us.
+    if request.stream is not None:
+        return request.stream
+    meta = request._request.META
+    if meta.get('CONTENT_LENGTH'):
+        return None
+    if meta.get('wsgi.input_terminated'):
+        return meta['wsgi.input']
+    if hasattr(request._request, 'scope'):
+        return request._request
+    return None
+
+
+@api_view(['POST'])
+def summarize_stream_view(request):
+    """Summarize a raw text body of any size without holding it in memory.
+
+    The body is read as UTF-8 text (``Content-Type: text/plain``) and
+    ``max_sentences`` comes from the query string.
+    """
+    try:
+        max_sentences = _int_option(request.query_params.get('max_sentences'), 'max_sentences', 3)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    stream = _body_stream(request)
+    if stream is None:
+        return Response({'error': 'Text is required'}, status=status.HTTP_400_BAD_REQUEST)
+    with stage('scoring'):
+        ranked = rank_sentences_stream(stream, max_sentences)
+    return Response({
+        'summary': ' '.join(sentence for _, _, sentence in ranked),
+        'max_sentences': max_sentences,
+        'sentences': [{'index': index, 'offset': offset, 'text': sentence} for index, offset, sentence in ranked],
+    }, status=status.HTTP_200_OK)
+
+
+def parse_pdf_request(data, query_params):
+    """Validate the options of a PDF upload; returns ``(analyses, max_sentences, top_k)`` or raises ValueError."""
+    def lookup(option):
+        return data.get(option) or query_params.get(option)
+
+    requested = lookup('analyses')
+    analyses = [name.strip() for name in requested.split(',')] if requested else list(PDF_ANALYSES)
+    unknown = [name for name in analyses if name not in PDF_ANALYSES]
+    if unknown:
+        raise ValueError(f"analyses must be any of: {', '.join(PDF_ANALYSES)}")
+    max_sentences = _int_option(lookup('max_sentences'), 'max_sentences', ANALYSIS_OPTIONS['summary']['max_sentences'])
+    top_k = _int_option(lookup('top_k'), 'top_k', ANALYSIS_OPTIONS['keywords']['top_k'])
+    return analyses, max_sentences, top_k
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def pdf_analyze_view(request):
+    """Summarize and extract keywords from an uploaded PDF (multipart field ``file``), page by page."""
+    try:
+        with stage('parse'):
+            analyses, max_sentences, top_k = parse_pdf_request(request.data, request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'A PDF file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = pdf_config()['MAX_UPLOAD_BYTES']
+    if upload.size > limit:
+        return Response({'error': f'PDF files may be at most {limit} bytes'},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    try:
+        return Response(analyze_pdf(upload, analyses, max_sentences, top_k))
+    except InvalidPDF as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def parse_analysis_request(data, resolve_budgets=True):
+    """Validate the body of a combined analysis request.
+
+    Returns ``(analyses, options)`` ready for :func:`run_analyses`; raises
+    ValueError with the API error message on bad input.
+    """
+    analyses = data.get('analyses') or list(ANALYSES)
+    if not isinstance(analyses, list) or not all(isinstance(name, str) for name in analyses):
+        raise ValueError('analyses must be a list of analysis names')
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        raise ValueError(f'Unknown analysis: {unknown[0]}')
+
+    requested = data.get('options') or {}
+    if not isinstance(requested, dict):
+        raise ValueError('options must be an object')
+    options = {}
+    for name in analyses:
+        given = requested.get(name) or {}
+        if not isinstance(given, dict):
+            raise ValueError(f'options.{name} must be an object')
+        options[name] = _parse_options(name, given.get, resolve_budgets)
+    # Preserve request order but never run the same analysis twice
+    return list(dict.fromkeys(analyses)), options
+
+
+@api_view(['POST'])
+def analyze_view(request):
+    """Run any of the four analyses on one text with a single tokenization pass."""
+    try:
+        with stage('parse'):
+            text = request.data.get('text', '')
+            analyses, options = parse_analysis_request(request.data)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     if not text:
         return Response({'error': 'Text is required'}, status=status.HTTP_400_BAD_REQUEST)
-    keywords = extract_keywords(text, top_k=top_k)
-    return Response({'keywords': keywords, 'top_k': top_k}, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(run_analyses(text, analyses, options), status=status.HTTP_200_OK)
+
+
+def parse_batch_request(name, data, query_params):
+    """Validate a batch request; returns ``(texts, options)`` or raises ValueError."""
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not texts:
+        raise ValueError('texts must be a non-empty list')
+    max_batch_size = settings.SUMMAREASE_MAX_BATCH_SIZE
+    if len(texts) > max_batch_size:
+        raise ValueError(f'At most {max_batch_size} texts per batch')
+    return texts, _request_options(name, data, query_params)
+
+
+def _batch_response(request, name):
+    """Shared body of the batch endpoints: validate ``texts`` and options, then run the batch."""
+    try:
+        with stage('parse'):
+            texts, options = parse_batch_request(name, request.data, request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    results = run_batch(name, texts, options)
+    return Response({'results': results, 'count': len(results), **options}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+def summarize_batch_view(request):
+    return _batch_response(request, 'summary')
+
+
+@api_view(['POST'])
+def classify_batch_view(request):
+    return _batch_response(request, 'classification')
+
+
+@api_view(['POST'])
+def sentiment_batch_view(request):
+    return _batch_response(request, 'sentiment')
+
+
+@api_view(['POST'])
+def keywords_batch_view(request):
+    return _batch_response(request, 'keywords')
+
+
+@api_view(['GET'])
+def cache_stats_view(request):
+    """Hit/miss/eviction counters of this process's result cache and near-duplicate index."""
+    cache = get_result_cache()
+    if cache is None:
+        return Response({'enabled': False})
+    near_duplicates = get_near_duplicate_index()
+    return Response({
+        'enabled': True,
+        **cache.stats(),
+        'near_duplicates': {'enabled': True, **near_duplicates.stats()} if near_duplicates is not None else {'enabled': False},
+    })
+
+
+@api_view(['GET'])
+def metrics_view(request):
+    """Per-stage latency histograms and result cache counters, in the Prometheus text format."""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def classifier_model_view(request):
+    """Served and available classifier versions; POST switches the served version.
+
+    POST ``{"version": "..."}`` records the version in the artifact directory's
+    ``ACTIVE`` file (``null`` or no version: always the newest) and swaps it in
+    this process. Other processes switch on their next reload signal.
+    """
+    previous = None
+    if request.method == 'POST':
+        version = request.data.get('version')
+        if version is not None and not isinstance(version, str):
+            return Response({'error': 'version must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            write_active_version(version)
+            previous, _ = reload_classifier()
+        except ImproperlyConfigured as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    payload = {
+        'active_version': get_classifier_version(),
+        'pinned_version': read_active_version(),
+        'versions': available_versions(),
+    }
+    if request.method == 'POST':
+        payload['previous_version'] = previous
+    return Response(payload)
+
+
+def parse_job_request(data):
+    """Validate a job submission; returns ``(text, analyses, options, priority)`` or raises ValueError."""
+    analyses, options = parse_analysis_request(data, resolve_budgets=False)
+    priority = parse_priority(data.get('priority'))
+    text = data.get('text', '')
+    if not text or not isinstance(text, str):
+        raise ValueError('Text is required')
+    return text, analyses, options, priority
+
+
+def parse_wait(query_params):
+    """Seconds a job request may wait for the job to finish (``?wait=``), capped at ``MAX_WAIT``."""
+    wait = _int_option(query_params.get('wait'), 'wait', 0)
+    if wait < 0:
+        raise ValueError('wait must not be negative')
+    return min(wait, jobs_config()['MAX_WAIT'])
+
+
+@api_view(['POST'])
+def job_submit_view(request):
+    """Queue an analysis (same body as ``/api/analyze/`` plus ``priority``) for the job workers."""
+    try:
+        with stage('parse'):
+            text, analyses, options, priority = parse_job_request(request.data)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    job = submit_job(text, analyses, options, priority)
+    return Response(job_payload(job), status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': reverse('job-detail', args=[job.id])})
+
+
+@api_view(['GET'])
+def job_detail_view(request, job_id):
+    """Status and, once finished, result of a job; ``?wait=<seconds>`` long-polls for it."""
+    try:
+        wait = parse_wait(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    job = wait_for_job(job_id, wait) if wait else get_job(job_id)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job_payload(job))
+
+
+SIMILAR_PREVIEW_CHARS = 200
+
+
+def parse_similar_request(data):
+    """Validate a similar-document query; returns ``(text, document, top_k, store)`` or raises ValueError.
+
+    The query is either a ``text`` or the ``document_id`` of a stored document.
+    """
+    top_k = _int_option(data.get('top_k'), 'top_k', 10)
+    if not 1 <= top_k <= similarity_config()['MAX_TOP_K']:
+        raise ValueError(f"top_k must be between 1 and {similarity_config()['MAX_TOP_K']}")
+    store = _bool_option(data.get('store'), 'store', False)
+    document_id = data.get('document_id')
+    if document_id is not None:
+        document_id = _int_option(document_id, 'document_id', None)
+        document = Document.objects.filter(id=document_id).first()
+        if document is None:
+            raise LookupError('Document not found')
+        return document.text, document, top_k, False
+    text = data.get('text', '')
+    if not text or not isinstance(text, str):
+        raise ValueError('Text or document_id is required')
+    return text, None, top_k, store
+
+
+@api_view(['POST'])
+def similar_view(request):
+    """Stored documents most similar to a text or a stored document, by TF-IDF cosine similarity."""
+    try:
+        with stage('parse'):
+            text, document, top_k, store = parse_similar_request(request.data)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    except LookupError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_404_NOT_FOUND)
+    if store:
+        document = store_document(text)
+    elif document is None:
+        document = Document.objects.filter(content_hash=content_hash(text)).only('id').first()
+    # A document is not similar to itself
+    exclude = [document.id] if document is not None else []
+    matches = similar_documents(text, top_k, exclude)
+    # Only the start of each text leaves the database
+    previews = {
+        item['id']: item for item in
+        Document.objects.filter(id__in=[document_id for document_id, _ in matches])
+        .annotate(preview=Substr('text', 1, SIMILAR_PREVIEW_CHARS)).values('id', 'preview', 'size')
+    }
+    payload = {
+        'results': [
+            {
+                'document_id': document_id,
+                'score': score,
+                'size': previews[document_id]['size'],
+                'preview': previews[document_id]['preview'],
+            }
+            for document_id, score in matches if document_id in previews
+        ],
+        'top_k': top_k,
+        'indexed_documents': len(get_index()),
+    }
+    if store:
+        # Searchable once manage.py update_similarity_index has indexed it
+        payload['document_id'] = document.id
+    return Response(payload)